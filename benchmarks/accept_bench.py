@@ -0,0 +1,84 @@
+"""
+Connection accept benchmark
+
+Simulate a reconnect storm: a client process fills the
+listen backlog with connections, and measure how fast the
+server loop accepts them and how many select() calls it takes, with
+different accept batch sizes and with level-triggered
+and edge-triggered selectors.
+
+Usage:
+    python benchmarks/accept_bench.py [connections]
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from server import HTTPServer
+
+
+def storm(address, number: int, ready, done):
+    """Connect number clients, keep them open until done is set"""
+    clients = list()
+    for _ in range(number):
+        clients.append(socket.create_connection(address))
+    ready.set()
+    done.wait()
+    for client in clients:
+        client.close()
+
+
+def bench(number: int, batch: int, edge_triggered: bool):
+    """Time accepting a storm with server options"""
+    httpd = HTTPServer(("127.0.0.1", 0), backlog=number,
+                       accept_batch=batch, edge_triggered=edge_triggered)
+
+    # Count loop iterations and connections accepted
+    counter = {"select": 0, "accepted": 0}
+    select, register = httpd._poll.select, httpd._register
+
+    def counted_select(*args, **kwargs):
+        counter["select"] += 1
+        return select(*args, **kwargs)
+
+    def counted_register(connection):
+        counter["accepted"] += 1
+        register(connection)
+
+    httpd._poll.select = counted_select
+    httpd._register = counted_register
+
+    # Fill the backlog before server loop starts
+    httpd._listener.listen(number)
+    ready, done = multiprocessing.Event(), multiprocessing.Event()
+    client = multiprocessing.Process(
+        target=storm, args=(httpd._listener.getsockname(), number, ready, done))
+    client.start()
+    ready.wait()
+
+    start = time.perf_counter()
+    threading.Thread(target=httpd.start, daemon=True).start()
+    while counter["accepted"] < number:
+        time.sleep(0.0005)
+    elapsed = time.perf_counter() - start
+    selects = counter["select"]
+
+    done.set()
+    client.join()
+    httpd.stop()
+    print("batch {batch:3}  {mode:15} {rate:9.0f} conn/s  {selects:6} select() calls".format(
+        batch=batch, mode="edge-triggered" if edge_triggered else "level-triggered",
+        rate=number / elapsed, selects=selects))
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 3000
+    for batch in (1, 64):
+        for edge_triggered in (False, True):
+            bench(number, batch, edge_triggered)
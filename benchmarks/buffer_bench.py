@@ -0,0 +1,122 @@
+"""
+Receive buffer benchmark
+
+Read requests from a socket pair the way the server does (head,
+parsing, body in chunks), receiving with recv_into into pooled
+buffers, and with recv allocating a bytes object for every receive
+as before pooling. Report time of each request, memory allocated
+at peak while reading it (measured with tracemalloc in another
+run), and hits and misses of the buffer pool.
+
+Usage:
+    python benchmarks/buffer_bench.py [requests]
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from server import settings
+from server import Request
+from server.buffers import pool
+from server.connection import Connection
+
+
+class RecvConnection(Connection):
+    """Connection receiving with recv, copied into its buffer"""
+
+    def _fill(self, size=Connection.MIN_RECV) -> int:
+        data = self.socket.recv(max(size, settings.RECV_CHUNK_SIZE))
+        self._reserve(len(data))
+        self._view[self._end:self._end + len(data)] = data
+        self._end += len(data)
+        return len(data)
+
+
+def requests(body: int) -> bytes:
+    """Raw request, with body of size when not 0"""
+    head = ("{method} /api/items?page=2 HTTP/1.1\r\n"
+            "Host: localhost\r\nUser-Agent: bench/1.0\r\n"
+            "Accept: application/json\r\nAccept-Encoding: gzip\r\n"
+            "Cookie: session=0123456789abcdef\r\n").format(
+                method="POST" if body else "GET")
+    if body:
+        head += "Content-Type: application/octet-stream\r\n" \
+                "Content-Length: {}\r\n".format(body)
+    return (head + "\r\n").encode() + b'x' * body
+
+
+def serve(connection: Connection) -> Request:
+    """Read one request from connection like server._handle"""
+    rawdata = connection.read_head()
+    request = Request(rawdata)
+    request.parse()
+    while request.pending:
+        chunk = connection.read(min(request.pending, settings.RECV_CHUNK_SIZE))
+        request.feed(chunk)
+    return request
+
+
+def run(kind, number: int, body: int, measure: bool):
+    """
+    Read number requests with connection kind, client sends
+    next request when previous one is answered, like keep-alive
+    clients do. Return seconds elapsed, and peak bytes allocated
+    for each request when measured.
+    """
+    server, client = socket.socketpair()
+    raw = requests(body)
+
+    def send():
+        for _ in range(number):
+            client.sendall(raw)
+            client.recv(1)
+
+    sender = threading.Thread(target=send)
+    sender.daemon = True
+    sender.start()
+
+    connection = kind(server, ("127.0.0.1", 0))
+    peaks, start = 0, time.perf_counter()
+    for _ in range(number):
+        if measure:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        serve(connection)
+        if measure:
+            peaks += tracemalloc.get_traced_memory()[1] - before
+        # Answered, buffer goes back to pool while idle
+        connection.release()
+        server.send(b'.')
+    elapsed = time.perf_counter() - start
+
+    sender.join()
+    connection.close()
+    client.close()
+    return elapsed, peaks
+
+
+def bench(kind, number: int, body: int):
+    """Time and measure reading requests with connection kind"""
+    hits, misses = pool.hits, pool.misses
+    elapsed, _ = run(kind, number, body, False)
+    tracemalloc.start()
+    _, peaks = run(kind, number, body, True)
+    tracemalloc.stop()
+    print("{kind:6} body {body:6}: {time:6.1f} us/request, "
+          "peak {peak:6.1f} KB allocated/request, pool hits {hits}, misses {misses}".format(
+              kind="pooled" if kind is Connection else "recv", body=body,
+              time=elapsed / number * 1e6, peak=peaks / number / 1024,
+              hits=pool.hits - hits, misses=pool.misses - misses))
+
+
+if __name__ == "__main__":
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for body in (0, 1024, 64 * 1024):
+        for kind in (RecvConnection, Connection):
+            bench(kind, number, body)
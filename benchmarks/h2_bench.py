@@ -0,0 +1,141 @@
+"""
+HTTP/2 page load benchmark
+
+Measure loading index.html with its static assets and
+an XHR for events.json, over HTTP/1.1 with a few parallel
+keep-alive connections like browsers do, and over HTTP/2
+multiplexed on one connection (h2c with prior knowledge).
+
+Usage:
+    python benchmarks/h2_bench.py [loads] [connections]
+"""
+
+import os
+import sys
+import time
+import socket
+import struct
+import threading
+import http.client
+import statistics
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from server import hpack
+from server import http2
+from server import HTTPServer
+from server import Application
+
+# Resources of one page load, like a browser requests them
+PAGE = ("/index.html", "/static/events.css",
+        "/static/events-start.js", "/static/events.json")
+
+
+class H2Client:
+    """Minimal HTTP/2 client, requests are sent at once"""
+
+    def __init__(self, address):
+        self._socket = socket.create_connection(address)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        self._encoder = hpack.Encoder()
+        self._decoder = hpack.Decoder()
+        self._buffer = bytearray()
+        self._stream = 1
+        window = struct.pack(">HI", http2.SETTINGS_INITIAL_WINDOW_SIZE, 2 ** 24)
+        self._socket.sendall(
+            http2.PREFACE + http2.frame(http2.SETTINGS, 0, 0, window) +
+            http2.frame(http2.WINDOW_UPDATE, 0, 0, struct.pack(">I", 2 ** 30)))
+
+    def _read(self, size):
+        while len(self._buffer) < size:
+            data = self._socket.recv(65536)
+            if not data:
+                raise ConnectionError("Server closed connection")
+            self._buffer += data
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def get(self, paths):
+        """Request paths concurrently, return {path: (status, body)}"""
+        streams, frames = dict(), list()
+        for path in paths:
+            block = self._encoder.encode([
+                (":method", "GET"), (":scheme", "http"),
+                (":authority", "localhost"), (":path", path)])
+            frames.append(http2.frame(
+                http2.HEADERS, http2.END_HEADERS | http2.END_STREAM,
+                self._stream, block))
+            streams[self._stream] = [path, None, bytearray()]
+            self._stream += 2
+        self._socket.sendall(b''.join(frames))
+
+        results = dict()
+        while len(results) < len(paths):
+            header = self._read(9)
+            length = int.from_bytes(header[:3], "big")
+            kind, flags, stream = struct.unpack(">BBI", header[3:])
+            payload = self._read(length)
+            if kind == http2.SETTINGS and not flags & http2.ACK:
+                self._socket.sendall(http2.frame(http2.SETTINGS, http2.ACK, 0))
+            elif kind == http2.HEADERS:
+                streams[stream][1] = dict(self._decoder.decode(payload))[":status"]
+            elif kind == http2.DATA:
+                streams[stream][2] += payload
+            elif kind == http2.RST_STREAM:
+                raise ConnectionError("Stream reset")
+            if kind in (http2.HEADERS, http2.DATA) and flags & http2.END_STREAM:
+                path, status, body = streams.pop(stream)
+                results[path] = (status, bytes(body))
+        return results
+
+    def close(self):
+        self._socket.close()
+
+
+def load_http1(pool, connections):
+    """Load page with parallel HTTP/1.1 connections"""
+    def fetch(index):
+        connection = connections[index % len(connections)]
+        connection.request("GET", PAGE[index])
+        connection.getresponse().read()
+    list(pool.map(fetch, range(len(PAGE))))
+
+
+def measure(name, load, number):
+    """Print median and p90 latency of page loads"""
+    timings = list()
+    for _ in range(number):
+        start = time.perf_counter()
+        load()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print("{name:28} median {median:8.2f}ms  p90 {p90:8.2f}ms".format(
+        name=name, median=statistics.median(timings) * 1e3,
+        p90=timings[int(len(timings) * 0.9)] * 1e3))
+
+
+if __name__ == "__main__":
+    loads = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    parallel = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    root = os.path.join(os.path.dirname(__file__), os.pardir)
+    httpd = HTTPServer(("127.0.0.1", 0))
+    httpd.serve(Application(__name__, workdir=root, manifest=True))
+    httpd.log = lambda *args: None
+    threading.Thread(target=httpd.start, daemon=True).start()
+    address = httpd._listener.getsockname()
+
+    connections = [http.client.HTTPConnection(*address) for _ in range(parallel)]
+    with ThreadPoolExecutor(parallel) as pool:
+        measure("HTTP/1.1 x{n} connections".format(n=parallel),
+                lambda: load_http1(pool, connections), loads)
+    for connection in connections:
+        connection.close()
+
+    client = H2Client(address)
+    measure("HTTP/2 x1 connection", lambda: client.get(PAGE), loads)
+    client.close()
+    httpd.stop()
@@ -0,0 +1,71 @@
+"""
+JSON path benchmark
+
+Measure serialising an events.json shaped payload
+into a complete response, and decoding it as a
+request body, with every installed JSON backend.
+
+Usage:
+    python benchmarks/json_bench.py [people] [events]
+"""
+
+import os
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from server import jsoncodec
+from server import Request
+from server import Response
+
+
+def payload(people: int, events: int) -> dict:
+    """Make payload shaped like static/events.json"""
+    path = os.path.join(os.path.dirname(__file__), os.pardir,
+                        "static", "events.json")
+    with open(path, "rb") as handler:
+        sample = json.loads(handler.read())
+    records = [record for value in sample.values() for record in value]
+
+    return {"person" + str(index): [
+        records[(index + number) % len(records)]
+        for number in range(events)] for index in range(people)}
+
+
+def bench(codec: jsoncodec.JSONCodec, data: dict, number: int):
+    """Time response making and request decoding with codec"""
+    encoded = codec.dumps(data)
+    rawdata = ("POST /events HTTP/1.1\r\n"
+               "Host: localhost:15014\r\n"
+               "Content-Type: application/json\r\n"
+               "Content-Length: {length}\r\n\r\n").format(
+                   length=len(encoded)).encode() + encoded
+
+    def respond():
+        Response(200, codec.dumps(data),
+                 content_type="application/json").done()
+
+    def parse():
+        Request(rawdata, codec).parse()
+
+    respond_time = timeit.timeit(respond, number=number) / number
+    parse_time = timeit.timeit(parse, number=number) / number
+    print("{name:8} {size:>9} bytes  respond {respond:9.1f}us  parse {parse:9.1f}us".format(
+        name=codec.name, size=len(encoded),
+        respond=respond_time * 1e6, parse=parse_time * 1e6))
+
+
+if __name__ == "__main__":
+    people = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    data = payload(people, events)
+
+    for name in jsoncodec.BACKENDS:
+        try:
+            codec = jsoncodec.load(name)
+        except ImportError as _error:
+            print("{name:8} not installed".format(name=name))
+            continue
+        bench(codec, data, 200)
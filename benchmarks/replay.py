@@ -0,0 +1,165 @@
+"""
+Traffic replay
+
+Send requests of a capture file (see server.capture) to a server
+at the rate they arrived, or a multiple of it, and report latency
+percentiles by route and responses differing from the captured
+ones (status, or body checksum when it was captured).
+
+Latency is measured from the time each request was due, so a
+server falling behind the captured rate is not hidden by
+requests waiting for a free client connection.
+
+Usage:
+    python benchmarks/replay.py capture [host:port] [speed] [connections]
+"""
+
+import os
+import sys
+import time
+import socket
+import threading
+import collections
+import http.client
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from server import capture
+
+
+def percentile(values, fraction: float) -> float:
+    """Value below which fraction of sorted values are"""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def route(data: bytes) -> str:
+    """Method and path of raw request"""
+    line = data.split(b"\r\n", 1)[0].decode("latin-1").split(' ')
+    if len(line) < 2:
+        return "<invalid>"
+    return line[0] + ' ' + line[1].split('?', 1)[0]
+
+
+class Client:
+    """Keep-alive connection of one replay thread"""
+
+    def __init__(self, address):
+        self._address = address
+        self._socket = None
+
+    def send(self, data: bytes):
+        """Send raw request, return status and body of response"""
+        while True:
+            reused = self._socket is not None
+            if not reused:
+                self._socket = socket.create_connection(self._address)
+                self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+            try:
+                self._socket.sendall(data)
+                response = http.client.HTTPResponse(
+                    self._socket, method=data.split(b' ', 1)[0].decode("latin-1"))
+                response.begin()
+                body = response.read()
+                if response.will_close:
+                    self.close()
+                return response.status, body
+            except (OSError, http.client.HTTPException) as _error:
+                # Server may have closed idle keep-alive connection
+                self.close()
+                if not reused:
+                    raise
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def replay(path: str, address, speed: float = 1.0, connections: int = 16):
+    """Replay capture file against server at address"""
+    records = sorted(capture.read(path), key=lambda record: record.arrived)
+    if not records:
+        print("No requests captured in", path)
+        return
+
+    clients = threading.local()
+    latencies = collections.defaultdict(list)
+    diffs = collections.Counter()
+    failures = collections.Counter()
+    lock = threading.Lock()
+
+    def send(record: capture.Record, due: float):
+        client = getattr(clients, "client", None)
+        if client is None:
+            client = clients.client = Client(address)
+        key = route(record.data)
+        try:
+            status, body = client.send(record.data)
+        except (OSError, http.client.HTTPException) as _error:
+            with lock:
+                failures[key] += 1
+            return
+        elapsed = time.perf_counter() - due
+        changed = None
+        if record.status and status != record.status:
+            changed = "status"
+        elif record.checksum and capture.checksum(body) != record.checksum:
+            changed = "body"
+        with lock:
+            latencies[key].append(elapsed)
+            if changed:
+                diffs[(key, changed, record.status, status)] += 1
+
+    # Requests are submitted when due, relative to the first one
+    first = records[0].arrived
+    start = time.perf_counter()
+    with ThreadPoolExecutor(connections) as pool:
+        for record in records:
+            due = start + (record.arrived - first) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, record, due)
+    elapsed = time.perf_counter() - start
+    captured = (records[-1].arrived - first) or 1e-9
+
+    print("{count} requests in {elapsed:.2f}s ({rate:.0f} req/s), captured rate "
+          "{original:.0f} req/s x {speed}".format(
+              count=len(records), elapsed=elapsed, rate=len(records) / elapsed,
+              original=len(records) / captured, speed=speed))
+    print("{:40} {:>7} {:>9} {:>9} {:>9} {:>9}".format(
+        "route", "count", "p50 ms", "p90 ms", "p99 ms", "max ms"))
+    everything = list()
+    for key, values in sorted(latencies.items()):
+        values.sort()
+        everything.extend(values)
+        print("{:40} {:7} {:9.2f} {:9.2f} {:9.2f} {:9.2f}".format(
+            key[:40], len(values), percentile(values, 0.5) * 1000,
+            percentile(values, 0.9) * 1000, percentile(values, 0.99) * 1000,
+            values[-1] * 1000))
+    everything.sort()
+    print("{:40} {:7} {:9.2f} {:9.2f} {:9.2f} {:9.2f}".format(
+        "all", len(everything), percentile(everything, 0.5) * 1000,
+        percentile(everything, 0.9) * 1000, percentile(everything, 0.99) * 1000,
+        everything[-1] * 1000 if everything else 0.0))
+
+    for key, count in sorted(failures.items()):
+        print("failed    {key}: {count}".format(key=key, count=count))
+    for (key, changed, before, after), count in diffs.most_common():
+        print("differs   {key}: {changed}, captured {before}, replayed {after}, "
+              "{count} times".format(key=key, changed=changed, before=before,
+                                     after=after, count=count))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    host, _, port = (sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1:15014").rpartition(':')
+    replay(sys.argv[1], (host or "127.0.0.1", int(port)),
+           float(sys.argv[3]) if len(sys.argv) > 3 else 1.0,
+           int(sys.argv[4]) if len(sys.argv) > 4 else 16)
@@ -0,0 +1,92 @@
+"""
+Shared store benchmark
+
+Start processes attached to one shared store, each of them
+counting into shared counters and reading and writing the
+cache, then check no increment was lost and cached values
+were never read torn, and report operations per second.
+
+Usage:
+    python benchmarks/shared_bench.py [processes] [operations]
+"""
+
+import os
+import sys
+import time
+import random
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from server.shared import SharedStore
+
+
+NAME = "bench-" + str(os.getpid())
+KEYS = 2048
+
+
+def value(key: int, writer: int) -> bytes:
+    """Value of key written by writer, checked when read"""
+    return (b"%d:%d:" % (key, writer)) * (1 + key % 64)
+
+
+def worker(writer: int, operations: int, results):
+    """Count, read and write cache with a store of its own"""
+    store = SharedStore(NAME, slots=1024, slot_size=1024)
+    torn = 0
+    start = time.perf_counter()
+    for operation in range(operations):
+        store.incr("requests")
+        store.incr("status." + str(200 + operation % 3))
+        key = random.randrange(KEYS)
+        found = store.get("key%d" % key)
+        if found is None:
+            store.set("key%d" % key, value(key, writer), ttl=60)
+        else:
+            prefix = b"%d:" % key
+            unit = found[:found.index(b':', len(prefix)) + 1]
+            if not unit.startswith(prefix) or found != unit * (1 + key % 64):
+                torn += 1
+    results.put((time.perf_counter() - start, store.hits, store.misses, torn))
+    store.close()
+
+
+def bench(processes: int, operations: int):
+    store = SharedStore(NAME, slots=1024, slot_size=1024)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=worker, args=(index, operations, results))
+               for index in range(processes)]
+    try:
+        for process in workers:
+            process.start()
+        reports = [results.get() for _ in workers]
+        for process in workers:
+            process.join()
+
+        elapsed = max(report[0] for report in reports)
+        hits = sum(report[1] for report in reports)
+        misses = sum(report[2] for report in reports)
+        torn = sum(report[3] for report in reports)
+        counters = store.counters()
+        expected = processes * operations
+        statuses = sum(counters.get("status." + str(code), 0) for code in (200, 201, 202))
+
+        print("{processes} processes x {operations} operations in {elapsed:.2f}s, "
+              "{rate:.0f} ops/s (2 increments, 1 get, set on miss each)".format(
+                  processes=processes, operations=operations, elapsed=elapsed,
+                  rate=expected / elapsed))
+        print("cache hits {hits}, misses {misses}, torn reads {torn}".format(
+            hits=hits, misses=misses, torn=torn))
+        print("requests counted {counted} of {expected}, statuses {statuses}".format(
+            counted=counters.get("requests", 0), expected=expected, statuses=statuses))
+        if counters.get("requests") != expected or statuses != expected or torn:
+            print("FAILED")
+            sys.exit(1)
+    finally:
+        store.close()
+        store.unlink()
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 4,
+          int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
@@ -6,9 +6,13 @@ application and responding to WSGIServer.
 """
 
 import os
+import math
 import subprocess
 
+from concurrent.futures import Future
+
 from typing import Set
+from typing import Dict
 from typing import Tuple
 from typing import Union
 from typing import Optional
@@ -21,6 +25,22 @@ from . import errors
 from . import router
 from . import consts
 from . import settings
+from . import executor
+from . import jsoncodec
+from .manifest import StaticManifest
+from .limiter import RateLimiter
+from .coalesce import Coalescer
+from .template import Templates
+from .shared import SharedStore
+from .deadline import Task
+from .deadline import Deadline
+from .deadline import bound
+from .deadline import settle
+from .proxy import ReverseProxy
+from .events import Broadcaster
+from .events import EventStream
+from .websocket import Endpoint
+from .profiler import Profiler
 from .request import Request
 from .response import Response
 
@@ -49,7 +69,14 @@ class Application:
 
     def __init__(self, name: str, workdir: Optional[str] = '.',
                  default_access_file: Optional[str] = settings.DEFAULT_ACCESS_FILE,
-                 executable: Optional[Set[str]] = settings.EXECUTABLE_EXTENSIONS):
+                 executable: Optional[Set[str]] = settings.EXECUTABLE_EXTENSIONS,
+                 json: Optional[jsoncodec.JSONCodec] = None,
+                 manifest: Optional[bool] = False,
+                 rescan: Optional[float] = settings.MANIFEST_RESCAN_INTERVAL,
+                 coalesce_cgi: Optional[Coalescer] = None,
+                 deadline: Optional[float] = settings.VIEW_DEADLINE,
+                 templates: Optional[str] = settings.TEMPLATE_CATALOGUE,
+                 shared: Optional[SharedStore] = None):
         """
         Application initialization
 
@@ -61,6 +88,20 @@ class Application:
             default_access_file: str - File contents returned by 
                                  default when accessing a directory
             executable: set - Executable file suffix collection
+            json: JSONCodec - Codec for JSON requests and responses,
+                  the fastest installed backend by default
+            manifest: bool - Scan working directory on startup,
+                      and serve static files from the manifest
+            rescan: float - Seconds between manifest rescans
+            coalesce_cgi: Coalescer - Identical GET/HEAD requests to a
+                          CGI script running share its response
+            deadline: float - Default seconds views of routes could run,
+                      no deadline when None
+            templates: str - Directory of templates, relative
+                       to working directory
+            shared: SharedStore - Store shared with other processes
+                    of application, which keeps responses of routes
+                    cached and counts requests by route and status
         """
         self._name = name
 
@@ -70,8 +111,39 @@ class Application:
         os.chdir(workdir)
 
         self._router = router.Router()
+        self._proxies = list()
+        self._websockets = dict()
+        self._broadcaster = Broadcaster()
+        self._profiler: Optional[Profiler] = None
         self._dfa = default_access_file
         self._executable = executable
+        self._cgi_coalescer = coalesce_cgi
+        self._deadline = deadline
+
+        # Requests answered when deadline passed, by route
+        self.timeouts: Dict[str, int] = dict()
+
+        # Templates compiled at first use
+        self.templates = Templates(templates)
+
+        # Cache and metrics shared by processes
+        self.shared = shared
+
+        # Static file manifest
+        self._manifest = None
+        if manifest:
+            self._manifest = StaticManifest(
+                '.', default_access_file, self.mimetype, rescan)
+            self._manifest.watch()
+
+        # Decode JSON request bodies with the same codec,
+        # passed to requests so other applications keep theirs
+        self._json = json or jsoncodec.default
+
+    @property
+    def json(self) -> jsoncodec.JSONCodec:
+        """Codec of JSON requests and responses"""
+        return self._json
 
     def real_path(self, path: str) -> str:
         """
@@ -96,16 +168,54 @@ class Application:
 
         return "./" + path.strip('/'), '.' + suffix[0]
 
-    def route(self, path: str, methods: Optional[Iterable[str]] = ("GET")) -> NoReturn:
-        """Add route registry"""
+    def route(self, path: str, methods: Optional[Iterable[str]] = ("GET",),
+              ratelimit: Optional[RateLimiter] = None,
+              execution: Optional[str] = executor.INLINE,
+              coalesce: Optional[Coalescer] = None,
+              deadline: Optional[float] = None,
+              cache: Optional[float] = None) -> NoReturn:
+        """
+        Add route registry
+
+        Parameters:
+            path: str - Request path
+            methods: Iterable[str] - Methods accepted by route
+            ratelimit: RateLimiter - Limiter for clients of route,
+                       over-limit client will get HTTP-429
+            execution: str - Where view runs: "inline" in worker
+                       serving connection, "thread" in shared thread
+                       pool for blocking IO, "process" in shared process
+                       pool for CPU-bound views (request is pickled, and
+                       view must return picklable content)
+            coalesce: Coalescer - Identical GET/HEAD requests arriving
+                      while view is running wait for it, and share a
+                      copy of its response
+            deadline: float - Seconds view could run, the deadline of
+                      application when None, no deadline when 0.
+                      Client gets HTTP-504 when it passes, or HTTP-503
+                      when view had not started in executor. View could
+                      check request.deadline to stop early
+            cache: float - Seconds HTTP-200 responses to GET/HEAD
+                   are cached in shared store by path and query,
+                   for all processes of application
+        """
 
         for method in methods:
             if not method in consts.ACCEPT_METHODS:
                 raise errors.UnknownHTTPMethod(method)
+        if not execution in executor.MODES:
+            raise errors.InvalidExecution(execution)
+        if cache and self.shared is None:
+            raise errors.SharedStoreError("Cached route without shared store")
+
+        options = {"ratelimit": ratelimit, "execution": execution,
+                   "coalesce": coalesce, "deadline": deadline, "cache": cache}
 
         def wrapper(function: Callable[[Request], Union[Response, str, Tuple[int, str]]]):
             """Function Wrapper"""
-            self._router.add_record(path, methods, function)
+            if execution == executor.PROCESS:
+                options["view"] = executor.register(function)
+            self._router.add_record(path, methods, function, options)
 
             def params(*args, **kwargs):
                 """Transfer all params to handler function"""
@@ -117,6 +227,271 @@ class Application:
 
         return wrapper
 
+    def websocket(self, path: str, opened: Optional[Callable] = None,
+                  closed: Optional[Callable] = None,
+                  protocols: Optional[Iterable[str]] = (),
+                  execution: Optional[str] = executor.INLINE,
+                  max_size: Optional[int] = settings.WEBSOCKET_MAX_MESSAGE) -> NoReturn:
+        """
+        Add WebSocket endpoint, the decorated function
+        is called with every message received.
+
+        Parameters:
+            path: str - Request path
+            opened: Callable[[WebSocket], None] - Called when connected
+            closed: Callable[[WebSocket], None] - Called when closed
+            protocols: Iterable[str] - Subprotocols supported
+            execution: str - Where callbacks run: "inline" in server
+                       loop (must not block), "thread" in shared
+                       thread pool, in order for each client
+            max_size: int - Max size of message received
+        Usage:
+            @websocket("/echo")
+            def echo(socket: WebSocket, message: str | bytes)
+        """
+        def wrapper(function: Callable):
+            """Function Wrapper"""
+            self._websockets[path] = Endpoint(
+                function, opened, closed, protocols, execution, max_size)
+            return function
+
+        return wrapper
+
+    def endpoint(self, path: str) -> Optional[Endpoint]:
+        """
+        Get WebSocket endpoint of path, None when not registered
+        """
+        return self._websockets.get(path, None)
+
+    def publish(self, topic: str, data, event: Optional[str] = None) -> int:
+        """
+        Publish message to subscribers of topic, dict and
+        list are serialised as JSON. Return message identifier.
+
+        Parameters:
+            topic: str - Topic name
+            data: str | bytes | dict | list - Message
+            event: str - Event type of message
+        Usage:
+            publish("events", {"name": "work"}, "created")
+        """
+        if isinstance(data, (dict, list)):
+            data = self._json.dumps(data)
+        return self._broadcaster.publish(topic, data, event)
+
+    def subscribe(self, request: Request, topic: str) -> EventStream:
+        """
+        Make Server-Sent Events response subscribing client
+        to topic, returned by view. Messages after
+        Last-Event-ID of request are replayed.
+
+        Usage:
+            @route("/events/live")
+            def live(request): return subscribe(request, "events")
+        """
+        return self._broadcaster.stream(request, topic)
+
+    def render(self, template: str, context: Optional[dict] = None,
+               code: Optional[int] = 200, stream: Optional[bool] = False) -> Response:
+        """
+        Render template of templates directory as HTML response,
+        values in context are escaped unless marked safe.
+
+        Parameters:
+            template: str - Template name, like "index.html"
+            context: dict - Values used by template
+            code: int - HTTP Response code
+            stream: bool - Send chunks while rendering, for large
+                    pages (errors then cut the response)
+        Usage:
+            @route("/hello")
+            def hello(request): return render("hello.html", {"user": "Flaks"})
+        """
+        if stream:
+            return Response(code, stream=self.templates.stream(template, context),
+                            content_type="text/html")
+        return Response(code, self.templates.render(template, context),
+                        content_type="text/html")
+
+    def proxy(self, prefix: str, upstreams: Iterable, **options) -> ReverseProxy:
+        """
+        Proxy requests under path prefix to upstream servers,
+        bodies of these requests are streamed to upstream.
+
+        Parameters:
+            prefix: str - Path prefix proxied, like "/api"
+            upstreams: Iterable - Upstream "host:port" addresses
+            options: dict - Options of proxy, see proxy.ReverseProxy
+        Usage:
+            proxy("/api", ["127.0.0.1:8001", "127.0.0.1:8002"])
+        """
+        proxy = ReverseProxy(prefix, upstreams, **options)
+        self._proxies.append(proxy)
+        self._proxies.sort(key=lambda item: len(item.prefix), reverse=True)
+        Request.register_deferred_prefix(prefix)
+        proxy.watch()
+        return proxy
+
+    def profile(self, profiler: Optional[Profiler] = None,
+                admin: Optional[str] = settings.PROFILE_ADMIN_PATH) -> Profiler:
+        """
+        Profile sampled requests with profiler,
+        reports are served on admin path.
+
+        Parameters:
+            profiler: Profiler - Profiler used, sampling with
+                      PROFILE_SAMPLE_RATE when not given
+            admin: str - Path of report, None to disable
+        Usage:
+            profile(Profiler(0.05, token="secret"))
+        """
+        self._profiler = profiler or Profiler()
+        if admin:
+            self._router.add_record(admin, ("GET",), self._profiler.view)
+        return self._profiler
+
+    def _route_key(self, request: Request) -> str:
+        """
+        Key of route stats aggregated into: routes, proxies
+        and CGI scripts by path, other static files together.
+        """
+        path = request.path
+        for proxy in self._proxies:
+            if proxy.match(path):
+                return request.method + ' ' + proxy.prefix + "/*"
+        if path in self._router or \
+                path.startswith(settings.CGI_CATALOGUE.lstrip('.')):
+            return request.method + ' ' + path
+        return request.method + " <static>"
+
+    def make_response(self, request: Request, content) -> Response:
+        """
+        Make Response from what view function returned:
+            Response instance - return as it is
+            (code, content) - response with code
+            (code, content, headers) - response with code and headers,
+                                       (content, code[, headers]) too
+            dict / list - serialised as JSON if client accepts
+            others - response content
+        """
+        if isinstance(content, Response):
+            return content
+
+        code, headers = 200, None
+        if isinstance(content, tuple):
+            if not len(content) in (2, 3):
+                raise errors.InvalidViewResult(
+                    "View returned tuple of {} items".format(len(content)))
+            if isinstance(content[0], int):
+                code, content, *headers = content
+            else:
+                content, code, *headers = content
+            if not isinstance(code, int):
+                raise errors.InvalidViewResult(
+                    "View returned tuple without code: " + repr(code))
+            headers = headers[0] if headers else None
+
+        if isinstance(content, (dict, list)):
+            if not request.accepts("application/json"):
+                return Response(406)
+            return Response(code, self._json.dumps(content), headers=headers,
+                            content_type="application/json")
+
+        return Response(code, content, headers=headers)
+
+    def _submit(self, request: Request, execution: str, view) -> Future:
+        """
+        Run view in executor, return future of Response
+        resolved in executor without blocking caller.
+        With deadline of request, the future is resolved
+        when it passes, and view dropped if not started.
+        """
+        result = Future()
+
+        def done(future: Future):
+            if future.cancelled():
+                return
+            try:
+                response = self.make_response(request, future.result())
+            except errors.DeadlineExceeded as _error:
+                response = self._expired(request)
+            except Exception as _error:
+                print(_error)
+                response = Response(502)
+            settle(result, response)
+
+        work = executor.submit(execution, view, request)
+        work.add_done_callback(done)
+        if request.deadline is not None:
+            bound(result, request.deadline,
+                  lambda started: self._expired(request, started), work)
+        return result
+
+    def _expired(self, request: Request, started: bool = True) -> Response:
+        """
+        Count request whose deadline passed, return HTTP-504,
+        or HTTP-503 when its view never started.
+        Request cancelled by timer is counted already.
+        """
+        if request.deadline.cancelled:
+            return Response(504)
+        key = self._route_key(request)
+        self.timeouts[key] = self.timeouts.get(key, 0) + 1
+        return Response(504 if started else 503)
+
+    def _view(self, request: Request, handler: Callable,
+              options: utils.DynamicDict) -> Union[Response, Future]:
+        """
+        Call view of route where its options ask,
+        return Response, or future of it from executor.
+        With deadline, inline view is returned as Task
+        run by the worker serving the request.
+        """
+        timeout = self._deadline if options.deadline is None else options.deadline
+        if timeout:
+            request.deadline = Deadline(timeout)
+
+        if options.execution in (executor.THREAD, executor.PROCESS):
+            view = handler if options.view is None else options.view
+            return self._submit(request, options.execution, view)
+
+        if not timeout:
+            content = handler(request)
+            return self.make_response(request, content)
+
+        def call() -> Response:
+            try:
+                return self.make_response(request, handler(request))
+            except errors.DeadlineExceeded as _error:
+                return self._expired(request)
+            except Exception as _error:
+                print(_error)
+                return Response(502)
+
+        return Task(call, request.deadline, lambda: self._expired(request))
+
+    def _coalesce(self, coalescer: Coalescer, request: Request,
+                  function: Callable) -> Union[Response, Future]:
+        """
+        Run function answering request with coalescer,
+        followers get HTTP-502 when it raised (which is
+        printed once by the request running it).
+        """
+        result = coalescer.run(request, function)
+        if not isinstance(result, Future) or isinstance(result, Task):
+            return result
+
+        response = Future()
+
+        def done(future: Future):
+            try:
+                response.set_result(future.result())
+            except Exception as _error:
+                response.set_result(Response(502))
+
+        result.add_done_callback(done)
+        return response
+
     def _distrbuted_cgi(self, scriptfile: str, environ: dict) -> Response:
         """
         Distrubuted CGI Support
@@ -160,21 +535,130 @@ class Application:
 
     def respond(self, request: Request) -> Response:
         """
-        Respond to requests from WSGIServer
+        Respond to requests from WSGIServer,
+        profiled when profiler samples the request.
+        """
+        profiler = self._profiler
+        if profiler is None or not profiler.sampled(request):
+            response = self._respond(request)
+        else:
+            route = self._route_key(request)
+            response = profiler.run(route, self._respond, request)
+
+            # View runs later in task, profiled into the same sample
+            if isinstance(response, Task):
+                view = response.function
+                response.function = lambda: profiler.run(route, view, sample=False)
+
+        if self.shared is not None:
+            self._count(request, response)
+        return response
+
+    def _count(self, request: Request, response: Union[Response, Future]):
+        """
+        Count request in shared counters: requests,
+        status.<code>, and route.<route key>.
+        """
+        shared = self.shared
+        shared.incr("requests")
+        shared.incr("route." + self._route_key(request))
+        if not isinstance(response, Future):
+            shared.incr("status." + str(response.code))
+            return
+
+        def done(future: Future):
+            code = 502
+            if not future.exception() and isinstance(future.result(), Response):
+                code = future.result().code
+            shared.incr("status." + str(code))
+
+        response.add_done_callback(done)
+
+    @staticmethod
+    def _cache_key(request: Request) -> str:
+        """Key of response cached, HEAD shares it with GET"""
+        key = "response GET " + request.path
+        if request.query:
+            key += '?' + request.query
+        return key
+
+    def _cached(self, request: Request, ttl: float,
+                function: Callable) -> Union[Response, Future]:
+        """
+        Answer request with response cached in shared store,
+        or run function and cache what it answers when it is
+        an HTTP-200 which could be copied (not streamed).
+        """
+        key = self._cache_key(request)
+        data = self.shared.get(key)
+        if data is not None:
+            try:
+                response = Response.loads(data)
+                self.shared.incr("cache.hits")
+                return response
+            except ValueError as _error:
+                print(_error)
+        self.shared.incr("cache.misses")
+
+        def store(response):
+            if isinstance(response, Response) and response.code == 200:
+                data = response.dumps()
+                if data is not None:
+                    self.shared.set(key, data, ttl)
+
+        result = function()
+        if isinstance(result, Future):
+            result.add_done_callback(
+                lambda done: None if done.cancelled() or done.exception()
+                else store(done.result()))
+        else:
+            store(result)
+        return result
+
+    def _respond(self, request: Request) -> Response:
+        """
+        Respond to requests
 
-        First look through the router, and return HTTP-405
+        Requests under proxied prefixes are forwarded to upstreams.
+        Then look through the router, and return HTTP-405
         if there is no suitable processing method;
         If no corresponding path is found,
         continue to look for it in the working 
         directory according to the static file.
         """
+        # Longest matched proxy prefix goes first
+        for proxy in self._proxies:
+            if proxy.match(request.path):
+                return proxy(request)
+
+        # WebSocket endpoint requested without upgrading
+        if request.path in self._websockets:
+            return Response(426, headers={
+                "Upgrade": "websocket", "Connection": "Upgrade"})
+
         try:
             method, path = request.method, request.path
             handler = self._router.match(path, method)
-            content = handler(request)
-            if isinstance(content, Response):
-                return content
-            return Response(200, content)
+            options = self._router.options(path, method)
+
+            # Throttle clients sending too fast
+            if options.ratelimit:
+                wait = options.ratelimit.acquire(request)
+                if wait:
+                    retry = {"Retry-After": math.ceil(wait)}
+                    return Response(429, headers=retry)
+
+            def view():
+                # Identical requests share one computation
+                if options.coalesce and method in consts.SAFE_METHODS:
+                    return self._coalesce(options.coalesce, request,
+                                          lambda: self._view(request, handler, options))
+                return self._view(request, handler, options)
+
+            # Responses cached for other processes too
+            if options.cache and method in ("GET", "HEAD"):
+                return self._cached(request, options.cache, view)
+            return view()
 
         # When not suitable method
         except errors.NoSuitableMethod as _error:
@@ -189,19 +673,39 @@ class Application:
             print(_error)
             return Response(502)
 
-        path, suffix = self.real_path(path)
-        if not os.path.isfile(path):
-            return Response(404)
+        # Static files - from manifest or filesystem
+        if self._manifest is not None:
+            static = self._manifest.lookup(path)
+            if static is None:
+                return Response(404)
+            path, suffix, hedaer = static.path, static.suffix, static.headers
+            size = static.size
+        else:
+            path, suffix = self.real_path(path)
+            if not os.path.isfile(path):
+                return Response(404)
+            size = os.path.getsize(path)
+            mime = self.mimetype.get(suffix, "text/plain")
+            hedaer = utils.DynamicDict({"Content-Type": mime})
 
         # CGI Execute support
         if suffix in self._executable and path.startswith(settings.CGI_CATALOGUE):
-            try:
+            def execute():
                 return self._distrbuted_cgi(path, request.environ)
+
+            try:
+                if self._cgi_coalescer and request.method in consts.SAFE_METHODS:
+                    return self._coalesce(self._cgi_coalescer, request, execute)
+                return execute()
             except Exception as _error:
                 print(_error)
                 return Response(502)
 
-        with open(path, 'r') as handler:
-            mime = self.mimetype.get(suffix, "text/plain")
-            hedaer = utils.DynamicDict({"Content-Type": mime})
-            return Response(200, handler.read(), headers=hedaer)
+        try:
+            # Large files are sent with sendfile by server
+            if size > settings.SENDFILE_THRESHOLD:
+                return Response(200, headers=hedaer, file=path)
+            with open(path, "rb") as handler:
+                return Response(200, handler.read(), headers=hedaer)
+        except OSError as _error:
+            return Response(404)
@@ -0,0 +1,97 @@
+"""
+Receive buffer pool
+
+Connections receive into bytearray buffers taken from a pool
+with socket.recv_into, instead of allocating a bytes object for
+every recv and copying it again into their buffer. A connection
+holds a buffer while a request is read and answered, and gives
+it back when it goes idle, so idle keep-alive connections hold
+no memory for reading.
+
+Buffers are pooled by size class, a buffer larger than the
+largest class is allocated for the request needing it and
+left to the garbage collector.
+"""
+
+import bisect
+import collections
+
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+
+from . import settings
+
+
+class BufferPool:
+    """
+    Free lists of receive buffers by size class.
+
+    Taking and giving back buffers takes no lock,
+    deque append and pop are atomic.
+
+    hits - buffers taken from free lists
+    misses - buffers allocated, free list of size was empty
+    """
+
+    def __init__(self, sizes: Optional[Iterable[int]] = settings.BUFFER_SIZES,
+                 keep: Optional[int] = settings.BUFFER_POOL_SIZE):
+        """
+        Initialize a pool.
+
+        Parameters:
+            sizes: Iterable[int] - Sizes of buffers pooled
+            keep: int - Free buffers kept of each size
+        Usage Example:
+            BufferPool((16384, 65536), keep=64)
+        """
+        self.sizes = sorted(sizes)
+        self._keep = keep
+        self._free: Dict[int, collections.deque] = {
+            size: collections.deque() for size in self.sizes}
+        self.hits = 0
+        self.misses = 0
+
+    def size(self, size: int) -> int:
+        """Size of buffer given for size bytes"""
+        index = bisect.bisect_left(self.sizes, size)
+        return self.sizes[index] if index < len(self.sizes) else size
+
+    def acquire(self, size: int) -> bytearray:
+        """
+        Take buffer of at least size bytes, from free list
+        of the smallest class size fits in.
+        """
+        size = self.size(size)
+        free = self._free.get(size, None)
+        if free:
+            try:
+                buffer = free.pop()
+                self.hits += 1
+                return buffer
+            except IndexError as _error:
+                pass
+        self.misses += 1
+        return bytearray(size)
+
+    def release(self, buffer: bytearray):
+        """
+        Give buffer back, nothing should use it after,
+        dropped when its free list is full.
+        """
+        free = self._free.get(len(buffer), None)
+        if free is not None and len(free) < self._keep:
+            free.append(buffer)
+
+    @property
+    def free(self) -> int:
+        """Buffers in free lists"""
+        return sum(len(free) for free in self._free.values())
+
+    def stats(self) -> dict:
+        """Counters of pool"""
+        return {"hits": self.hits, "misses": self.misses, "free": self.free}
+
+
+# Buffers of all connections
+pool = BufferPool()
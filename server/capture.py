@@ -0,0 +1,189 @@
+"""
+Traffic capture
+
+Sampled requests are recorded as raw bytes with their arrival
+time to an append-only file, with status and body checksum of
+the response they got, so they could be replayed against a server
+at the original rate (see benchmarks/replay.py) and responses
+compared. Requests with deferred bodies (proxied), upgrades and
+event streams are not captured.
+
+File layout, numbers in network byte order:
+    MAGIC
+    record: arrived (double), size (uint32), status (uint16),
+            checksum (uint32), then size bytes of raw request
+"""
+
+import os
+import zlib
+import struct
+import random
+import threading
+
+from concurrent.futures import Future
+
+from typing import Union
+from typing import Iterator
+from typing import Optional
+from typing import NamedTuple
+
+from . import settings
+from .events import EventStream
+from .response import Response
+
+
+MAGIC = b"FLAKSCAP\x01\n"
+HEADER = struct.Struct("!dIHI")
+
+
+class Record(NamedTuple):
+    """Request captured"""
+    arrived: float
+    data: bytes
+    status: int
+    checksum: int
+
+
+def checksum(body: Union[str, bytes]) -> int:
+    """Checksum of response body compared when replaying"""
+    if not isinstance(body, bytes):
+        body = str(body).encode()
+    return zlib.crc32(body)
+
+
+def _checksum(data: bytes, response: Response) -> int:
+    """
+    Checksum of response body, 0 when body is not known
+    at capture (file, stream) or not sent (HEAD).
+    """
+    if response.stream is not None or response.file is not None:
+        return 0
+    if data.startswith(b"HEAD "):
+        return 0
+    return checksum(response.data)
+
+
+class Capture:
+    """
+    Append-only capture file.
+
+    Requests are sampled with rate, capture stops when file
+    reaches max_bytes, larger requests than max_request are
+    skipped. Records are written with one write each, so a
+    capture file is readable while server running.
+
+    records - requests captured
+    skipped - requests sampled but not captured
+    """
+
+    def __init__(self, path: str, rate: Optional[float] = settings.CAPTURE_SAMPLE_RATE,
+                 max_bytes: Optional[int] = settings.CAPTURE_MAX_BYTES,
+                 max_request: Optional[int] = settings.CAPTURE_MAX_REQUEST):
+        """
+        Initialize a capture, appending to file of path.
+
+        Parameters:
+            path: str - Capture file
+            rate: float - Fraction of requests captured
+            max_bytes: int - Size of file when capture stops
+            max_request: int - Max size of one request captured
+        Usage Example:
+            HTTPServer(("0.0.0.0", 80), capture=Capture("traffic.cap", 0.1))
+        """
+        self.path = path
+        self._rate = rate
+        self._max_bytes = max_bytes
+        self._max_request = max_request
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._size = os.fstat(self._fd).st_size
+        if not self._size:
+            self._size = os.write(self._fd, MAGIC)
+        self.records = 0
+        self.skipped = 0
+
+    @property
+    def full(self) -> bool:
+        """Whether capture stopped for size of file"""
+        return self._size >= self._max_bytes
+
+    @property
+    def size(self) -> int:
+        """Bytes of capture file"""
+        return self._size
+
+    def sampled(self) -> bool:
+        """Whether next request should be captured"""
+        if self._fd is None or self.full:
+            return False
+        return self._rate >= 1 or random.random() < self._rate
+
+    def record(self, arrived: float, data: bytes, response: Union[Response, Future]):
+        """
+        Record request with response it got, which
+        is recorded when done if it is a future.
+
+        Parameters:
+            arrived: float - Time request arrived
+            data: bytes - Raw request, head and body
+            response: Response | Future - Response of request
+        """
+        if len(data) > self._max_request:
+            self.skipped += 1
+            return
+        if isinstance(response, Future):
+            response.add_done_callback(
+                lambda done: self._write(arrived, data, done.result()
+                                         if not done.exception() else None))
+            return
+        self._write(arrived, data, response)
+
+    def _write(self, arrived: float, data: bytes, response: Optional[Response]):
+        """Append record, status 0 when response failed"""
+        if isinstance(response, EventStream):
+            self.skipped += 1
+            return
+        status = digest = 0
+        if isinstance(response, Response):
+            status, digest = response.code, _checksum(data, response)
+        record = HEADER.pack(arrived, len(data), status, digest) + data
+
+        with self._lock:
+            if self._fd is None or self.full:
+                self.skipped += 1
+                return
+            try:
+                self._size += os.write(self._fd, record)
+                self.records += 1
+            except OSError as _error:
+                print(_error)
+                self.skipped += 1
+
+    def close(self):
+        """Stop capturing and close file"""
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+
+def read(path: str) -> Iterator[Record]:
+    """
+    Read records of capture file in the order written,
+    a record cut off at the end of file is left.
+
+    Usage:
+        for record in read("traffic.cap"): ...
+    """
+    with open(path, "rb") as handler:
+        if handler.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a capture file: " + path)
+        while True:
+            header = handler.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            arrived, size, status, digest = HEADER.unpack(header)
+            data = handler.read(size)
+            if len(data) < size:
+                return
+            yield Record(arrived, data, status, digest)
@@ -0,0 +1,243 @@
+"""
+Channels served by server loop
+
+Connections kept open after their handshake or response
+headers (WebSocket, event streams) are served by the server
+loop on the non-blocking socket, so an idle one holds no
+worker, only its buffers. Each channel has a send queue written
+whenever the socket is writable: reading from client pauses
+while the queue is above the high water mark, and the client
+is dropped when it falls too far behind.
+"""
+
+import ssl
+import threading
+import selectors
+import collections
+
+from typing import Callable
+
+from . import settings
+from .connection import Connection
+
+
+class Channel:
+    """
+    Connection served by server loop.
+
+    Data could be queued from any thread, the other
+    methods are called by server loop only.
+    Subclasses handle data received in _received.
+    """
+
+    # Recv calls in one loop iteration before other events handled
+    READ_BATCH = 16
+
+    __slots__ = ("watching", "_connection", "_socket", "_notify", "_lock",
+                 "_buffer", "_queue", "_queued", "_high_water", "_max_queue",
+                 "_notified", "_blocked", "_stalled", "_closing", "_done",
+                 "_aborted", "_released")
+
+    def __init__(self, connection: Connection, notify: Callable[["Channel"], None],
+                 high_water: int, max_queue: int):
+        """
+        Initialize a channel of connection.
+
+        Parameters:
+            connection: Connection - Connection kept open
+            notify: Callable[[Channel], None] - Ask server loop to
+                    handle the channel again, from any thread
+            high_water: int - Bytes queued before reading pauses
+            max_queue: int - Bytes queued before client dropped
+        """
+        # Events server loop watches for
+        self.watching = 0
+
+        self._connection = connection
+        self._socket = connection.socket
+        self._socket.setblocking(False)
+        self._notify = notify
+        self._lock = threading.Lock()
+
+        # Data received, including what came with the request
+        self._buffer = connection.detach()
+
+        # Data to send, and bytes of it
+        self._queue = collections.deque()
+        self._queued = 0
+        self._high_water = high_water
+        self._max_queue = max_queue
+
+        self._notified = False
+        self._blocked = False
+        self._stalled = True
+
+        # No more data queued after closing, done when
+        # nothing more expected from client
+        self._closing = False
+        self._done = False
+        self._aborted = False
+        self._released = False
+
+    def fileno(self) -> int:
+        """Return file descriptor of socket, used by selectors"""
+        return self._socket.fileno()
+
+    @property
+    def buffered(self) -> int:
+        """Bytes queued but not sent yet"""
+        return self._queued
+
+    @property
+    def paused(self) -> bool:
+        """Whether reading stopped until queue drained"""
+        return self._queued >= self._high_water
+
+    @property
+    def finished(self) -> bool:
+        """Whether connection could be released"""
+        if self._aborted:
+            return True
+        return self._closing and self._done and not self._queue
+
+    @property
+    def released(self) -> bool:
+        """Whether socket closed"""
+        return self._released
+
+    @property
+    def events(self) -> int:
+        """Events server loop should watch for"""
+        events = 0
+        if not self.paused:
+            events |= selectors.EVENT_READ
+        if self._blocked:
+            events |= selectors.EVENT_WRITE
+        return events
+
+    def _send(self, data: bytes, control: bool = False) -> bool:
+        """
+        Queue data and wake up server loop to send it,
+        only control data is queued after closing.
+        Client not reading is dropped when queue is full.
+        Return whether queue is below high water mark.
+        """
+        with self._lock:
+            if self._aborted or (self._closing and not control):
+                return False
+            if self._queued + len(data) > self._max_queue:
+                self._aborted = True
+                self._overflowed()
+                below = False
+            else:
+                self._queue.append(data)
+                self._queued += len(data)
+                below = self._queued < self._high_water
+
+            notify = not self._notified
+            self._notified = True
+        if notify:
+            self._notify(self)
+        return below
+
+    def _overflowed(self):
+        """Called when client dropped for its full queue"""
+        pass
+
+    def handle(self, mask: int):
+        """
+        Read when socket is readable (or reading stopped
+        before it was drained), send queued data.
+        Called by server loop.
+        """
+        with self._lock:
+            self._notified = False
+        if self._aborted:
+            return
+        if mask & selectors.EVENT_READ or self._stalled:
+            self._read()
+        if self._queue:
+            self._flush()
+
+    def release(self):
+        """Close socket of finished channel, called by server loop"""
+        self._released = True
+        self._connection.close()
+
+    def _received(self):
+        """Handle data in buffer, which is dropped by default"""
+        self._buffer.clear()
+
+    def _read(self):
+        """
+        Receive until socket would block, at most READ_BATCH
+        times, and handle the data received.
+        """
+        self._stalled = False
+        for _ in range(self.READ_BATCH):
+            self._received()
+            if self._aborted:
+                return
+            if self.paused:
+                self._stalled = True
+                return
+            try:
+                data = self._socket.recv(settings.RECV_CHUNK_SIZE)
+            except (BlockingIOError, InterruptedError,
+                    ssl.SSLWantReadError, ssl.SSLWantWriteError) as _error:
+                return
+            except OSError as _error:
+                data = b''
+            if not data:
+                self._abort()
+                return
+            self._buffer += data
+
+        # Socket may not be drained, continue in next iteration
+        self._stalled = True
+        self._notify(self)
+
+    def _abort(self):
+        """Drop connection without sending what is queued"""
+        with self._lock:
+            self._aborted = True
+            self._queue.clear()
+            self._queued = 0
+
+    def _flush(self):
+        """
+        Send queued data until socket would block,
+        server loop then waits for it being writable.
+        """
+        with self._lock:
+            queue = self._queue
+            resume = self.paused
+            while queue:
+                if len(queue) > 1:
+                    data = b''.join(queue)
+                    queue.clear()
+                    queue.append(data)
+                data = queue[0]
+                try:
+                    sent = self._socket.send(data)
+                except (BlockingIOError, InterruptedError,
+                        ssl.SSLWantReadError, ssl.SSLWantWriteError) as _error:
+                    self._blocked = True
+                    break
+                except OSError as _error:
+                    self._aborted = True
+                    queue.clear()
+                    self._queued = 0
+                    break
+                self._queued -= sent
+                if sent < len(data):
+                    queue[0] = data[sent:]
+                else:
+                    queue.popleft()
+            else:
+                self._blocked = False
+            resume = resume and not self.paused
+
+        # Continue reading stopped by backpressure
+        if resume:
+            self._read()
@@ -0,0 +1,169 @@
+"""
+Single-flight request coalescing
+
+Identical requests arriving while one of them is being
+answered wait for that one instead of running the handler
+(or CGI script) again, and all get a copy of its response.
+Followers are answered with futures, so they hold no worker
+while waiting.
+"""
+
+import threading
+
+from concurrent.futures import Future
+
+from typing import Dict
+from typing import Union
+from typing import Hashable
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+from . import settings
+from . import executor
+from .deadline import Task
+from .response import Response
+
+
+class Coalescer:
+    """
+    Single-flight group keyed by request.
+
+    Requests are identical when method, path, query and
+    values of selected headers are the same, headers which
+    personalise response (like Cookie) should be selected.
+
+    leaders - computations run
+    coalesced - requests answered by computation of another
+    """
+
+    def __init__(self, key: Optional[Callable] = None,
+                 headers: Optional[Iterable[str]] = settings.COALESCE_HEADERS):
+        """
+        Initialize a coalescer.
+
+        Parameters:
+            key: Callable[[Request], Hashable] - Function which
+                 generate key of request, requests with same key
+                 are coalesced, the default key is used when None
+            headers: Iterable[str] - Headers in the default key
+        Usage Example:
+            Coalescer(headers=("Accept", "Cookie"))
+        """
+        self._key = key
+        self._headers = tuple(headers)
+        self._flights: Dict[Hashable, Future] = dict()
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def key(self, request) -> Hashable:
+        """Generate key of request"""
+        if callable(self._key):
+            return self._key(request)
+        values = tuple(request.headers.get(name, None) for name in self._headers)
+        return request.method, request.path, request.query, values
+
+    @property
+    def inflight(self) -> int:
+        """Number of computations running"""
+        return len(self._flights)
+
+    def run(self, request, function: Callable[[], Union[Response, Future]]) -> Union[Response, Future]:
+        """
+        Run function answering request, or wait for the same
+        computation already running. Function returns Response,
+        or future of it.
+
+        The caller running function gets its result, followers
+        get future of a copy. Exception raised by function is
+        raised to all of them. Followers run function themselves
+        in thread pool when response cannot be copied (streamed).
+        """
+        key = self.key(request)
+        with self._lock:
+            flight = self._flights.get(key, None)
+            if flight is None:
+                flight = self._flights[key] = Future()
+                self.leaders += 1
+            else:
+                self.coalesced += 1
+                return self._follow(flight, function)
+
+        try:
+            result = function()
+        except BaseException as _error:
+            self._land(key, flight, None, _error)
+            raise
+
+        if isinstance(result, Future):
+            result.add_done_callback(
+                lambda done: self._land(key, flight, done))
+        else:
+            self._land(key, flight, result)
+        return result
+
+    def _land(self, key: Hashable, flight: Future, result,
+              error: Optional[BaseException] = None):
+        """
+        Computation done, share its response or exception
+        with followers. Requests arriving from now on
+        start a new computation.
+        """
+        with self._lock:
+            self._flights.pop(key, None)
+
+        if isinstance(result, Future):
+            error = result.exception()
+            result = None if error else result.result()
+        if error is not None:
+            flight.set_exception(error)
+            return
+
+        # Serialised once, each follower gets a copy of it
+        if isinstance(result, Response):
+            result = result.copy()
+        flight.set_result(result)
+
+    @staticmethod
+    def _follow(flight: Future, function: Callable) -> Future:
+        """
+        Future of response copied from computation of flight
+        """
+        response = Future()
+
+        def done(future: Future):
+            error = future.exception()
+            if error is not None:
+                response.set_exception(error)
+                return
+            result = future.result()
+            if result is None:
+                Coalescer._fallback(response, function)
+            elif isinstance(result, Response):
+                response.set_result(result.copy())
+            else:
+                response.set_result(result)
+
+        flight.add_done_callback(done)
+        return response
+
+    @staticmethod
+    def _fallback(response: Future, function: Callable):
+        """
+        Run function for follower in thread pool,
+        when response of leader cannot be shared.
+        """
+        def compute():
+            try:
+                result = function()
+                # Inline view with deadline runs in this thread
+                if isinstance(result, Task):
+                    result.run()
+                if isinstance(result, Future):
+                    result = result.result()
+                response.set_result(result)
+            except BaseException as _error:
+                response.set_exception(_error)
+
+        executor.pool(executor.THREAD).submit(compute)
@@ -0,0 +1,242 @@
+"""
+Client connection
+
+Wraps an accepted socket with a read buffer,
+so the request head and body can be read from
+it incrementally by the worker serving it.
+The buffer is taken from the pool of server.buffers
+while the connection is served.
+"""
+
+import ssl
+import socket
+
+from typing import Tuple
+from typing import Optional
+
+from . import errors
+from . import settings
+from .buffers import pool
+
+
+class Connection:
+    """
+    An accepted client connection.
+
+    Data is received into a buffer taken from the pool,
+    data received beyond what the caller asked for stays
+    in it for the next read. The buffer goes back to the
+    pool with release once everything in it was read.
+    """
+
+    # Separator between request head and body
+    HEAD_END = b"\r\n\r\n"
+
+    # Least room made in buffer before receiving
+    MIN_RECV = 1024
+
+    def __init__(self, sock: socket.socket, client: Tuple[str, int],
+                 timeout: Optional[float] = settings.CONNECTION_TIMEOUT):
+        """
+        Initialize a connection.
+
+        Parameters:
+            sock: socket.socket - Accepted socket
+            client: Tuple[str, int] - Client's address
+            timeout: float - Seconds to wait for client data
+        """
+        self.socket = sock
+        self.client = client
+        self.closing = False
+        sock.settimeout(timeout)
+
+        # Pooled buffer, data not read yet is [_start:_end]
+        self._data = None
+        self._view = None
+        self._start = 0
+        self._end = 0
+
+        # HTTP/1.1 request upgraded to another protocol
+        self.upgraded = None
+
+        # Protocol informations of TLS connection
+        self.scheme = "http"
+        self.protocol = None
+        if isinstance(sock, ssl.SSLSocket):
+            self.scheme = "https"
+            self.protocol = sock.selected_alpn_protocol()
+
+    @property
+    def buffered(self) -> int:
+        """Bytes received and not read yet"""
+        return self._end - self._start
+
+    @property
+    def pipelined(self) -> bool:
+        """
+        Whether a complete request head is already in buffer,
+        which means client pipelined more than one request.
+        """
+        self._drain()
+        if self._data is None:
+            return False
+        return self._data.find(self.HEAD_END, self._start, self._end) != -1
+
+    def _drain(self):
+        """
+        Move data decrypted but not read from TLS socket into buffer,
+        selectors cannot see it as it is no longer in kernel.
+        """
+        pending = getattr(self.socket, "pending", None)
+        while pending and pending():
+            self._fill(pending())
+
+    def fileno(self) -> int:
+        """Return file descriptor of socket, used by selectors"""
+        return self.socket.fileno()
+
+    def close(self):
+        """Close the socket, data not read is dropped"""
+        self.socket.close()
+        self._start = self._end
+        self.release()
+
+    def release(self):
+        """
+        Give buffer back to pool when everything in it was read,
+        called when connection goes idle or closed.
+        """
+        if self._data is None or self._start != self._end:
+            return
+        data = self._data
+        self._data = self._view = None
+        self._start = self._end = 0
+        pool.release(data)
+
+    def detach(self) -> bytearray:
+        """
+        Take data not read yet out of buffer, into a bytearray
+        kept by caller serving connection from now on.
+        """
+        if self._data is None:
+            return bytearray()
+        data = bytearray(self._view[self._start:self._end])
+        self._start = self._end
+        self.release()
+        return data
+
+    def unread(self, data: bytes):
+        """Put data back in front of buffer, to be read again"""
+        size = len(data)
+        if self._start < size:
+            self._reserve(size)
+            view, start, end = self._view, self._start, self._end
+            view[start + size:end + size] = view[start:end]
+            self._start, self._end = start + size, end + size
+        self._start -= size
+        self._view[self._start:self._start + size] = data
+
+    def _reserve(self, size: int):
+        """
+        Make room for size bytes after data not read, moving
+        data to the front of buffer, or into a larger one.
+        """
+        data, buffered = self._data, self._end - self._start
+        if data is not None:
+            if len(data) - self._end >= size:
+                return
+            if len(data) >= buffered + size:
+                self._view[:buffered] = self._view[self._start:self._end]
+                self._start, self._end = 0, buffered
+                return
+
+        larger = pool.acquire(buffered + size)
+        view = memoryview(larger)
+        if buffered:
+            view[:buffered] = self._view[self._start:self._end]
+        self._start = self._end
+        self.release()
+        self._data, self._view = larger, view
+        self._start, self._end = 0, buffered
+
+    def _fill(self, size: Optional[int] = MIN_RECV) -> int:
+        """
+        Receive once from socket into buffer, making room for
+        size bytes at least, as much as buffer holds is received.
+        Return number of bytes received, 0 means peer closed.
+        """
+        self._reserve(size)
+        received = self.socket.recv_into(self._view[self._end:])
+        self._end += received
+        return received
+
+    def read_head(self, limit: Optional[int] = settings.MAX_REQUEST_SIZE) -> Optional[bytes]:
+        """
+        Read request line and headers, including the
+        empty line after them, the body is left in buffer.
+        Return None when client closed the connection.
+
+        Parameters:
+            limit: int - Max size of request head
+        """
+        scanned = 0
+        while True:
+            if self._data is not None:
+                index = self._data.find(self.HEAD_END, self._start + scanned, self._end)
+                if index != -1:
+                    index += len(self.HEAD_END)
+                    head = bytes(self._view[self._start:index])
+                    self._start = index
+                    return head
+
+            buffered = self._end - self._start
+            if buffered > limit:
+                raise errors.PayloadTooLarge(buffered)
+
+            scanned = max(0, buffered - len(self.HEAD_END) + 1)
+            if not self._fill():
+                if self._end != self._start:
+                    raise errors.InvalidRequest(bytes(self._view[self._start:self._end]))
+                return None
+
+    def read(self, size: int) -> bytes:
+        """
+        Read at most size bytes, from buffer first,
+        return empty bytes when peer closed.
+        """
+        if self._start == self._end and \
+                not self._fill(min(size, settings.RECV_CHUNK_SIZE)):
+            return bytes()
+
+        size = min(size, self._end - self._start)
+        data = bytes(self._view[self._start:self._start + size])
+        self._start += size
+        return data
+
+    def read_exactly(self, size: int) -> bytes:
+        """
+        Read exactly size bytes, data stays in buffer until
+        all of it arrived, so a timeout loses nothing.
+        Return less bytes only when peer closed.
+        """
+        while self._end - self._start < size:
+            if not self._fill(max(size - self._end + self._start, self.MIN_RECV)):
+                break
+
+        size = min(size, self._end - self._start)
+        data = bytes(self._view[self._start:self._start + size]) if size else bytes()
+        self._start += size
+        return data
+
+    def sendall(self, data: bytes):
+        """Send all data to client"""
+        self.socket.sendall(data)
+
+    def sendfile(self, path: str, count: Optional[int] = None):
+        """
+        Send file to client, with zero-copy os.sendfile for plain
+        sockets (and kernel TLS sockets where supported),
+        falls back to send for the others.
+        """
+        with open(path, "rb") as handler:
+            self.socket.sendfile(handler, 0, count)
@@ -10,6 +10,19 @@ ACCEPT_METHODS = {
 # All methods which has request body
 HAS_BODY_METHODS = {"POST", "PUT", "DELETE", "PATCH"}
 
+# Methods could be retried without changing result
+IDEMPOTENT_METHODS = {"GET", "HEAD", "PUT", "DELETE", "OPTIONS", "TRACE"}
+
+# Methods which do not change server state
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Headers only meaningful for a single connection
+HOP_BY_HOP_HEADERS = {
+    "Connection", "Keep-Alive", "Proxy-Authenticate",
+    "Proxy-Authorization", "TE", "Trailer",
+    "Transfer-Encoding", "Upgrade"
+}
+
 # Response codes with descriptions
 HTTP_RESPONSE_DESCRIPTIONS = {
     100: 'Continue',
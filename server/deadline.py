@@ -0,0 +1,283 @@
+"""
+Deadlines of views
+
+Views of routes with a deadline get request.deadline, a
+cancellation token they could check or wait on. When the
+deadline passes before the view is done, the client is
+answered at once and what the view returns later is dropped.
+Threads cannot be killed, so a view never checking its
+deadline still holds its thread until it returns.
+"""
+
+import time
+import heapq
+import itertools
+import threading
+
+from concurrent.futures import Future
+from concurrent.futures import InvalidStateError
+
+from typing import List
+from typing import Callable
+from typing import Optional
+
+from . import errors
+
+
+class Deadline:
+    """
+    Cancellation token of a request.
+
+    remaining - seconds left before deadline
+    expired - deadline passed, or request cancelled
+    cancelled - server gave up the request
+    """
+
+    __slots__ = ("expires", "_event", "_callbacks", "_lock")
+
+    def __init__(self, timeout: float, expires: Optional[float] = None):
+        """
+        Initialize a deadline.
+
+        Parameters:
+            timeout: float - Seconds from now
+            expires: float - Monotonic time of deadline, instead of timeout
+        """
+        self.expires = time.monotonic() + timeout if expires is None else expires
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = list()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        """
+        Pickled for views in process pool as monotonic time only,
+        which is the same clock in worker processes.
+        """
+        return Deadline, (0, self.expires)
+
+    @property
+    def remaining(self) -> float:
+        """Seconds left before deadline"""
+        return max(0.0, self.expires - time.monotonic())
+
+    @property
+    def cancelled(self) -> bool:
+        """Whether server gave up the request"""
+        return self._event.is_set()
+
+    @property
+    def expired(self) -> bool:
+        """Whether view should stop working"""
+        return self._event.is_set() or time.monotonic() >= self.expires
+
+    def check(self):
+        """Raise DeadlineExceeded when expired"""
+        if self.expired:
+            raise errors.DeadlineExceeded(self.expires)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Sleep for timeout seconds at most, waking up when
+        request cancelled or deadline passed.
+        Return whether view should stop working.
+
+        Usage:
+            while not request.deadline.wait(0.5): poll()
+        """
+        remaining = self.remaining
+        if timeout is None or timeout > remaining:
+            timeout = remaining
+        self._event.wait(timeout)
+        return self.expired
+
+    def on_cancel(self, callback: Callable[[], None]):
+        """
+        Call callback when request cancelled, like closing
+        a socket view is blocked on. Called at once when
+        already cancelled, callbacks should not block.
+        """
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self):
+        """Cancel request, called by server when giving it up"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, list()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as _error:
+                print(_error)
+
+
+class Timers:
+    """
+    Timers run by one thread, started at first use.
+
+    Cancelled timers are left in heap until they come up,
+    the heap is compacted when most of it is cancelled.
+    """
+
+    # Cancelled timers kept before compacting
+    COMPACT_THRESHOLD = 1024
+
+    def __init__(self):
+        self._heap: List[list] = list()
+        self._sequence = itertools.count()
+        self._cancelled = 0
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def __len__(self) -> int:
+        """Number of timers waiting"""
+        return len(self._heap) - self._cancelled
+
+    def call_at(self, when: float, callback: Callable[[], None]) -> list:
+        """
+        Call callback in timer thread at monotonic time when,
+        return handle for cancel. Callback should not block.
+        """
+        entry = [when, next(self._sequence), callback]
+        with self._condition:
+            heapq.heappush(self._heap, entry)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timers")
+                self._thread.daemon = True
+                self._thread.start()
+            if self._heap[0] is entry:
+                self._condition.notify()
+        return entry
+
+    def cancel(self, entry: list):
+        """Cancel timer not called yet"""
+        with self._condition:
+            if entry[2] is None:
+                return
+            entry[2] = None
+            self._cancelled += 1
+            if self._cancelled > self.COMPACT_THRESHOLD and \
+                    self._cancelled * 2 > len(self._heap):
+                self._heap = [item for item in self._heap if item[2] is not None]
+                heapq.heapify(self._heap)
+                self._cancelled = 0
+
+    def _next(self) -> Callable[[], None]:
+        """Wait for the earliest timer coming up, return its callback"""
+        with self._condition:
+            heap = self._heap
+            while True:
+                while heap and heap[0][2] is None:
+                    heapq.heappop(heap)
+                    self._cancelled -= 1
+                now = time.monotonic()
+                if heap and heap[0][0] <= now:
+                    entry = heapq.heappop(heap)
+                    callback, entry[2] = entry[2], None
+                    return callback
+                self._condition.wait(heap[0][0] - now if heap else None)
+                heap = self._heap
+
+    def _run(self):
+        """Call timers coming up"""
+        while True:
+            callback = self._next()
+            try:
+                callback()
+            except Exception as _error:
+                print(_error)
+
+
+# Timers of all deadlines
+timers = Timers()
+
+
+def settle(future: Future, result) -> bool:
+    """
+    Set result of future unless it is done,
+    return whether the result is set.
+    """
+    try:
+        future.set_result(result)
+    except InvalidStateError as _error:
+        return False
+    return True
+
+
+class Task(Future):
+    """
+    Future of a view run by the worker which got it, after
+    the connection is handed off to whoever resolves it.
+
+    When the deadline passes first, the task is resolved with
+    the expired response and on_expire is called to answer
+    the client, what the view returns later is dropped.
+    """
+
+    def __init__(self, function: Callable, deadline: Deadline,
+                 expired: Callable):
+        """
+        Initialize a task.
+
+        Parameters:
+            function: Callable[[], Response] - View call, never raising
+            deadline: Deadline - Deadline of the request
+            expired: Callable[[], Response] - Make response when expired
+        """
+        super().__init__()
+        self.function = function
+        self._deadline = deadline
+        self._expired = expired
+
+    def run(self, on_expire: Optional[Callable[[], None]] = None) -> bool:
+        """
+        Run view in current thread with deadline armed.
+        Return whether view finished in time and resolved the task,
+        otherwise the task is resolved by timer and on_expire
+        called in timer thread.
+        """
+        def expire():
+            if self.done():
+                return
+            if settle(self, self._expired()):
+                self._deadline.cancel()
+                if on_expire is not None:
+                    on_expire()
+
+        timer = timers.call_at(self._deadline.expires, expire)
+        try:
+            response = self.function()
+        finally:
+            timers.cancel(timer)
+        return settle(self, response)
+
+
+def bound(future: Future, deadline: Deadline, expired: Callable,
+          work: Optional[Future] = None) -> Future:
+    """
+    Resolve future with expired(started) when deadline passes
+    before it is done, and cancel work not started yet.
+    Return future.
+
+    Parameters:
+        future: Future - Future of response
+        deadline: Deadline - Deadline of the request
+        expired: Callable[[bool], Response] - Make response when
+                 expired, with whether the work had started
+        work: Future - Future of executor running the view
+    """
+    def expire():
+        if future.done():
+            return
+        started = work is None or not work.cancel()
+        if settle(future, expired(started)):
+            deadline.cancel()
+
+    timer = timers.call_at(deadline.expires, expire)
+    future.add_done_callback(lambda done: timers.cancel(timer))
+    return future
@@ -31,6 +31,39 @@ class InvalidBasciLine(RequestError):
     pass
 
 
+class InvalidMultipart(InvalidRequest):
+    """Malformed multipart/form-data body"""
+    pass
+
+
+class PayloadTooLarge(RequestError):
+    """Request header or body exceeds size limits"""
+    pass
+
+
+class ProtocolError(RequestError):
+    """HTTP/2 connection error"""
+
+    def __init__(self, message, code=1):
+        super().__init__(message)
+        self.code = code
+
+
+class CompressionError(ProtocolError):
+    """HPACK header block cannot be decoded"""
+
+    def __init__(self, message):
+        super().__init__(message, 9)
+
+
+class WebSocketError(RequestError):
+    """WebSocket connection failed, code is the close code"""
+
+    def __init__(self, message, code=1002):
+        super().__init__(message)
+        self.code = code
+
+
 class InvalidHTTPResponseCode(ResponseError):
     """Got an invalid HTTP Response code"""
     pass
@@ -56,6 +89,46 @@ class PathNotFound(ApplicationError):
     pass
 
 
+class InvalidViewResult(ApplicationError):
+    """View returned a tuple which cannot be made a response"""
+    pass
+
+
+class InvalidExecution(ApplicationError):
+    """Unknown execution mode of view"""
+    pass
+
+
+class DeadlineExceeded(ApplicationError):
+    """Deadline of request passed, raised by Deadline.check"""
+    pass
+
+
+class TemplateError(ApplicationError):
+    """Template cannot be compiled or rendered"""
+    pass
+
+
+class TemplateNotFound(TemplateError):
+    """No template of name in template directory"""
+    pass
+
+
+class SharedStoreError(ApplicationError):
+    """Shared store cannot be attached, or is not given"""
+    pass
+
+
 class CGIExecutingError(ApplicationError):
     """Error occured when dealing with CGI script"""
     pass
+
+
+class UpstreamError(ApplicationError):
+    """Proxied upstream server failed or cannot be reached"""
+    pass
+
+
+class UpstreamBusy(UpstreamError):
+    """Connection pool of proxied upstream server stayed full"""
+    pass
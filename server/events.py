@@ -0,0 +1,250 @@
+"""
+Server-Sent Events
+
+Handlers publish messages to topics of a broadcaster, every
+message is encoded once and queued to all subscribers of the
+topic. Subscribers are channels served by the server loop, so
+they hold no worker. Recent messages of each topic are kept in
+a ring buffer, replayed to clients reconnecting with Last-Event-ID.
+"""
+
+import threading
+import collections
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Union
+from typing import Callable
+from typing import Optional
+
+from . import settings
+from .channel import Channel
+from .response import Response
+from .connection import Connection
+
+
+def encode(data: Union[str, bytes], event: Optional[str] = None,
+           identifier: Optional[int] = None, retry: Optional[int] = None) -> bytes:
+    """
+    Encode one message of event stream:
+        e.g. encode("hi", "greet", 3) -> b"id: 3\\nevent: greet\\ndata: hi\\n\\n"
+    """
+    if isinstance(data, str):
+        data = data.encode()
+
+    lines = list()
+    if identifier is not None:
+        lines.append(b"id: " + str(identifier).encode())
+    if event:
+        lines.append(b"event: " + event.encode())
+    if retry is not None:
+        lines.append(b"retry: " + str(retry).encode())
+    for line in data.splitlines() or (b'',):
+        lines.append(b"data: " + line)
+    return b'\n'.join(lines) + b"\n\n"
+
+
+class Subscriber(Channel):
+    """
+    Event stream connection subscribed to a topic,
+    dropped when it falls SSE_MAX_QUEUE bytes behind.
+    """
+
+    __slots__ = ("topic",)
+
+    def __init__(self, connection: Connection, topic: "Topic",
+                 notify: Callable[["Subscriber"], None]):
+        """
+        Initialize a subscriber.
+
+        Parameters:
+            connection: Connection - Connection answered with event stream
+            topic: Topic - Topic subscribed
+            notify: Callable[[Subscriber], None] - Ask server loop to
+                    handle the subscriber again, from any thread
+        """
+        super().__init__(connection, notify,
+                         settings.SSE_MAX_QUEUE, settings.SSE_MAX_QUEUE)
+        self.topic = topic
+
+    def send(self, payload: bytes) -> bool:
+        """Queue encoded message"""
+        return self._send(payload)
+
+    def release(self):
+        """Unsubscribe and close socket, called by server loop"""
+        self.topic.detach(self)
+        super().release()
+
+
+class Topic:
+    """
+    Topic of broadcaster.
+
+    Message identifiers increase from 1, the last
+    SSE_HISTORY messages are kept for replay.
+    """
+
+    def __init__(self, name: str, history: Optional[int] = settings.SSE_HISTORY):
+        """
+        Initialize a topic.
+
+        Parameters:
+            name: str - Topic name
+            history: int - Messages kept for replay
+        """
+        self.name = name
+        self._history: collections.deque = collections.deque(maxlen=history)
+        self._last = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    @property
+    def subscribers(self) -> int:
+        """Number of subscribers"""
+        return len(self._subscribers)
+
+    @property
+    def last(self) -> int:
+        """Identifier of last message published"""
+        return self._last
+
+    def publish(self, data: Union[str, bytes], event: Optional[str] = None) -> int:
+        """
+        Encode message once and queue it to every subscriber,
+        in the order of publishing. Return identifier of message.
+        """
+        with self._lock:
+            self._last += 1
+            payload = encode(data, event, self._last)
+            self._history.append((self._last, payload))
+            for subscriber in self._subscribers:
+                subscriber.send(payload)
+            return self._last
+
+    def _since(self, identifier: int) -> List[bytes]:
+        """Messages kept after identifier"""
+        return [payload for number, payload in self._history if number > identifier]
+
+    def replay(self, last: Optional[int]) -> Tuple[bytes, int]:
+        """
+        Get messages published after identifier last, which
+        is unknown when None or newer than last published.
+        Return them with identifier replayed up to.
+        """
+        with self._lock:
+            if last is None or not 0 <= last <= self._last:
+                return bytes(), self._last
+            return b''.join(self._since(last)), self._last
+
+    def attach(self, subscriber: Subscriber, position: int):
+        """
+        Subscribe, messages published after position
+        are queued first, so none of them is missed.
+        """
+        with self._lock:
+            for payload in self._since(position):
+                subscriber.send(payload)
+            self._subscribers.add(subscriber)
+
+    def detach(self, subscriber: Subscriber):
+        """Unsubscribe"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+class EventStream(Response):
+    """
+    Response subscribing client to topic.
+
+    Over HTTP/1.1 the connection stays open after messages
+    replayed, and is served by server loop as a subscriber.
+    Over HTTP/2 the stream ends after replayed messages,
+    client reconnects with Last-Event-ID for new ones.
+    """
+
+    def __init__(self, topic: Topic, last: Optional[int] = None,
+                 retry: Optional[int] = settings.SSE_RETRY):
+        """
+        Initialize an event stream.
+
+        Parameters:
+            topic: Topic - Topic subscribed
+            last: int - Last-Event-ID sent by client
+            retry: int - Milliseconds client waits before reconnecting
+        """
+        replay, self.position = topic.replay(last)
+        if retry is not None:
+            replay = b"retry: " + str(retry).encode() + b"\n\n" + replay
+        headers = {"Cache-Control": "no-cache", "Connection": "close"}
+        super().__init__(200, replay, headers=headers,
+                         content_type="text/event-stream")
+        self.topic = topic
+
+    @property
+    def live(self) -> bool:
+        """Whether connection should be subscribed after response sent"""
+        return self._environ_method != "HEAD"
+
+    def copy(self):
+        """Subscription is not shared with another request"""
+        return None
+
+    def payload(self):
+        """
+        Make response headers and body bytes, without
+        Content-Length as stream ends when connection closed.
+
+        Usage:
+            payload() -> Tuple[dict, bytes]
+        """
+        headers, data = super().payload()
+        del headers["Content-Length"]
+        return headers, data
+
+
+class Broadcaster:
+    """
+    Hub of topics, created when first used.
+
+    Usage:
+        broadcaster.publish("events", "updated")
+        broadcaster.stream(request, "events") -> EventStream
+    """
+
+    def __init__(self, history: Optional[int] = settings.SSE_HISTORY):
+        """
+        Initialize a broadcaster.
+
+        Parameters:
+            history: int - Messages kept for replay in each topic
+        """
+        self._history = history
+        self._topics: Dict[str, Topic] = dict()
+        self._lock = threading.Lock()
+
+    def topic(self, name: str) -> Topic:
+        """Get topic of name"""
+        with self._lock:
+            topic = self._topics.get(name, None)
+            if topic is None:
+                topic = self._topics[name] = Topic(name, self._history)
+            return topic
+
+    def publish(self, name: str, data: Union[str, bytes],
+                event: Optional[str] = None) -> int:
+        """Publish message to topic, return its identifier"""
+        return self.topic(name).publish(data, event)
+
+    def stream(self, request, name: str) -> EventStream:
+        """
+        Make response subscribing request to topic,
+        messages after Last-Event-ID of request are replayed.
+        """
+        last = request.headers.get("Last-Event-ID", None)
+        try:
+            last = int(last) if last is not None else None
+        except ValueError as _error:
+            last = None
+        return EventStream(self.topic(name), last)
@@ -0,0 +1,116 @@
+"""
+View executors
+
+Views run inline in the worker serving the connection by
+default. Views doing blocking IO could run in a shared thread
+pool, CPU-bound views in a shared process pool so they scale
+across cores without holding the GIL of server process.
+"""
+
+import threading
+import multiprocessing
+
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor
+
+from typing import Dict
+from typing import Callable
+
+from . import errors
+from . import settings
+
+
+# Execution modes of views
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+MODES = (INLINE, THREAD, PROCESS)
+
+# Views run in process pool, looked up by key in workers,
+# which are forked when server starts, after views registered
+_views: Dict[int, Callable] = dict()
+_pools: Dict[str, Executor] = dict()
+_lock = threading.Lock()
+
+
+def register(function: Callable) -> int:
+    """
+    Register view to be called in process pool,
+    return the key passed to workers instead of function.
+    Workers forked already would not know the view,
+    so it is refused once process pool started.
+    """
+    with _lock:
+        if PROCESS in _pools:
+            raise errors.InvalidExecution(
+                "process view registered after process pool started: " +
+                getattr(function, "__name__", repr(function)))
+        key = len(_views)
+        _views[key] = function
+    return key
+
+
+def _invoke(key: int, request):
+    """Call registered view in process pool worker"""
+    return _views[key](request)
+
+
+def start():
+    """
+    Fork workers of process pool, when process views are registered.
+    Called by server before its loop and workers start: forking a
+    process while other threads hold locks could leave them held
+    in workers, and workers forked later would miss views.
+    """
+    with _lock:
+        if not _views:
+            return
+    # Workers are all forked at first task when fork is used
+    pool(PROCESS).submit(int).result()
+
+
+def pool(mode: str) -> Executor:
+    """
+    Get shared executor of mode, created at first use.
+    Process pool workers are forked where supported,
+    so views registered in any module are available.
+    """
+    with _lock:
+        executor = _pools.get(mode, None)
+        if executor is not None:
+            return executor
+
+        if mode == THREAD:
+            executor = ThreadPoolExecutor(
+                settings.EXECUTOR_THREADS, thread_name_prefix="view")
+        elif mode == PROCESS:
+            context = None
+            if "fork" in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context("fork")
+            executor = ProcessPoolExecutor(
+                settings.EXECUTOR_PROCESSES, mp_context=context)
+        else:
+            raise errors.InvalidExecution(mode)
+
+        _pools[mode] = executor
+        return executor
+
+
+def submit(mode: str, view: Callable, request) -> Future:
+    """
+    Run view with request in executor of mode,
+    return future of what view returned.
+    """
+    if mode == PROCESS:
+        return pool(PROCESS).submit(_invoke, view, request)
+    return pool(mode).submit(view, request)
+
+
+def shutdown(wait: bool = True):
+    """Shut down executors created"""
+    with _lock:
+        for executor in _pools.values():
+            executor.shutdown(wait)
+        _pools.clear()
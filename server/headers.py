@@ -0,0 +1,230 @@
+"""
+HTTP header table
+
+Case-insensitive container of header fields keeping every
+value of repeated headers. Names of common headers are interned
+and lowercased once, values are kept as received bytes and
+decoded only when they are read.
+"""
+
+import sys
+
+from typing import Any
+from typing import List
+from typing import Tuple
+from typing import Iterator
+
+
+# Common header names, lookups of them skip lowercasing
+COMMON_HEADERS = (
+    "Accept", "Accept-Charset", "Accept-Encoding", "Accept-Language",
+    "Authorization", "Cache-Control", "Connection", "Content-Disposition",
+    "Content-Encoding", "Content-Length", "Content-Type", "Cookie", "Date",
+    "ETag", "Expect", "Host", "HTTP2-Settings", "If-Match",
+    "If-Modified-Since", "If-None-Match", "Keep-Alive", "Last-Event-ID",
+    "Last-Modified", "Location", "Origin", "Pragma", "Range", "Referer",
+    "Sec-WebSocket-Key", "Sec-WebSocket-Protocol", "Sec-WebSocket-Version",
+    "Server", "Set-Cookie", "Transfer-Encoding", "Upgrade", "User-Agent",
+    "Vary", "X-Forwarded-For", "X-Forwarded-Host", "X-Forwarded-Proto",
+    "X-Real-IP", "X-Requested-With"
+)
+
+# Map from name (as str and bytes, in usual cases) to interned key,
+# other names seen are added until the map grows to _KEYS_LIMIT
+_KEYS = dict()
+_KEYS_LIMIT = 4096
+for _name in COMMON_HEADERS:
+    _key = sys.intern(_name.lower())
+    for _variant in (_name, _name.lower(), _name.upper()):
+        _KEYS[_variant] = _key
+        _KEYS[_variant.encode()] = _key
+
+
+def header_key(name) -> str:
+    """
+    Get interned lowercase key of header name (str or bytes):
+        e.g. "Content-Type" -> "content-type"
+    """
+    key = _KEYS.get(name, None)
+    if key is not None:
+        return key
+    if isinstance(name, bytes):
+        key = sys.intern(name.decode("iso-8859-1").lower())
+    else:
+        key = sys.intern(name.lower())
+    if len(_KEYS) < _KEYS_LIMIT:
+        _KEYS[name] = key
+    return key
+
+
+class Headers:
+    """
+    Header table with O(1) case-insensitive lookup.
+
+    Index and get return the first value of header, use getall
+    for every value. Values set by application (like int
+    Content-Length) are returned as they are, received ones
+    are decoded as ISO-8859-1 when read.
+
+    Usage:
+        headers = Headers.parse(b"Host: localhost\\r\\nAccept: */*")
+        headers["host"] -> "localhost"
+    """
+
+    __slots__ = ("_values", "_names")
+
+    def __init__(self, pairs=None):
+        """
+        Initialize header table.
+
+        Parameters:
+            pairs: dict | Headers | Iterable[Tuple[name, value]]
+        """
+        self._values = dict()
+        self._names = dict()
+        if pairs is not None:
+            self.extend(pairs)
+
+    @classmethod
+    def parse(cls, block: bytes) -> "Headers":
+        """
+        Parse header lines separated by CRLF,
+        raise ValueError when a line is malformed.
+        """
+        headers = cls()
+        values, names, keys = headers._values, headers._names, _KEYS
+        for line in block.split(b"\r\n"):
+            name, sep, value = line.partition(b':')
+            if not sep:
+                if line:
+                    raise ValueError(line)
+                continue
+            key = keys.get(name, None)
+            if key is None:
+                # Whitespace around name and obs-fold lines are rejected
+                if not name or name != name.strip(b" \t"):
+                    raise ValueError(line)
+                key = header_key(name)
+
+            value = value.strip(b" \t")
+            if key in values:
+                values[key].append(value)
+            else:
+                values[key] = [value]
+                names[key] = name
+        return headers
+
+    @staticmethod
+    def _decode(value):
+        """Decode received value"""
+        if isinstance(value, bytes):
+            return value.decode("iso-8859-1")
+        return value
+
+    def _name(self, key: str) -> str:
+        """Name of header as received or set"""
+        name = self._names[key]
+        if isinstance(name, bytes):
+            name = self._names[key] = name.decode("iso-8859-1")
+        return name
+
+    def get(self, name, default: Any = None) -> Any:
+        """Return first value of header, default when not exists"""
+        values = self._values.get(_KEYS.get(name, None) or header_key(name), None)
+        if not values:
+            return default
+        value = values[0]
+        if isinstance(value, bytes):
+            value = values[0] = value.decode("iso-8859-1")
+        return value
+
+    def getall(self, name) -> List[Any]:
+        """Return every value of header"""
+        values = self._values.get(header_key(name), ())
+        return [self._decode(value) for value in values]
+
+    def add(self, name, value):
+        """Append value to header"""
+        key = header_key(name)
+        if key in self._values:
+            self._values[key].append(value)
+        else:
+            self._values[key] = [value]
+            self._names[key] = name
+
+    def extend(self, pairs):
+        """Append every (name, value) of pairs"""
+        if isinstance(pairs, (dict, Headers)):
+            pairs = pairs.items()
+        for name, value in pairs:
+            self.add(name, value)
+
+    def update(self, pairs):
+        """Replace headers with the ones in pairs"""
+        other = pairs if isinstance(pairs, Headers) else Headers(pairs)
+        for key, values in other._values.items():
+            self._values[key] = list(values)
+            self._names[key] = other._names[key]
+
+    def setdefault(self, name, value: Any) -> Any:
+        """Set header when not exists, return first value"""
+        if name not in self:
+            self[name] = value
+        return self.get(name)
+
+    def pop(self, name, default: Any = None) -> Any:
+        """Remove header, return its first value"""
+        key = header_key(name)
+        values = self._values.pop(key, None)
+        if not values:
+            return default
+        del self._names[key]
+        return self._decode(values[0])
+
+    def __getitem__(self, name) -> Any:
+        values = self._values.get(header_key(name), None)
+        if not values:
+            raise KeyError(name)
+        return self.get(name)
+
+    def __setitem__(self, name, value: Any):
+        key = header_key(name)
+        self._values[key] = [value]
+        self._names.setdefault(key, name)
+
+    def __delitem__(self, name):
+        key = header_key(name)
+        del self._values[key]
+        del self._names[key]
+
+    def __contains__(self, name) -> bool:
+        return (_KEYS.get(name, None) or header_key(name)) in self._values
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Headers):
+            return NotImplemented
+        return list(self.items()) == list(other.items())
+
+    def __repr__(self) -> str:
+        return "Headers(" + repr(list(self.items())) + ')'
+
+    def keys(self) -> List[str]:
+        """Names of headers"""
+        return [self._name(key) for key in self._values]
+
+    def values(self) -> List[Any]:
+        """First value of each header"""
+        return [self.get(key) for key in self._values]
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        """Every (name, value), repeated headers yield each value"""
+        for key, values in self._values.items():
+            name = self._name(key)
+            for value in values:
+                yield name, self._decode(value)
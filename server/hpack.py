@@ -0,0 +1,373 @@
+"""
+HPACK header compression for HTTP/2 (RFC 7541)
+
+Contains the static table, the dynamic table and
+Huffman code shared by header block Encoder and Decoder.
+"""
+
+import collections
+
+from typing import List
+from typing import Tuple
+from typing import Optional
+
+from . import errors
+
+
+# Static table, index starts from 1
+STATIC_TABLE = (
+    (":authority", ""), (":method", "GET"), (":method", "POST"),
+    (":path", "/"), (":path", "/index.html"), (":scheme", "http"),
+    (":scheme", "https"), (":status", "200"), (":status", "204"),
+    (":status", "206"), (":status", "304"), (":status", "400"),
+    (":status", "404"), (":status", "500"), ("accept-charset", ""),
+    ("accept-encoding", "gzip, deflate"), ("accept-language", ""),
+    ("accept-ranges", ""), ("accept", ""),
+    ("access-control-allow-origin", ""), ("age", ""), ("allow", ""),
+    ("authorization", ""), ("cache-control", ""),
+    ("content-disposition", ""), ("content-encoding", ""),
+    ("content-language", ""), ("content-length", ""),
+    ("content-location", ""), ("content-range", ""),
+    ("content-type", ""), ("cookie", ""), ("date", ""), ("etag", ""),
+    ("expect", ""), ("expires", ""), ("from", ""), ("host", ""),
+    ("if-match", ""), ("if-modified-since", ""), ("if-none-match", ""),
+    ("if-range", ""), ("if-unmodified-since", ""), ("last-modified", ""),
+    ("link", ""), ("location", ""), ("max-forwards", ""),
+    ("proxy-authenticate", ""), ("proxy-authorization", ""),
+    ("range", ""), ("referer", ""), ("refresh", ""), ("retry-after", ""),
+    ("server", ""), ("set-cookie", ""), ("strict-transport-security", ""),
+    ("transfer-encoding", ""), ("user-agent", ""), ("vary", ""),
+    ("via", ""), ("www-authenticate", "")
+)
+
+# Lookup from field / name to static index
+STATIC_FIELDS = {field: index + 1 for index, field
+                 in reversed(list(enumerate(STATIC_TABLE)))}
+STATIC_NAMES = {name: index + 1 for index, (name, _value)
+                in reversed(list(enumerate(STATIC_TABLE)))}
+
+# Huffman code lengths of symbols (256 is EOS), the
+# code is canonical so codes are generated from lengths
+_HUFFMAN_LENGTHS = {
+    5: b"012aceiost",
+    6: b" %-./3456789=A_bdfghlmnpru",
+    7: b":BCDEFGHIJKLMNOPQRSTUVWYjkqvwxyz",
+    8: b"&*,;XZ",
+    10: b"!\"()?",
+    11: b"'+|",
+    12: b"#>",
+    13: b"\x00$@[]~",
+    14: b"^}",
+    15: b"<`{",
+    19: bytes((92, 195, 208)),
+    20: bytes((128, 130, 131, 162, 184, 194, 224, 226)),
+    21: bytes((153, 161, 167, 172, 176, 177, 179, 209, 216, 217,
+               227, 229, 230)),
+    22: bytes((129, 132, 133, 134, 136, 146, 154, 156, 160, 163, 164,
+               169, 170, 173, 178, 181, 185, 186, 187, 189, 190, 196,
+               198, 228, 232, 233)),
+    23: bytes((1, 135, 137, 138, 139, 140, 141, 143, 147, 149, 150, 151,
+               152, 155, 157, 158, 165, 166, 168, 174, 175, 180, 182,
+               183, 188, 191, 197, 231, 239)),
+    24: bytes((9, 142, 144, 145, 148, 159, 171, 206, 215, 225, 236, 237)),
+    25: bytes((199, 207, 234, 235)),
+    26: bytes((192, 193, 200, 201, 202, 205, 210, 213, 218, 219, 238,
+               240, 242, 243, 255)),
+    27: bytes((203, 204, 211, 212, 214, 221, 222, 223, 241, 244, 245,
+               246, 247, 248, 250, 251, 252, 253, 254)),
+    28: bytes((2, 3, 4, 5, 6, 7, 8, 11, 12, 14, 15, 16, 17, 18, 19, 20,
+               21, 23, 24, 25, 26, 27, 28, 29, 30, 31, 127, 220, 249)),
+    30: (10, 13, 22, 256)
+}
+
+EOS = 256
+
+
+def _huffman_table():
+    """
+    Generate canonical Huffman codes:
+    shorter codes first, same length ordered by symbol.
+    Return encode list and decode dict.
+    """
+    encode = [None] * 257
+    decode = dict()
+    code, last = 0, 0
+    for length in sorted(_HUFFMAN_LENGTHS):
+        code <<= length - last
+        last = length
+        for symbol in sorted(_HUFFMAN_LENGTHS[length]):
+            encode[symbol] = (code, length)
+            decode[(code, length)] = symbol
+            code += 1
+    return encode, decode
+
+
+HUFFMAN_ENCODE, HUFFMAN_DECODE = _huffman_table()
+
+
+def huffman_encode(data: bytes) -> bytes:
+    """Encode bytes with Huffman code, padded with EOS prefix"""
+    value, bits = 0, 0
+    for byte in data:
+        code, length = HUFFMAN_ENCODE[byte]
+        value = (value << length) | code
+        bits += length
+
+    padding = -bits % 8
+    value = (value << padding) | ((1 << padding) - 1)
+    return value.to_bytes((bits + padding) // 8, "big")
+
+
+def huffman_decode(data: bytes) -> bytes:
+    """Decode Huffman encoded bytes"""
+    decoded = bytearray()
+    table = HUFFMAN_DECODE
+    code, length = 0, 0
+    for byte in data:
+        for shift in range(7, -1, -1):
+            code = (code << 1) | ((byte >> shift) & 1)
+            length += 1
+            symbol = table.get((code, length), None)
+            if symbol is None:
+                if length > 30:
+                    raise errors.CompressionError("Invalid Huffman code")
+                continue
+            if symbol == EOS:
+                raise errors.CompressionError("EOS in Huffman string")
+            decoded.append(symbol)
+            code, length = 0, 0
+
+    # Padding must be shorter than 8 bits and all ones
+    if length > 7 or code != (1 << length) - 1:
+        raise errors.CompressionError("Invalid Huffman padding")
+    return bytes(decoded)
+
+
+def encode_integer(value: int, prefix: int, flags: int = 0) -> bytes:
+    """Encode integer with N-bit prefix, flags fill the high bits"""
+    limit = (1 << prefix) - 1
+    if value < limit:
+        return bytes((flags | value,))
+
+    encoded = bytearray((flags | limit,))
+    value -= limit
+    while value >= 128:
+        encoded.append((value & 127) | 128)
+        value >>= 7
+    encoded.append(value)
+    return bytes(encoded)
+
+
+def decode_integer(data: bytes, index: int, prefix: int) -> Tuple[int, int]:
+    """Decode integer with N-bit prefix at index, return value and next index"""
+    limit = (1 << prefix) - 1
+    try:
+        value = data[index] & limit
+        index += 1
+        if value < limit:
+            return value, index
+
+        shift = 0
+        while True:
+            byte = data[index]
+            index += 1
+            value += (byte & 127) << shift
+            shift += 7
+            if not byte & 128:
+                return value, index
+            if shift > 28:
+                raise errors.CompressionError("Integer overflow")
+    except IndexError as _error:
+        raise errors.CompressionError("Truncated integer")
+
+
+class DynamicTable:
+    """
+    HPACK dynamic table, newest entry has the smallest index.
+    Entry size is length of name and value plus 32.
+    """
+
+    OVERHEAD = 32
+
+    def __init__(self, maxsize: int = 4096):
+        self._entries = collections.deque()
+        self._size = 0
+        self.maxsize = maxsize
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def resize(self, maxsize: int):
+        """Change max size and evict entries"""
+        self.maxsize = maxsize
+        self._evict(0)
+
+    def _evict(self, required: int):
+        """Evict oldest entries until required size available"""
+        while self._entries and self._size + required > self.maxsize:
+            name, value = self._entries.pop()
+            self._size -= len(name) + len(value) + self.OVERHEAD
+
+    def add(self, name: str, value: str):
+        """Insert an entry, too large one just empties the table"""
+        size = len(name) + len(value) + self.OVERHEAD
+        self._evict(size)
+        if size <= self.maxsize:
+            self._entries.appendleft((name, value))
+            self._size += size
+
+    def get(self, index: int) -> Tuple[str, str]:
+        """Get entry by HPACK index (static and dynamic)"""
+        if 0 < index <= len(STATIC_TABLE):
+            return STATIC_TABLE[index - 1]
+        try:
+            return self._entries[index - len(STATIC_TABLE) - 1]
+        except IndexError as _error:
+            raise errors.CompressionError("Invalid index " + str(index))
+
+    def find(self, name: str, value: str) -> Tuple[int, bool]:
+        """
+        Find index for header field, return (index, matched value),
+        index is 0 when name not found.
+        """
+        index = STATIC_FIELDS.get((name, value), 0)
+        if index:
+            return index, True
+
+        name_index = STATIC_NAMES.get(name, 0)
+        for offset, (entry_name, entry_value) in enumerate(self._entries):
+            if entry_name != name:
+                continue
+            if entry_value == value:
+                return offset + len(STATIC_TABLE) + 1, True
+            if not name_index:
+                name_index = offset + len(STATIC_TABLE) + 1
+        return name_index, False
+
+
+class Decoder:
+    """
+    Header block decoder, one for each connection.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._table = DynamicTable(maxsize)
+        self._maxsize = maxsize
+
+    def _string(self, data: bytes, index: int) -> Tuple[str, int]:
+        """Decode string literal, return string and next index"""
+        huffman = data[index] & 128
+        length, index = decode_integer(data, index, 7)
+        if index + length > len(data):
+            raise errors.CompressionError("Truncated string")
+        value = data[index:index + length]
+        if huffman:
+            value = huffman_decode(value)
+        return value.decode("iso-8859-1"), index + length
+
+    def decode(self, data: bytes) -> List[Tuple[str, str]]:
+        """
+        Decode header block into list of (name, value)
+        """
+        headers = list()
+        index = 0
+        table = self._table
+        while index < len(data):
+            byte = data[index]
+
+            # Indexed header field
+            if byte & 128:
+                position, index = decode_integer(data, index, 7)
+                if not position:
+                    raise errors.CompressionError("Index 0")
+                headers.append(table.get(position))
+                continue
+
+            # Dynamic table size update
+            if byte & 224 == 32:
+                maxsize, index = decode_integer(data, index, 5)
+                if maxsize > self._maxsize:
+                    raise errors.CompressionError("Table size too large")
+                table.resize(maxsize)
+                continue
+
+            # Literal header field: with incremental indexing (6-bit),
+            # without indexing or never indexed (4-bit)
+            indexing = byte & 192 == 64
+            position, index = decode_integer(
+                data, index, 6 if indexing else 4)
+            if position:
+                name = table.get(position)[0]
+            else:
+                name, index = self._string(data, index)
+            value, index = self._string(data, index)
+
+            if indexing:
+                table.add(name, value)
+            headers.append((name, value))
+
+        return headers
+
+
+class Encoder:
+    """
+    Header block encoder, one for each connection.
+    Headers in NEVER_INDEX are not added to dynamic table.
+    """
+
+    NEVER_INDEX = {"content-length", "date", "set-cookie",
+                   "authorization", "etag", "last-modified"}
+
+    def __init__(self, maxsize: int = 4096, huffman: bool = True):
+        self._table = DynamicTable(maxsize)
+        self._huffman = huffman
+        self._resized: Optional[int] = None
+
+    def resize(self, maxsize: int):
+        """Peer changed SETTINGS_HEADER_TABLE_SIZE"""
+        maxsize = min(maxsize, 4096)
+        if maxsize != self._table.maxsize:
+            self._table.resize(maxsize)
+            self._resized = maxsize
+
+    def _string(self, value: str) -> bytes:
+        """Encode string literal of octets, Huffman coded when shorter"""
+        raw = value.encode("iso-8859-1")
+        if self._huffman:
+            encoded = huffman_encode(raw)
+            if len(encoded) < len(raw):
+                return encode_integer(len(encoded), 7, 128) + encoded
+        return encode_integer(len(raw), 7) + raw
+
+    def encode(self, headers: List[Tuple[str, str]]) -> bytes:
+        """
+        Encode list of (name, value) into header block,
+        names should be lowercase.
+        """
+        block = bytearray()
+        if self._resized is not None:
+            block += encode_integer(self._resized, 5, 32)
+            self._resized = None
+
+        table = self._table
+        for name, value in headers:
+            # Sent as UTF-8 like HTTP/1.1 headers, kept as one char
+            # for each octet so table sizes are counted as peer does
+            name = name.encode().decode("iso-8859-1")
+            value = str(value).encode().decode("iso-8859-1")
+            index, matched = table.find(name, value)
+            if matched:
+                block += encode_integer(index, 7, 128)
+                continue
+
+            if name in self.NEVER_INDEX:
+                block += encode_integer(index, 4)
+            else:
+                block += encode_integer(index, 6, 64)
+                table.add(name, value)
+
+            if not index:
+                block += self._string(name)
+            block += self._string(value)
+
+        return bytes(block)
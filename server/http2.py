@@ -0,0 +1,734 @@
+"""
+HTTP/2 support (RFC 7540)
+
+Cleartext HTTP/2 (h2c) with prior knowledge or Upgrade,
+and HTTP/2 over TLS negotiated with ALPN. Streams of one
+connection are multiplexed: every stream is dispatched to
+the application in its own worker, and responses share the
+connection according to flow control windows and stream weights.
+"""
+
+import base64
+import socket
+import struct
+import threading
+
+from concurrent.futures import Future
+
+from typing import List
+from typing import Tuple
+from typing import Optional
+
+from . import hpack
+from . import errors
+from . import settings
+from .utils import thread
+from .deadline import Task
+from .request import Request
+from .response import Response
+from .connection import Connection
+
+
+# Connection preface sent by client, and the part of
+# it read as a request head by HTTP/1.1 parser
+PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+PREFACE_HEAD = b"PRI * HTTP/2.0\r\n\r\n"
+
+# Response to "Upgrade: h2c" request
+SWITCHING_PROTOCOLS = b"HTTP/1.1 101 Switching Protocols\r\n" \
+    b"Connection: Upgrade\r\nUpgrade: h2c\r\n\r\n"
+
+# Frame types
+DATA, HEADERS, PRIORITY, RST_STREAM, SETTINGS, PUSH_PROMISE, \
+    PING, GOAWAY, WINDOW_UPDATE, CONTINUATION = range(10)
+
+# Frame flags
+END_STREAM = 0x1
+ACK = 0x1
+END_HEADERS = 0x4
+PADDED = 0x8
+PRIORITY_FLAG = 0x20
+
+# Settings parameters
+SETTINGS_HEADER_TABLE_SIZE = 0x1
+SETTINGS_ENABLE_PUSH = 0x2
+SETTINGS_MAX_CONCURRENT_STREAMS = 0x3
+SETTINGS_INITIAL_WINDOW_SIZE = 0x4
+SETTINGS_MAX_FRAME_SIZE = 0x5
+
+# Error codes
+NO_ERROR = 0x0
+PROTOCOL_ERROR = 0x1
+INTERNAL_ERROR = 0x2
+FLOW_CONTROL_ERROR = 0x3
+STREAM_CLOSED = 0x5
+FRAME_SIZE_ERROR = 0x6
+REFUSED_STREAM = 0x7
+CANCEL = 0x8
+
+# Default values of protocol
+DEFAULT_WINDOW_SIZE = 65535
+DEFAULT_FRAME_SIZE = 16384
+MAX_WINDOW_SIZE = 2 ** 31 - 1
+
+# Connection specific headers not allowed in HTTP/2
+CONNECTION_HEADERS = {
+    "connection", "keep-alive", "proxy-connection",
+    "transfer-encoding", "upgrade"
+}
+
+# Bytes of DATA frames written in one send
+WRITE_BATCH = 256 * 1024
+
+
+def frame(kind: int, flags: int, stream: int, payload: bytes = b'') -> bytes:
+    """
+    Make a frame:
+        +-----------------------------------------------+
+        |                 Length (24)                   |
+        +---------------+---------------+---------------+
+        |   Type (8)    |   Flags (8)   |
+        +-+-------------+---------------+-------------------------------+
+        |R|                 Stream Identifier (31)                      |
+        +=+=============================================================+
+        |                   Frame Payload (0...)                      ...
+        +---------------------------------------------------------------+
+    """
+    return len(payload).to_bytes(3, "big") + \
+        struct.pack(">BBI", kind, flags, stream) + payload
+
+
+def parse_settings(payload: bytes) -> dict:
+    """Parse SETTINGS payload into dict"""
+    if len(payload) % 6:
+        raise errors.ProtocolError("Invalid SETTINGS", FRAME_SIZE_ERROR)
+    return dict(struct.iter_unpack(">HI", payload))
+
+
+def header_name(name: str) -> str:
+    """
+    Restore HTTP/1.1 style name for lowercase HTTP/2 header:
+        e.g. "content-type" -> "Content-Type"
+    """
+    return '-'.join(part.capitalize() for part in name.split('-'))
+
+
+class ChunkReader:
+    """
+    File like reader of streamed response body,
+    sent in frames as flow control windows allow.
+    """
+
+    def __init__(self, response: Response):
+        self._response = response
+        self._chunks = iter(response.stream)
+        self._buffer = bytearray()
+
+    def read(self, size: int) -> bytes:
+        """Read size bytes, less only when stream ended"""
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer += chunk
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def close(self):
+        """Release the stream"""
+        self._response.close()
+
+
+class Stream:
+    """
+    One HTTP/2 stream.
+
+    id - stream identifier
+    weight - priority weight (1-256)
+    window - flow control window for sending
+    block - header block fragments received
+    fields - decoded request headers
+    body - request body received
+    received - whether client closed its side
+    source - response body waiting to be sent
+    remaining - size of response body not sent
+    """
+
+    __slots__ = ("id", "weight", "window", "block", "fields", "body",
+                 "received", "source", "remaining", "offset")
+
+    def __init__(self, identifier: int, window: int, weight: int = 16):
+        self.id = identifier
+        self.weight = weight
+        self.window = window
+        self.block = bytearray()
+        self.fields: List[Tuple[str, str]] = None
+        self.body = bytearray()
+        self.received = False
+        self.source = None
+        self.remaining = 0
+        self.offset = 0
+
+    def read(self, size: int) -> bytes:
+        """Take at most size bytes of response body"""
+        size = min(size, self.remaining)
+        if isinstance(self.source, memoryview):
+            chunk = bytes(self.source[self.offset:self.offset + size])
+            self.offset += size
+        else:
+            chunk = self.source.read(size)
+            if len(chunk) < size:
+                raise errors.ProtocolError("File truncated", INTERNAL_ERROR)
+        self.remaining -= size
+        return chunk
+
+    def release(self):
+        """Close file of response body"""
+        if self.source is not None and not isinstance(self.source, memoryview):
+            self.source.close()
+        self.source = None
+        self.remaining = 0
+
+
+class HTTP2Connection:
+    """
+    Serve one HTTP/2 connection.
+
+    The worker thread which created it keeps reading frames,
+    streams are answered by their own workers, writes to the
+    connection are serialised with a lock.
+    """
+
+    def __init__(self, server, connection: Connection):
+        """
+        Initialize an HTTP/2 connection.
+
+        Parameters:
+            server: HTTPServer - Server responds requests
+            connection: Connection - Client connection, with
+                        connection.upgraded as the request
+                        upgraded from HTTP/1.1 if there is one
+        """
+        self._server = server
+        self._connection = connection
+        self._decoder = hpack.Decoder()
+        self._encoder = hpack.Encoder()
+
+        self._streams = dict()
+        self._last_stream = 0
+        self._continuation: Optional[Stream] = None
+
+        # Sending status, guarded by lock
+        self._lock = threading.Lock()
+        self._window = DEFAULT_WINDOW_SIZE
+        self._initial_window = DEFAULT_WINDOW_SIZE
+        self._max_frame = DEFAULT_FRAME_SIZE
+        self._pending: List[Stream] = list()
+
+        # Streams being answered by workers
+        self._active = 0
+        self._idle = threading.Condition(self._lock)
+
+        self._handlers = {
+            DATA: self._on_data,
+            HEADERS: self._on_headers,
+            PRIORITY: self._on_priority,
+            RST_STREAM: self._on_rst_stream,
+            SETTINGS: self._on_settings,
+            PUSH_PROMISE: self._on_push_promise,
+            PING: self._on_ping,
+            GOAWAY: self._on_goaway,
+            WINDOW_UPDATE: self._on_window_update,
+            CONTINUATION: self._on_continuation
+        }
+        self._running = True
+
+    def _send(self, data: bytes):
+        """Send frames to client, lock should be held"""
+        self._connection.sendall(data)
+
+    def _send_frame(self, kind: int, flags: int, stream: int, payload: bytes = b''):
+        """Send one frame to client"""
+        with self._lock:
+            self._send(frame(kind, flags, stream, payload))
+
+    def serve(self):
+        """
+        Exchange preface and settings, then process frames
+        until client goes away or connection broken.
+        """
+        connection = self._connection
+        try:
+            if connection.read_exactly(len(PREFACE)) != PREFACE:
+                raise errors.ProtocolError("Invalid preface")
+
+            local = struct.pack(
+                ">HIHIHI",
+                SETTINGS_MAX_CONCURRENT_STREAMS, settings.H2_MAX_CONCURRENT_STREAMS,
+                SETTINGS_INITIAL_WINDOW_SIZE, settings.H2_WINDOW_SIZE,
+                SETTINGS_ENABLE_PUSH, 0)
+            increment = settings.H2_CONNECTION_WINDOW_SIZE - DEFAULT_WINDOW_SIZE
+            self._send_frame(SETTINGS, 0, 0, local)
+            self._send_frame(WINDOW_UPDATE, 0, 0, struct.pack(">I", increment))
+
+            upgraded = getattr(connection, "upgraded", None)
+            if upgraded is not None:
+                self._upgrade(upgraded)
+
+            while self._running:
+                if not self._next_frame():
+                    break
+        except errors.ProtocolError as error:
+            self._goaway(error.code)
+        except OSError as _error:
+            pass
+        finally:
+            self._close()
+
+    def _next_frame(self) -> bool:
+        """
+        Read and process one frame,
+        return False when connection should be closed.
+        """
+        connection = self._connection
+        try:
+            header = connection.read_exactly(9)
+        except socket.timeout as _error:
+            # Idle connection without streams in flight
+            with self._lock:
+                if self._active or self._pending:
+                    return True
+            self._goaway(NO_ERROR)
+            return False
+        if not header:
+            return False
+
+        length = int.from_bytes(header[:3], "big")
+        kind, flags, stream = struct.unpack(">BBI", header[3:])
+        stream &= MAX_WINDOW_SIZE
+        if length > DEFAULT_FRAME_SIZE:
+            raise errors.ProtocolError("Frame too large", FRAME_SIZE_ERROR)
+
+        payload = connection.read_exactly(length) if length else b''
+        if len(payload) != length:
+            return False
+
+        # Header block must be continued without interleaving
+        if self._continuation and kind != CONTINUATION:
+            raise errors.ProtocolError("CONTINUATION expected")
+
+        handler = self._handlers.get(kind, None)
+        if handler:
+            handler(flags, stream, payload)
+        return True
+
+    def _goaway(self, code: int):
+        """Tell client we are closing connection"""
+        try:
+            payload = struct.pack(">II", self._last_stream, code)
+            self._send_frame(GOAWAY, 0, 0, payload)
+        except OSError as _error:
+            pass
+
+    def _close(self):
+        """Wait for streams in flight and close connection"""
+        with self._idle:
+            self._running = False
+            self._idle.wait_for(lambda: not self._active,
+                                timeout=settings.CONNECTION_TIMEOUT)
+            for stream in self._pending:
+                stream.release()
+            self._pending.clear()
+        self._connection.close()
+
+    @staticmethod
+    def _unpad(flags: int, payload: bytes) -> bytes:
+        """Remove padding from DATA or HEADERS payload"""
+        if not flags & PADDED:
+            return payload
+        if not payload or payload[0] >= len(payload):
+            raise errors.ProtocolError("Invalid padding")
+        return payload[1:len(payload) - payload[0]]
+
+    def _stream(self, identifier: int) -> Optional[Stream]:
+        """Get an open stream, or None if it is closed"""
+        if not identifier:
+            raise errors.ProtocolError("Stream 0 not allowed")
+        return self._streams.get(identifier, None)
+
+    def _reset(self, identifier: int, code: int):
+        """Reset one stream"""
+        with self._lock:
+            stream = self._streams.pop(identifier, None)
+            if stream is not None:
+                if stream in self._pending:
+                    self._pending.remove(stream)
+                stream.release()
+            self._send(frame(RST_STREAM, 0, identifier, struct.pack(">I", code)))
+
+    def _on_headers(self, flags: int, identifier: int, payload: bytes):
+        """New stream, or trailers of a stream"""
+        stream = self._stream(identifier)
+        payload = self._unpad(flags, payload)
+
+        weight = 16
+        if flags & PRIORITY_FLAG:
+            if len(payload) < 5:
+                raise errors.ProtocolError("Invalid priority")
+            weight = payload[4] + 1
+            payload = payload[5:]
+
+        if stream is None:
+            if identifier % 2 == 0 or identifier <= self._last_stream:
+                raise errors.ProtocolError("Invalid stream identifier")
+            self._last_stream = identifier
+            stream = Stream(identifier, self._initial_window, weight)
+            self._streams[identifier] = stream
+        elif stream.received:
+            raise errors.ProtocolError("Stream half closed", STREAM_CLOSED)
+
+        stream.block += payload
+        if flags & END_STREAM:
+            stream.received = True
+        if flags & END_HEADERS:
+            self._end_headers(stream)
+        else:
+            self._continuation = stream
+
+    def _on_continuation(self, flags: int, identifier: int, payload: bytes):
+        """Rest of header block"""
+        stream = self._continuation
+        if stream is None or stream.id != identifier:
+            raise errors.ProtocolError("Unexpected CONTINUATION")
+
+        stream.block += payload
+        if len(stream.block) > settings.MAX_REQUEST_SIZE * 4:
+            raise errors.ProtocolError("Header block too large")
+        if flags & END_HEADERS:
+            self._continuation = None
+            self._end_headers(stream)
+
+    def _end_headers(self, stream: Stream):
+        """Decode header block, dispatch stream if request complete"""
+        fields = self._decoder.decode(bytes(stream.block))
+        stream.block.clear()
+
+        # Trailers are ignored
+        if stream.fields is not None:
+            if not stream.received:
+                raise errors.ProtocolError("Trailers without END_STREAM")
+            self._dispatch(stream)
+            return
+
+        stream.fields = fields
+        with self._lock:
+            active = self._active
+        if active >= settings.H2_MAX_CONCURRENT_STREAMS:
+            self._reset(stream.id, REFUSED_STREAM)
+            return
+
+        if stream.received:
+            self._dispatch(stream)
+
+    def _on_data(self, flags: int, identifier: int, payload: bytes):
+        """Request body"""
+        stream = self._stream(identifier)
+
+        # Give the window back at once, size of body is limited
+        if payload:
+            increment = struct.pack(">I", len(payload))
+            frames = frame(WINDOW_UPDATE, 0, 0, increment)
+            if stream is not None and not flags & END_STREAM:
+                frames += frame(WINDOW_UPDATE, 0, identifier, increment)
+            with self._lock:
+                self._send(frames)
+
+        if stream is None or stream.received or stream.fields is None:
+            self._reset(identifier, STREAM_CLOSED)
+            return
+
+        stream.body += self._unpad(flags, payload)
+        if len(stream.body) > settings.MAX_BODY_SIZE:
+            self._reset(identifier, CANCEL)
+            return
+
+        if flags & END_STREAM:
+            stream.received = True
+            self._dispatch(stream)
+
+    def _on_priority(self, flags: int, identifier: int, payload: bytes):
+        """Change weight of stream, dependencies are not tracked"""
+        if len(payload) != 5:
+            raise errors.ProtocolError("Invalid PRIORITY", FRAME_SIZE_ERROR)
+        stream = self._streams.get(identifier, None)
+        if stream is not None:
+            stream.weight = payload[4] + 1
+
+    def _on_rst_stream(self, flags: int, identifier: int, payload: bytes):
+        """Client cancelled stream"""
+        with self._lock:
+            stream = self._streams.pop(identifier, None)
+            if stream is not None:
+                if stream in self._pending:
+                    self._pending.remove(stream)
+                stream.release()
+
+    def _apply_settings(self, values: dict):
+        """Apply settings of client, lock should be held"""
+        for key, value in values.items():
+            if key == SETTINGS_HEADER_TABLE_SIZE:
+                self._encoder.resize(value)
+            elif key == SETTINGS_INITIAL_WINDOW_SIZE:
+                if value > MAX_WINDOW_SIZE:
+                    raise errors.ProtocolError("Window too large", FLOW_CONTROL_ERROR)
+                delta = value - self._initial_window
+                self._initial_window = value
+                for stream in self._streams.values():
+                    stream.window += delta
+            elif key == SETTINGS_MAX_FRAME_SIZE:
+                if not DEFAULT_FRAME_SIZE <= value <= 2 ** 24 - 1:
+                    raise errors.ProtocolError("Invalid frame size")
+                self._max_frame = value
+
+    def _on_settings(self, flags: int, identifier: int, payload: bytes):
+        """Client settings"""
+        if identifier:
+            raise errors.ProtocolError("SETTINGS on stream")
+        if flags & ACK:
+            return
+
+        values = parse_settings(payload)
+        with self._lock:
+            self._apply_settings(values)
+            self._send(frame(SETTINGS, ACK, 0))
+            self._flush()
+
+    def _on_push_promise(self, flags: int, identifier: int, payload: bytes):
+        """Client must not push"""
+        raise errors.ProtocolError("PUSH_PROMISE from client")
+
+    def _on_ping(self, flags: int, identifier: int, payload: bytes):
+        """Answer ping"""
+        if len(payload) != 8:
+            raise errors.ProtocolError("Invalid PING", FRAME_SIZE_ERROR)
+        if not flags & ACK:
+            self._send_frame(PING, ACK, 0, payload)
+
+    def _on_goaway(self, flags: int, identifier: int, payload: bytes):
+        """Client is closing connection"""
+        self._running = False
+
+    def _on_window_update(self, flags: int, identifier: int, payload: bytes):
+        """Client gives us more window to send"""
+        if len(payload) != 4:
+            raise errors.ProtocolError("Invalid WINDOW_UPDATE", FRAME_SIZE_ERROR)
+        increment = struct.unpack(">I", payload)[0] & MAX_WINDOW_SIZE
+        if not increment:
+            raise errors.ProtocolError("Zero window increment")
+
+        with self._lock:
+            if not identifier:
+                self._window += increment
+                if self._window > MAX_WINDOW_SIZE:
+                    raise errors.ProtocolError("Window overflow", FLOW_CONTROL_ERROR)
+            else:
+                stream = self._streams.get(identifier, None)
+                if stream is None:
+                    return
+                stream.window += increment
+            self._flush()
+
+    def _upgrade(self, request: Request):
+        """
+        Answer the request upgraded from HTTP/1.1 on stream 1,
+        with settings of client in HTTP2-Settings header.
+        """
+        encoded = request.headers.get("HTTP2-Settings", '')
+        try:
+            payload = base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4))
+        except ValueError as _error:
+            raise errors.ProtocolError("Invalid HTTP2-Settings")
+
+        stream = Stream(1, DEFAULT_WINDOW_SIZE)
+        stream.received = True
+        with self._lock:
+            self._apply_settings(parse_settings(payload))
+            stream.window = self._initial_window
+            self._streams[1] = stream
+            self._last_stream = 1
+            self._active += 1
+        self._respond(stream, request)
+
+    def _dispatch(self, stream: Stream):
+        """Request on stream received, answer it in a worker"""
+        with self._lock:
+            self._active += 1
+        self._respond(stream, None)
+
+    def _make_request(self, stream: Stream) -> Request:
+        """
+        Build a Request from stream as if it was sent in HTTP/1.1
+        """
+        pseudo, lines, cookies = dict(), list(), list()
+        for name, value in stream.fields:
+            if name.startswith(':'):
+                pseudo[name] = value
+            elif name == "cookie":
+                cookies.append(value)
+            else:
+                lines.append(header_name(name) + ": " + value)
+
+        if ":method" not in pseudo or ":path" not in pseudo:
+            raise errors.InvalidRequest(stream.fields)
+        if ":authority" in pseudo:
+            lines.insert(0, "Host: " + pseudo[":authority"])
+        if cookies:
+            lines.append("Cookie: " + "; ".join(cookies))
+        if stream.body and "content-length" not in dict(stream.fields):
+            lines.append("Content-Length: " + str(len(stream.body)))
+
+        head = "{method} {path} HTTP/2.0\r\n{headers}\r\n\r\n".format(
+            method=pseudo[":method"], path=pseudo[":path"],
+            headers="\r\n".join(lines))
+        request = Request(head.encode("iso-8859-1") + bytes(stream.body),
+                          self._server.application.json)
+        request.remote = self._connection.client
+        request.scheme = pseudo.get(":scheme", "http")
+        request.parse()
+        return request
+
+    @thread
+    def _respond(self, stream: Stream, request: Optional[Request]):
+        """Get response of stream from server and send it"""
+        expired = False
+        try:
+            try:
+                if request is None:
+                    request = self._make_request(stream)
+                response = self._server.respond(request)
+
+                # View runs here, stream is answered by timer
+                # when its deadline passes first
+                if isinstance(response, Task):
+                    task = response
+                    if not task.run(lambda: self._send_expired(stream, task)):
+                        expired = True
+                        return
+                if isinstance(response, Future):
+                    response = response.result()
+            except errors.PayloadTooLarge as _error:
+                response = Response(413)
+            except Exception as _error:
+                response = Response(400)
+            self._send_response(stream, response)
+        except (OSError, errors.ProtocolError) as _error:
+            pass
+        finally:
+            if not expired:
+                self._finished()
+
+    @thread
+    def _send_expired(self, stream: Stream, task: Task):
+        """Send response of task resolved when deadline passed"""
+        try:
+            self._send_response(stream, task.result())
+        except (OSError, errors.ProtocolError) as _error:
+            pass
+        finally:
+            self._finished()
+
+    def _finished(self):
+        """Stream answered, wake up connection waiting for idle"""
+        with self._idle:
+            self._active -= 1
+            self._idle.notify_all()
+
+    def _send_response(self, stream: Stream, response: Response):
+        """Send HEADERS, then DATA frames as windows allow"""
+        headers, data = response.payload()
+        fields = [(":status", str(response.code))]
+        for name, value in headers.items():
+            name = name.lower()
+            if name not in CONNECTION_HEADERS:
+                fields.append((name, str(value)))
+
+        source, remaining = memoryview(data), len(data)
+        if response.sendfile:
+            source, remaining = open(response.file, "rb"), response.size
+        elif response.streaming and response.chunked:
+            try:
+                data = b''.join(response.stream)
+            finally:
+                response.close()
+            source, remaining = memoryview(data), len(data)
+            fields.append(("content-length", str(remaining)))
+        elif response.streaming:
+            source, remaining = ChunkReader(response), int(headers["Content-Length"])
+        else:
+            response.close()
+
+        with self._lock:
+            if self._streams.get(stream.id, None) is not stream:
+                if not isinstance(source, memoryview):
+                    source.close()
+                return
+
+            # Header block may be split into CONTINUATION frames
+            block = self._encoder.encode(fields)
+            flags = 0 if remaining else END_STREAM
+            fragments = [block[index:index + self._max_frame]
+                         for index in range(0, len(block), self._max_frame)] or [b'']
+            frames = list()
+            for index, fragment in enumerate(fragments):
+                kind = CONTINUATION if index else HEADERS
+                end = END_HEADERS if index == len(fragments) - 1 else 0
+                frames.append(frame(kind, (0 if index else flags) | end,
+                                    stream.id, fragment))
+            self._send(b''.join(frames))
+
+            if not remaining:
+                self._streams.pop(stream.id, None)
+                return
+
+            stream.source, stream.remaining = source, remaining
+            self._pending.append(stream)
+            self._flush()
+
+    def _flush(self):
+        """
+        Send pending response bodies as windows allow, lock
+        should be held. In each round, a stream sends frames
+        in proportion to its weight, heavier streams first.
+        """
+        frames, size = list(), 0
+        while self._pending and self._window > 0:
+            progressed = False
+            for stream in sorted(self._pending, key=lambda item: -item.weight):
+                quota = max(1, stream.weight // 16)
+                while quota and stream.window > 0 and self._window > 0:
+                    chunk = stream.read(
+                        min(self._max_frame, stream.window, self._window))
+                    stream.window -= len(chunk)
+                    self._window -= len(chunk)
+                    quota -= 1
+                    progressed = True
+
+                    end = END_STREAM if not stream.remaining else 0
+                    frames.append(frame(DATA, end, stream.id, chunk))
+                    size += len(chunk)
+                    if end:
+                        self._pending.remove(stream)
+                        self._streams.pop(stream.id, None)
+                        stream.release()
+                        break
+
+                if size >= WRITE_BATCH:
+                    self._send(b''.join(frames))
+                    frames, size = list(), 0
+
+            if not progressed:
+                break
+
+        if frames:
+            self._send(b''.join(frames))
@@ -0,0 +1,102 @@
+"""
+JSON codec
+
+Serialise objects returned by views straight to bytes,
+and decode JSON request bodies from bytes.
+The standard library is always available, faster
+backends are used when they are installed.
+"""
+
+import json
+
+from typing import Any
+from typing import Union
+from typing import Callable
+from typing import Optional
+
+from . import settings
+
+
+class JSONCodec:
+    """
+    A pair of JSON functions working on bytes.
+
+    name - backend name
+    dumps - Callable[[Any], bytes]
+    loads - Callable[[Union[bytes, str]], Any]
+    """
+
+    def __init__(self, name: str, dumps: Callable[[Any], bytes],
+                 loads: Callable[[Union[bytes, str]], Any]):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self) -> str:
+        return "<JSONCodec {name}>".format(name=self.name)
+
+
+def _stdlib() -> JSONCodec:
+    """Codec from the json module"""
+    encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    decoder = json.JSONDecoder()
+
+    def dumps(obj) -> bytes:
+        return encoder.encode(obj).encode()
+
+    def loads(data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            data = bytes(data).decode()
+        return decoder.decode(data)
+
+    return JSONCodec("json", dumps, loads)
+
+
+def _orjson() -> JSONCodec:
+    """Codec from orjson, which works on bytes natively"""
+    import orjson
+    return JSONCodec("orjson", orjson.dumps, orjson.loads)
+
+
+def _ujson() -> JSONCodec:
+    """Codec from ujson"""
+    import ujson
+
+    def dumps(obj) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False).encode()
+
+    return JSONCodec("ujson", dumps, ujson.loads)
+
+
+# Content types of JSON request bodies
+CONTENT_TYPES = ("application/json", "text/json")
+
+# All supported backends
+BACKENDS = {
+    "json": _stdlib,
+    "orjson": _orjson,
+    "ujson": _ujson
+}
+
+
+def load(name: Optional[str] = None) -> JSONCodec:
+    """
+    Load codec by backend name, or the first installed
+    backend in settings.JSON_BACKENDS when name not given.
+
+    Usage:
+        load("orjson") -> JSONCodec
+    """
+    if name:
+        return BACKENDS[name]()
+
+    for backend in settings.JSON_BACKENDS:
+        try:
+            return BACKENDS[backend]()
+        except ImportError as _error:
+            continue
+    return _stdlib()
+
+
+# Codec used by default
+default = load()
@@ -0,0 +1,140 @@
+"""
+Rate limiter for application routes
+
+Token buckets keyed by client address (or any
+request header) used to throttle clients which
+send requests faster than a route allows.
+"""
+
+import time
+import threading
+import collections
+
+from typing import Union
+from typing import Callable
+from typing import Optional
+
+from . import settings
+from . import listeners
+
+
+class TokenBucket:
+    """
+    A single token bucket, refilled continuously
+    with `rate` tokens per second up to `capacity`.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        """
+        Initialize a full bucket.
+
+        Parameters:
+            rate: float - Tokens added per second
+            capacity: float - Max tokens the bucket can hold
+            now: float - Current monotonic time
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = now
+
+    def consume(self, now: float, amount: float = 1) -> float:
+        """
+        Try to take `amount` tokens from bucket.
+        Return 0 when succeed, otherwise return
+        seconds to wait until enough tokens refilled.
+        """
+        tokens = self.tokens + (now - self.stamp) * self.rate
+        self.tokens = min(self.capacity, tokens)
+        self.stamp = now
+
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    Per-client rate limiter.
+
+    Buckets are kept in LRU order, so the memory used
+    is bounded by `maxsize`, and buckets of clients idle
+    longer than `idle` seconds will be evicted.
+    (An idle bucket is full anyway, so evict it is lossless.)
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None,
+                 key: Optional[Union[str, Callable]] = None,
+                 maxsize: Optional[int] = settings.RATE_LIMIT_MAX_CLIENTS,
+                 idle: Optional[float] = settings.RATE_LIMIT_IDLE_TIMEOUT):
+        """
+        Initialize a rate limiter.
+
+        Parameters:
+            rate: float - Requests allowed per second
+            burst: int - Max requests allowed in a burst,
+                         default is equal to rate (at least 1)
+            key: str | Callable[[Request], str] - Header name
+                 or function which generate bucket key from request,
+                 client IP address will be used by default
+            maxsize: int - Max number of buckets to keep
+            idle: float - Seconds before an idle bucket evicted
+        Usage Example:
+            RateLimiter(10, 20, key="X-API-Key")
+        """
+        self._rate = float(rate)
+        self._burst = float(burst or max(1, rate))
+        self._key = key
+        self._maxsize = maxsize
+        self._idle = max(idle, self._burst / self._rate)
+        self._buckets = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, request) -> str:
+        """Generate bucket key for request"""
+        if callable(self._key):
+            return self._key(request)
+
+        if self._key:
+            value = request.headers.get(self._key, None)
+            if value:
+                return value
+
+        return listeners.host(request.remote)
+
+    def _evict(self, now: float):
+        """Drop least recently used and idle buckets"""
+        buckets = self._buckets
+        while len(buckets) > self._maxsize:
+            buckets.popitem(last=False)
+
+        while buckets:
+            oldest = next(iter(buckets.values()))
+            if now - oldest.stamp < self._idle:
+                break
+            buckets.popitem(last=False)
+
+    def acquire(self, request) -> float:
+        """
+        Take one token for client who sent request.
+        Return 0 when request is allowed, otherwise
+        return seconds client should retry after.
+        """
+        key = self.key(request)
+        now = time.monotonic()
+
+        with self._lock:
+            bucket = self._buckets.get(key, None)
+            if bucket is None:
+                bucket = TokenBucket(self._rate, self._burst, now)
+                self._buckets[key] = bucket
+            else:
+                self._buckets.move_to_end(key)
+
+            wait = bucket.consume(now)
+            self._evict(now)
+
+        return wait
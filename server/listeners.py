@@ -0,0 +1,124 @@
+"""
+Listening sockets
+
+Server listens on a TCP address (IPv4 or IPv6), on a Unix domain
+socket when address is a path, which skips the TCP/IP stack behind
+a local reverse proxy, or on a socket opened by a supervisor and
+inherited with LISTEN_FDS (systemd socket activation style).
+Clients of Unix domain sockets have no (host, port) address,
+use describe and host to show them.
+"""
+
+import os
+import stat
+import socket
+
+from typing import List
+from typing import Union
+from typing import Tuple
+from typing import Optional
+
+from . import settings
+
+
+# First file descriptor passed by supervisor
+LISTEN_FDS_START = 3
+
+
+def bind(address: Union[Tuple[str, int], str],
+         mode: Optional[int] = settings.UNIX_SOCKET_MODE) -> socket.socket:
+    """
+    Create socket bound to address, not listening yet:
+        e.g. ("0.0.0.0", 80) - IPv4
+        e.g. ("::", 80) - IPv6
+        e.g. "/run/flaks.sock" - Unix domain socket, stale
+             socket file left by last run is removed
+
+    Parameters:
+        address: Tuple[str, int] | str - Address or socket path
+        mode: int - Permission of socket file, umask when None
+    """
+    if isinstance(address, str):
+        try:
+            if stat.S_ISSOCK(os.stat(address).st_mode):
+                os.unlink(address)
+        except FileNotFoundError as _error:
+            pass
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(address)
+        if mode is not None:
+            os.chmod(address, mode)
+        return listener
+
+    family = socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+    listener = socket.socket(family, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, True)
+    listener.bind(address)
+    return listener
+
+
+def configure(listener: socket.socket):
+    """
+    Set options of listening socket, inherited by connections
+    accepted from it, and make it non-blocking.
+    """
+    if listener.family in (socket.AF_INET, socket.AF_INET6):
+        listener.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, True)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, True)
+    listener.setblocking(False)
+
+
+def inherited(unset: bool = True) -> List[socket.socket]:
+    """
+    Get listening sockets passed by supervisor, numbered from
+    LISTEN_FDS_START, when LISTEN_PID is this process (or not set).
+    Environment variables are unset so child processes do
+    not take them again.
+
+    Usage:
+        HTTPServer(listeners.inherited()[0])
+    """
+    count = os.environ.get("LISTEN_FDS", None)
+    pid = os.environ.get("LISTEN_PID", None)
+    if unset:
+        for name in ("LISTEN_FDS", "LISTEN_PID", "LISTEN_FDNAMES"):
+            os.environ.pop(name, None)
+    if not count or (pid and int(pid) != os.getpid()):
+        return list()
+
+    sockets = list()
+    for fileno in range(LISTEN_FDS_START, LISTEN_FDS_START + int(count)):
+        sockets.append(socket.socket(fileno=fileno))
+    return sockets
+
+
+def path(listener: socket.socket) -> Optional[str]:
+    """Path of Unix domain socket, None for other families"""
+    if listener.family != socket.AF_UNIX:
+        return None
+    name = listener.getsockname()
+    return name if isinstance(name, str) and name else None
+
+
+def host(address) -> str:
+    """Host of client address, empty for Unix domain socket clients"""
+    if isinstance(address, tuple) and address:
+        return address[0]
+    return str()
+
+
+def describe(address) -> str:
+    """
+    Show address of client or listener:
+        e.g. ("127.0.0.1", 80) -> "127.0.0.1:80"
+        e.g. ("::1", 80, 0, 0) -> "[::1]:80"
+        e.g. "/run/flaks.sock" -> "unix:/run/flaks.sock"
+        e.g. '' -> "unix" (unnamed client socket)
+    """
+    if isinstance(address, tuple) and len(address) >= 2:
+        if ':' in address[0]:
+            return '[' + address[0] + "]:" + str(address[1])
+        return address[0] + ':' + str(address[1])
+    if isinstance(address, bytes):
+        address = address.decode(errors="replace")
+    return "unix:" + address if address else "unix"
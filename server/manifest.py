@@ -0,0 +1,159 @@
+"""
+Static file manifest
+
+Scan the working directory once on startup and keep
+an in-memory map from URL to file information, so
+serving a static file or a 404 is only a dict lookup
+without probing the filesystem for every request.
+"""
+
+import os
+import time
+import threading
+
+from email.utils import formatdate
+from typing import Dict
+from typing import Optional
+
+from . import utils
+from . import settings
+
+
+class StaticFile:
+    """
+    Information of one static file.
+
+    path - relative path to open, like "./static/events.js"
+    suffix - file suffix, like ".js"
+    size - file size
+    mtime - last modified time
+    mime - mime type
+    headers - precomputed response headers
+    """
+
+    __slots__ = ("path", "suffix", "size", "mtime", "mime", "headers")
+
+    def __init__(self, path: str, suffix: str, size: int,
+                 mtime: float, mime: str):
+        self.path = path
+        self.suffix = suffix
+        self.size = size
+        self.mtime = mtime
+        self.mime = mime
+        self.headers = utils.DynamicDict({
+            "Content-Type": mime,
+            "Last-Modified": formatdate(mtime, usegmt=True)
+        })
+
+    def __repr__(self) -> str:
+        return "<StaticFile {path} {mime} ({size} bytes)>".format(
+            path=self.path, mime=self.mime, size=self.size)
+
+
+class StaticManifest:
+    """
+    URL to static file manifest of a directory.
+
+    URLs are normalised when scanning, so any path not
+    in manifest (including the ones with "..") is a 404.
+    Hidden directories like ".git" are not scanned.
+    """
+
+    def __init__(self, root: Optional[str] = '.',
+                 default_access_file: Optional[str] = settings.DEFAULT_ACCESS_FILE,
+                 mimetype: Optional[Dict[str, str]] = None,
+                 interval: Optional[float] = settings.MANIFEST_RESCAN_INTERVAL):
+        """
+        Initialize and scan a directory.
+
+        Parameters:
+            root: str - Directory to scan
+            default_access_file: str - File returned
+                                 when accessing a directory
+            mimetype: dict - Map from suffix to mime type
+            interval: float - Seconds between rescans,
+                      0 or None to disable rescan
+        """
+        self._root = root
+        self._realroot = os.path.realpath(root)
+        self._dfa = default_access_file
+        self._mimetype = mimetype or dict()
+        self._interval = interval
+        self._files: Dict[str, StaticFile] = dict()
+        self._watcher = None
+        self.scan()
+
+    def __len__(self) -> int:
+        return len(self._files)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._files
+
+    def lookup(self, path: str) -> Optional[StaticFile]:
+        """
+        Find static file for URL path,
+        return None when there is no such file.
+
+        Usage:
+            lookup("/static/events.js") -> StaticFile
+        """
+        return self._files.get(path, None)
+
+    def _inside(self, path: str) -> bool:
+        """Check file (maybe a symlink) is inside root"""
+        real = os.path.realpath(path)
+        return real == self._realroot or \
+            real.startswith(self._realroot + os.sep)
+
+    def scan(self) -> int:
+        """
+        Walk the root directory and rebuild manifest,
+        the new manifest replaces old one at once.
+        Return number of files found.
+        """
+        files = dict()
+        for directory, dirs, filenames in os.walk(self._root):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            relative = os.path.relpath(directory, self._root)
+            prefix = '' if relative == os.curdir else \
+                '/' + relative.replace(os.sep, '/')
+
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                if not self._inside(path):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError as _error:
+                    continue
+
+                _, suffix = os.path.splitext(filename)
+                mime = self._mimetype.get(suffix, "text/plain")
+                entry = StaticFile(
+                    "./" + os.path.relpath(path, self._root).replace(os.sep, '/'),
+                    suffix, stat.st_size, stat.st_mtime, mime)
+                files[prefix + '/' + filename] = entry
+
+                # Directory access returns default access file
+                if filename == self._dfa:
+                    files[prefix + '/'] = entry
+                    if prefix:
+                        files[prefix] = entry
+
+        self._files = files
+        return len(files)
+
+    def watch(self):
+        """
+        Start a daemon thread rescan root periodically.
+        """
+        if not self._interval or self._watcher:
+            return
+
+        def rescan():
+            while True:
+                time.sleep(self._interval)
+                self.scan()
+
+        self._watcher = threading.Thread(target=rescan, daemon=True)
+        self._watcher.start()
@@ -0,0 +1,283 @@
+"""
+Streaming multipart/form-data parser
+
+The parser is fed with body chunks as they are
+received from connection, uploaded files are written
+into spooled temporary files which move to disk once
+they grow beyond a threshold, so the whole body never
+needs to stay in memory.
+"""
+
+import shutil
+import tempfile
+
+from typing import Optional
+
+from . import utils
+from . import errors
+from . import settings
+
+
+class UploadFile:
+    """
+    A file uploaded with multipart/form-data.
+
+    name - form field name
+    filename - file name given by client
+    content_type - content type of the part
+    headers - all headers of the part
+    file - spooled temporary file with the content
+    size - size of the content
+    """
+
+    def __init__(self, name: str, filename: str, headers: dict,
+                 spool_size: Optional[int] = settings.MULTIPART_SPOOL_SIZE):
+        self.name = name
+        self.filename = filename
+        self.headers = headers
+        self.content_type = headers.get(
+            "content-type", "application/octet-stream")
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self.size = 0
+
+    def __repr__(self) -> str:
+        return "<UploadFile {name}: {filename} ({size} bytes)>".format(
+            name=self.name, filename=self.filename, size=self.size)
+
+    def write(self, data: bytes):
+        """Append data to file"""
+        self.file.write(data)
+        self.size += len(data)
+
+    def read(self) -> bytes:
+        """Read whole content of file"""
+        self.file.seek(0)
+        return self.file.read()
+
+    def save(self, path: str):
+        """Copy content of file to path"""
+        self.file.seek(0)
+        with open(path, "wb") as handler:
+            shutil.copyfileobj(self.file, handler)
+
+    def close(self):
+        """Close and remove the temporary file"""
+        self.file.close()
+
+
+class MultipartParser:
+    """
+    Incremental multipart/form-data parser.
+
+    Form fields are collected into self.fields and
+    uploaded files into self.files, both are MultiDict.
+    """
+
+    # Parser states
+    PREAMBLE, DELIMITER, HEADERS, BODY, END = range(5)
+
+    # Max size of headers in one part
+    MAX_HEADER_SIZE = 8192
+
+    def __init__(self, boundary: bytes,
+                 spool_size: Optional[int] = settings.MULTIPART_SPOOL_SIZE,
+                 part_limit: Optional[int] = settings.MULTIPART_PART_LIMIT,
+                 total_limit: Optional[int] = settings.MULTIPART_TOTAL_LIMIT):
+        """
+        Initialize a parser.
+
+        Parameters:
+            boundary: bytes - Boundary in Content-Type header
+            spool_size: int - Max file size kept in memory
+            part_limit: int - Max size of one part
+            total_limit: int - Max size of the whole body
+        """
+        if not boundary or len(boundary) > 70:
+            raise errors.InvalidMultipart(boundary)
+
+        self.fields = utils.MultiDict()
+        self.files = utils.MultiDict()
+
+        # Leading CRLF make the first delimiter same as others
+        self._delimiter = b"\r\n--" + boundary
+        self._buffer = bytearray(b"\r\n")
+        self._state = self.PREAMBLE
+        self._spool_size = spool_size
+        self._part_limit = part_limit
+        self._total_limit = total_limit
+        self._total = 0
+
+        # Current part
+        self._part = None
+        self._part_size = 0
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Create a parser for request according to
+        its Content-Type, and bind files to request.
+        """
+        content_type = request.headers.get("Content-Type", '')
+        _, params = parse_options(content_type)
+        if int(request.headers.get("Content-Length", 0)) > settings.MULTIPART_TOTAL_LIMIT:
+            raise errors.PayloadTooLarge(request.headers.get("Content-Length"))
+
+        parser = cls(params.get("boundary", '').encode("latin-1"))
+        request.files = parser.files
+        return parser
+
+    def feed(self, data: bytes):
+        """
+        Feed a chunk of body to parser.
+        """
+        self._total += len(data)
+        if self._total > self._total_limit:
+            raise errors.PayloadTooLarge(self._total)
+
+        self._buffer += data
+        while self._step():
+            pass
+
+    def close(self) -> utils.MultiDict:
+        """
+        Finish parsing, return form fields.
+        """
+        if self._state != self.END:
+            raise errors.InvalidMultipart("Incomplete multipart body")
+        return self.fields
+
+    def _step(self) -> bool:
+        """
+        Process buffer according to current state,
+        return whether there may be more to process.
+        """
+        buffer, delimiter = self._buffer, self._delimiter
+
+        if self._state == self.PREAMBLE:
+            index = buffer.find(delimiter)
+            if index == -1:
+                # Keep tail may be a partial delimiter
+                del buffer[:max(0, len(buffer) - len(delimiter))]
+                return False
+            return self._skip_delimiter(index)
+
+        if self._state == self.DELIMITER:
+            return self._after_delimiter()
+
+        if self._state == self.HEADERS:
+            index = buffer.find(b"\r\n\r\n")
+            if index == -1:
+                if len(buffer) > self.MAX_HEADER_SIZE:
+                    raise errors.InvalidMultipart("Part headers too large")
+                return False
+            self._start_part(bytes(buffer[:index]))
+            del buffer[:index + 4]
+            self._state = self.BODY
+            return True
+
+        if self._state == self.BODY:
+            index = buffer.find(delimiter)
+            if index == -1:
+                # Write out everything except a possible partial delimiter
+                safe = len(buffer) - len(delimiter) + 1
+                if safe > 0:
+                    self._write_part(buffer[:safe])
+                    del buffer[:safe]
+                return False
+            self._write_part(buffer[:index])
+            self._end_part()
+            return self._skip_delimiter(index)
+
+        # Ignore epilogue
+        buffer.clear()
+        return False
+
+    def _skip_delimiter(self, index: int) -> bool:
+        """Drop data until the end of delimiter at index"""
+        del self._buffer[:index + len(self._delimiter)]
+        self._state = self.DELIMITER
+        return True
+
+    def _after_delimiter(self) -> bool:
+        """
+        Check the two bytes after a delimiter:
+        "--" means end of body, CRLF means a new part.
+        """
+        buffer = self._buffer
+        if len(buffer) < 2:
+            return False
+
+        suffix = bytes(buffer[:2])
+        if suffix == b"--":
+            self._state = self.END
+        elif suffix == b"\r\n":
+            self._state = self.HEADERS
+        else:
+            raise errors.InvalidMultipart(suffix)
+
+        del buffer[:2]
+        return True
+
+    def _start_part(self, rawheaders: bytes):
+        """Parse headers of part and create a field or file"""
+        headers = dict()
+        for line in rawheaders.decode("utf-8", "replace").split("\r\n"):
+            key, sep, value = line.partition(':')
+            if not sep:
+                raise errors.InvalidMultipart(line)
+            headers[key.strip().lower()] = value.strip()
+
+        _, params = parse_options(headers.get("content-disposition", ''))
+        name = params.get("name", None)
+        if name is None:
+            raise errors.InvalidMultipart("Part without name")
+
+        self._part_size = 0
+        if "filename" in params:
+            self._part = UploadFile(
+                name, params["filename"], headers, self._spool_size)
+        else:
+            self._part = (name, bytearray())
+
+    def _write_part(self, data: bytearray):
+        """Append data to current part"""
+        self._part_size += len(data)
+        if self._part_size > self._part_limit:
+            raise errors.PayloadTooLarge(self._part_size)
+
+        if isinstance(self._part, UploadFile):
+            self._part.write(data)
+        else:
+            self._part[1].extend(data)
+
+    def _end_part(self):
+        """Add finished part to fields or files"""
+        part, self._part = self._part, None
+        if isinstance(part, UploadFile):
+            part.file.seek(0)
+            self.files.add(part.name, part)
+        else:
+            name, value = part
+            self.fields.add(name, value.decode("utf-8", "replace"))
+
+
+def parse_options(header: str):
+    """
+    Split header value with options like:
+    'form-data; name="file"; filename="a.txt"' ->
+    "form-data", {"name": "file", "filename": "a.txt"}
+
+    Usage:
+        parse_options(header: str) -> Tuple[str, dict]
+    """
+    value, *options = header.split(';')
+    params = dict()
+    for option in options:
+        key, sep, param = option.strip().partition('=')
+        if not sep:
+            continue
+        param = param.strip()
+        if len(param) >= 2 and param[0] == param[-1] == '"':
+            param = param[1:-1].replace('\\"', '"')
+        params[key.strip().lower()] = param
+    return value.strip().lower(), params
@@ -0,0 +1,186 @@
+"""
+Request profiler
+
+Run cProfile for a fraction of requests, or for requests
+carrying the trusted profiling header, and aggregate the
+stats per route. Reports are served on an admin route and
+could be dumped as pstats files for further analysis.
+"""
+
+import os
+import io
+import re
+import time
+import random
+import pstats
+import cProfile
+import threading
+
+from typing import Dict
+from typing import Optional
+from typing import Callable
+
+from . import settings
+from . import listeners
+from .request import Request
+from .response import Response
+
+
+# Addresses allowed to see reports when there is no token
+LOOPBACK = {"127.0.0.1", "::1"}
+
+
+class Profiler:
+    """
+    Sampling profiler aggregating stats per route.
+
+    Only the worker thread answering a sampled request
+    is profiled, other requests run at full speed.
+    """
+
+    SORT_KEYS = {"cumulative", "tottime", "calls", "ncalls", "time"}
+
+    def __init__(self, rate: Optional[float] = settings.PROFILE_SAMPLE_RATE,
+                 token: Optional[str] = None,
+                 header: Optional[str] = settings.PROFILE_HEADER,
+                 directory: Optional[str] = None):
+        """
+        Initialize a profiler.
+
+        Parameters:
+            rate: float - Fraction of requests profiled, 0 to 1
+            token: str - Requests with header set to token are
+                   always profiled, and could see reports
+            header: str - Name of the profiling header
+            directory: str - Directory pstats files dumped into
+        Usage:
+            Profiler(0.01, token="secret")
+        """
+        self._rate = rate
+        self._token = token
+        self._header = header
+        self._directory = directory
+
+        self._lock = threading.Lock()
+        self._stats: Dict[str, pstats.Stats] = dict()
+        self._samples: Dict[str, int] = dict()
+        self._elapsed: Dict[str, float] = dict()
+
+    def trusted(self, request: Request) -> bool:
+        """Whether request carries the profiling token"""
+        return bool(self._token) and \
+            request.headers.get(self._header, None) == self._token
+
+    def sampled(self, request: Request) -> bool:
+        """Whether request should be profiled"""
+        if self.trusted(request):
+            return True
+        return self._rate > 0 and random.random() < self._rate
+
+    def run(self, route: str, function: Callable, *args, sample: bool = True):
+        """
+        Call function under profiler, add stats to route.
+
+        Parameters:
+            route: str - Route key stats aggregated into
+            function: Callable - Function to profile
+            sample: bool - Count as a new sample, False when
+                    adding to the sample of a request profiled
+        """
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            return profile.runcall(function, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats = pstats.Stats(profile)
+            with self._lock:
+                if route in self._stats:
+                    self._stats[route].add(stats)
+                else:
+                    self._stats[route] = stats
+                if sample:
+                    self._samples[route] = self._samples.get(route, 0) + 1
+                self._elapsed[route] = self._elapsed.get(route, 0.0) + elapsed
+
+    def routes(self) -> Dict[str, int]:
+        """Return sample count of each route"""
+        with self._lock:
+            return dict(self._samples)
+
+    def report(self, route: Optional[str] = None,
+               top: Optional[int] = settings.PROFILE_REPORT_TOP,
+               sort: Optional[str] = "cumulative") -> str:
+        """
+        Make top-N text report of one route or all routes,
+        routes with most time spent first.
+        """
+        if sort not in self.SORT_KEYS:
+            sort = "cumulative"
+
+        buffer = io.StringIO()
+        with self._lock:
+            routes = sorted(self._elapsed, key=self._elapsed.get, reverse=True)
+            for key in routes:
+                if route is not None and key != route:
+                    continue
+                samples = self._samples[key]
+                buffer.write("{route} - {samples} samples, {mean:.2f}ms mean\n".format(
+                    route=key, samples=samples,
+                    mean=self._elapsed[key] / samples * 1000))
+                stats = self._stats[key]
+                stats.stream = buffer
+                stats.sort_stats(sort).print_stats(top)
+        return buffer.getvalue()
+
+    def dump(self, directory: str) -> int:
+        """
+        Write stats of each route into "<route>.pstats"
+        in directory, return number of files written.
+        """
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            for route, stats in self._stats.items():
+                name = re.sub(r"[^\w.-]+", '_', route).strip('_')
+                stats.dump_stats(os.path.join(directory, name + ".pstats"))
+            return len(self._stats)
+
+    def reset(self):
+        """Drop all stats collected"""
+        with self._lock:
+            self._stats.clear()
+            self._samples.clear()
+            self._elapsed.clear()
+
+    def view(self, request: Request) -> Response:
+        """
+        Admin view of reports, allowed with the profiling
+        token, or from loopback when there is no token.
+
+        Query arguments:
+            route - only report this route, like "GET /hello"
+            top - number of functions reported
+            sort - "cumulative", "tottime" or "calls"
+            dump - write pstats files into profiler's directory
+            reset - drop stats after reporting
+        """
+        if self._token:
+            if not self.trusted(request):
+                return Response(403)
+        elif listeners.host(request.remote) not in LOOPBACK:
+            # Unix domain socket clients could be proxied, not trusted
+            return Response(403)
+
+        args = request.args
+        try:
+            top = int(args.get("top", settings.PROFILE_REPORT_TOP))
+        except ValueError as _error:
+            top = settings.PROFILE_REPORT_TOP
+
+        report = self.report(args.get("route", None), top,
+                             args.get("sort", "cumulative"))
+        if args.get("dump", None) and self._directory:
+            self.dump(self._directory)
+        if args.get("reset", None):
+            self.reset()
+        return Response(200, report or "No samples.\n", content_type="text/plain")
@@ -0,0 +1,417 @@
+"""
+Reverse proxy
+
+Forward requests under a path prefix to upstream servers.
+Each upstream keeps a bounded pool of keep-alive connections,
+request and response bodies are streamed through without
+being buffered whole. Upstreams failing repeatedly are not
+selected for a while, idempotent requests are retried on
+another upstream.
+"""
+
+import time
+import socket
+import threading
+import collections
+import http.client
+
+from typing import List
+from typing import Tuple
+from typing import Union
+from typing import Iterable
+from typing import Optional
+
+from . import consts
+from . import errors
+from . import settings
+from . import listeners
+from .headers import Headers
+from .request import Request
+from .response import Response
+
+
+class Upstream:
+    """
+    One upstream server with its connection pool.
+
+    fails - consecutive failures
+    down_until - monotonic time before which it is not selected
+    """
+
+    def __init__(self, address: Union[str, Tuple[str, int]],
+                 maxsize: Optional[int] = settings.PROXY_POOL_SIZE,
+                 timeout: Optional[float] = settings.PROXY_TIMEOUT):
+        """
+        Initialize an upstream.
+
+        Parameters:
+            address: str | Tuple[str, int] - "host:port" or (host, port)
+            maxsize: int - Max connections open at same time
+            timeout: float - Seconds waiting for upstream
+        """
+        if isinstance(address, str):
+            host, _sep, port = address.rpartition(':')
+            address = (host, int(port))
+        self.host, self.port = address
+        self._maxsize = maxsize
+        self._timeout = timeout
+
+        self._idle = collections.deque()
+        self._active = 0
+        self._condition = threading.Condition()
+
+        self.fails = 0
+        self.down_until = 0.0
+
+    def __repr__(self) -> str:
+        return "<Upstream {host}:{port}>".format(host=self.host, port=self.port)
+
+    @property
+    def healthy(self) -> bool:
+        """Whether upstream could be selected"""
+        return time.monotonic() >= self.down_until
+
+    @property
+    def load(self) -> int:
+        """Number of connections in use"""
+        return self._active - len(self._idle)
+
+    def acquire(self, fresh: bool = False) -> Tuple[http.client.HTTPConnection, bool]:
+        """
+        Take an idle connection, or open a new one when pool
+        is not full. Return connection and whether it is reused.
+        Raise errors.UpstreamBusy when pool stays full.
+
+        Parameters:
+            fresh: bool - Open a new connection, in place of
+                   an idle one when pool is full
+        """
+        with self._condition:
+            if self._idle and not fresh:
+                return self._idle.pop(), True
+
+            full = lambda: self._active >= self._maxsize and not self._idle
+            if not self._condition.wait_for(lambda: not full(), self._timeout):
+                raise errors.UpstreamBusy(self)
+            if self._idle and not fresh:
+                return self._idle.pop(), True
+            if self._active >= self._maxsize:
+                self._idle.popleft().close()
+                self._active -= 1
+            self._active += 1
+
+        connection = http.client.HTTPConnection(
+            self.host, self.port, timeout=self._timeout)
+        return connection, False
+
+    def release(self, connection: http.client.HTTPConnection, reuse: bool):
+        """Give connection back to pool, or close it"""
+        with self._condition:
+            if reuse:
+                self._idle.append(connection)
+            else:
+                connection.close()
+                self._active -= 1
+            self._condition.notify()
+
+    def succeed(self):
+        """Request answered by upstream"""
+        self.fails = 0
+        self.down_until = 0.0
+
+    def fail(self):
+        """Upstream failed, mark it down when failing too many times"""
+        self.fails += 1
+        if self.fails >= settings.PROXY_MAX_FAILS:
+            self.down_until = time.monotonic() + settings.PROXY_DOWN_INTERVAL
+
+    def check(self, path: str):
+        """Probe upstream with GET path, 2xx and 3xx mean healthy"""
+        connection = http.client.HTTPConnection(
+            self.host, self.port, timeout=self._timeout)
+        try:
+            connection.request("GET", path)
+            status = connection.getresponse().status
+        except (OSError, http.client.HTTPException) as _error:
+            status = 0
+        finally:
+            connection.close()
+
+        if 200 <= status < 400:
+            self.succeed()
+        else:
+            self.fails = max(self.fails, settings.PROXY_MAX_FAILS - 1)
+            self.fail()
+
+
+class UpstreamBody:
+    """
+    Response body read from upstream in chunks, the
+    connection goes back to pool after body read through.
+    """
+
+    def __init__(self, upstream: Upstream,
+                 connection: http.client.HTTPConnection,
+                 response: http.client.HTTPResponse):
+        self._upstream = upstream
+        self._connection = connection
+        self._response = response
+        self._released = False
+
+    def __iter__(self):
+        try:
+            while True:
+                chunk = self._response.read1(settings.RECV_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        except (OSError, http.client.HTTPException) as _error:
+            self.close()
+            raise ConnectionError(_error)
+
+        # Response must be closed before connection sends again
+        self._response.close()
+        self._release(not self._response.will_close)
+
+    def _release(self, reuse: bool):
+        """Release upstream connection once"""
+        if not self._released:
+            self._released = True
+            self._upstream.release(self._connection, reuse)
+
+    def close(self):
+        """Body not read through, connection cannot be reused"""
+        self._release(False)
+
+
+class ReverseProxy:
+    """
+    Proxy requests under prefix to upstreams.
+
+    The upstream with least connections in use among the
+    healthy ones is selected for each request.
+    """
+
+    # Failures of reused connection closed by upstream while idle
+    STALE_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                    ConnectionResetError, BrokenPipeError)
+
+    def __init__(self, prefix: str, upstreams: Iterable[Union[str, Tuple[str, int]]],
+                 strip: Optional[bool] = False,
+                 retries: Optional[int] = settings.PROXY_RETRIES,
+                 timeout: Optional[float] = settings.PROXY_TIMEOUT,
+                 maxsize: Optional[int] = settings.PROXY_POOL_SIZE,
+                 health: Optional[str] = None,
+                 interval: Optional[float] = settings.PROXY_DOWN_INTERVAL):
+        """
+        Initialize a reverse proxy.
+
+        Parameters:
+            prefix: str - Path prefix proxied, like "/api"
+            upstreams: Iterable - Upstream addresses
+            strip: bool - Remove prefix from path sent to upstream
+            retries: int - Times retrying idempotent requests
+            timeout: float - Seconds waiting for upstream
+            maxsize: int - Max connections to each upstream
+            health: str - Path probed periodically to check
+                    upstreams, only failures are used when None
+            interval: float - Seconds between health checks
+        """
+        self.prefix = prefix.rstrip('/')
+        self.upstreams: List[Upstream] = [
+            Upstream(address, maxsize, timeout) for address in upstreams]
+        if not self.upstreams:
+            raise errors.UpstreamError("No upstream for " + prefix)
+
+        self._strip = strip
+        self._retries = retries
+        self._health = health
+        self._interval = interval
+        self._watcher = None
+        self._turn = 0
+
+    def match(self, path: str) -> bool:
+        """Whether path is under prefix"""
+        return path == self.prefix or path.startswith(self.prefix + '/') \
+            or not self.prefix
+
+    def select(self, tried: Iterable[Upstream] = ()) -> Optional[Upstream]:
+        """
+        Select a healthy upstream not tried yet with least load,
+        when all are down, the one to recover first is tried.
+        """
+        candidates = [upstream for upstream in self.upstreams
+                      if upstream not in tried]
+        if not candidates:
+            return None
+
+        # Upstreams with same load are taken in turn
+        if not tried:
+            self._turn = (self._turn + 1) % len(self.upstreams)
+        healthy = [upstream for upstream in candidates if upstream.healthy]
+        if healthy:
+            turn = self._turn % len(healthy)
+            healthy = healthy[turn:] + healthy[:turn]
+            return min(healthy, key=lambda upstream: upstream.load)
+        return min(candidates, key=lambda upstream: upstream.down_until)
+
+    def watch(self):
+        """
+        Start a daemon thread checking upstreams periodically.
+        """
+        if not self._health or self._watcher:
+            return
+
+        def check():
+            while True:
+                for upstream in self.upstreams:
+                    upstream.check(self._health)
+                time.sleep(self._interval)
+
+        self._watcher = threading.Thread(target=check, daemon=True)
+        self._watcher.start()
+
+    def _target(self, request: Request) -> str:
+        """Make URL sent to upstream"""
+        path = request.path
+        if self._strip:
+            path = path[len(self.prefix):] or '/'
+        if request.query:
+            path += '?' + request.query
+        return path
+
+    def _headers(self, request: Request) -> List[Tuple[str, str]]:
+        """Request headers without hop-by-hop ones, with X-Forwarded-*"""
+        listed = {name.strip().lower() for name in
+                  str(request.headers.get("Connection", '')).split(',')}
+        hop = {name.lower() for name in consts.HOP_BY_HOP_HEADERS} | listed
+
+        headers = [(name, str(value)) for name, value in request.headers.items()
+                   if name.lower() not in hop and not name.lower().startswith("x-forwarded-")]
+        forwarded = request.headers.get("X-Forwarded-For", '')
+        client = listeners.host(request.remote)
+        headers.append(("X-Forwarded-For", forwarded + ", " + client if forwarded else client))
+        headers.append(("X-Forwarded-Proto", request.scheme))
+        if "Host" in request.headers:
+            headers.append(("X-Forwarded-Host", request.headers["Host"]))
+        return headers
+
+    @staticmethod
+    def _response_headers(response: http.client.HTTPResponse) -> Headers:
+        """Response headers without hop-by-hop ones"""
+        listed = {name.strip().lower() for name in
+                  (response.getheader("Connection") or '').split(',')}
+        hop = {name.lower() for name in consts.HOP_BY_HOP_HEADERS} | listed
+
+        headers = Headers()
+        for name, value in response.getheaders():
+            if name.lower() not in hop:
+                headers.add(name, value)
+        return headers
+
+    def _forward(self, upstream: Upstream, request: Request) -> Response:
+        """
+        Send request to upstream and return streamed response.
+        Raise OSError / http.client.HTTPException when failed.
+
+        A reused connection upstream closed while idle fails
+        before any response byte, the request is then sent
+        once more on a new connection to the same upstream,
+        unless its body was consumed.
+        """
+        for fresh in (False, True):
+            connection, reused = upstream.acquire(fresh)
+            streamed = False
+            try:
+                connection.putrequest(request.method, self._target(request),
+                                      skip_host=True, skip_accept_encoding=True)
+                for name, value in self._headers(request):
+                    connection.putheader(name, value)
+                connection.endheaders()
+
+                if request.deferred:
+                    for chunk in request.iter_body():
+                        streamed = True
+                        connection.send(chunk)
+                response = connection.getresponse()
+                break
+            except self.STALE_ERRORS as _error:
+                upstream.release(connection, False)
+                if not reused or streamed:
+                    raise
+            except BaseException as _error:
+                upstream.release(connection, False)
+                raise
+
+        if not response.status in consts.HTTP_RESPONSE_DESCRIPTIONS:
+            response.close()
+            upstream.release(connection, False)
+            raise errors.UpstreamError(response.status)
+
+        headers = self._response_headers(response)
+        content_type = response.getheader("Content-Type", "text/plain")
+
+        # Response without body, connection is released at once
+        if response.length == 0 or request.method == "HEAD" or \
+                response.status in (204, 304):
+            response.read()
+            response.close()
+            upstream.release(connection, not response.will_close)
+            headers.setdefault("Content-Length", 0)
+            return Response(response.status, headers=headers,
+                            content_type=content_type, stream=())
+
+        body = UpstreamBody(upstream, connection, response)
+        return Response(response.status, headers=headers,
+                        content_type=content_type, stream=body)
+
+    @staticmethod
+    def _has_body(request: Request) -> bool:
+        """
+        Whether request has a body streamed to upstream,
+        which is consumed once sent. Chunked body has no
+        Content-Length, invalid one is taken as a body.
+        """
+        if not request.deferred:
+            return False
+        encoding = str(request.headers.get("Transfer-Encoding", '')).lower()
+        if "chunked" in encoding:
+            return True
+        try:
+            return int(request.headers.get("Content-Length", 0)) > 0
+        except ValueError as _error:
+            return True
+
+    def __call__(self, request: Request) -> Response:
+        """
+        Proxy request, return HTTP-502 when upstreams failed,
+        HTTP-504 when they timed out and HTTP-503 when pools full.
+        """
+        has_body = self._has_body(request)
+        idempotent = request.method in consts.IDEMPOTENT_METHODS and not has_body
+
+        tried, code = list(), 502
+        while len(tried) <= self._retries:
+            upstream = self.select(tried)
+            if upstream is None:
+                break
+            tried.append(upstream)
+
+            try:
+                response = self._forward(upstream, request)
+            except errors.UpstreamBusy as _error:
+                return Response(503)
+            except socket.timeout as _error:
+                upstream.fail()
+                code = 504
+            except (errors.UpstreamError, OSError, http.client.HTTPException) as _error:
+                upstream.fail()
+            else:
+                upstream.succeed()
+                return response
+
+            # Body of request consumed, cannot be sent again
+            if not idempotent:
+                break
+
+        return Response(code)
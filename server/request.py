@@ -8,10 +8,17 @@ layer during the request.
 
 import sys
 
+from typing import Union
+from typing import Optional
+
 from . import utils
 from . import errors
 from . import consts
 from . import settings
+from . import multipart
+from . import jsoncodec
+from . import listeners
+from .headers import Headers
 
 
 class Request:
@@ -21,6 +28,11 @@ class Request:
     the original packet into a request dictionary.
 
     __body_handler - a registry for ContentType with function
+    __raw_body - ContentTypes whose handler takes body as bytes
+    __stream_handler - a registry for ContentType with parser factory,
+                       parsers are fed with body chunks while receiving
+    __deferred_prefix - path prefixes whose bodies are not received
+                        by server, handlers read them with iter_body
     """
     __body_handler = dict({
         "text/html": lambda body: body,
@@ -28,8 +40,12 @@ class Request:
         "text/css": lambda body: body,
         "text/javascript": lambda body: body
     })
+    __raw_body = set()
+    __stream_handler = dict()
+    __deferred_prefix = set()
 
-    def __init__(self, rawdata: str):
+    def __init__(self, rawdata: Union[str, bytes],
+                 json: Optional[jsoncodec.JSONCodec] = None):
         """
         Initialize a request object.
 
@@ -40,14 +56,23 @@ class Request:
         cookie - request cookie
         host - address and port bound by our server
         remote - address and port about remote user
+        scheme - "https" when received over TLS
         environ - all environment informations
-        headers - request HTTP hedaer
+        headers - request HTTP hedaer, case-insensitive Headers
         body - decoded request body (could be str/dict)
+        files - files uploaded with multipart/form-data
         args - path parameters in the request link
         http - HTTP Protocol Info
+        pending - size of body still not received
+        deferred - body is left for handler to read with iter_body
+        reader - function reads body from connection, set by server
+        deadline - cancellation token of view, set for routes with deadline
 
         Parameters:
-            rawdata: str - Raw request string
+            rawdata: str | bytes - Raw request data, could be
+                     only the head with body fed later
+            json: JSONCodec - Codec decoding JSON bodies, the one
+                  of application serving request, default when None
         Usage:
             Request(rawdata: str) -> NoReturn
         """
@@ -59,12 +84,45 @@ class Request:
         self.query = str()
         self.host = tuple()
         self.remote = tuple()
+        self.scheme = "http"
         self.cookie = utils.DynamicDict()
         self.environ = utils.DynamicDict()
-        self.headers = utils.DynamicDict()
+        self.headers = Headers()
         self.body = utils.DynamicDict()
+        self.files = utils.MultiDict()
         self.args = utils.DynamicDict()
         self.http = utils.DynamicDict()
+        self.pending = 0
+        self.deferred = False
+        self.reader = None
+        self.deadline = None
+
+        # Body receiving status
+        self._stream = None
+        self._chunks = list()
+        self._json = json or jsoncodec.default
+
+    def __getstate__(self) -> dict:
+        """
+        Compact state pickled for views in process pool:
+        raw data, environ (rebuilt from the others) and body
+        receiving status are left, uploaded files are not sent.
+        """
+        state = self.__dict__.copy()
+        for key in ("_rawdata", "environ", "reader", "_stream", "_chunks", "_json"):
+            state.pop(key, None)
+        state["files"] = utils.MultiDict()
+        return state
+
+    def __setstate__(self, state: dict):
+        """Restore request pickled, with environ rebuilt"""
+        self.__dict__.update(state)
+        self._rawdata = bytes()
+        self.reader = None
+        self._stream = None
+        self._chunks = list()
+        self.environ = utils.DynamicDict()
+        self._set_environ()
 
     @staticmethod
     def unquote(encoded: str, encoding: str = "utf-8") -> str:
@@ -129,6 +187,49 @@ class Request:
 
         return parameters
 
+    @property
+    def keep_alive(self) -> bool:
+        """
+        Whether connection should be kept after response:
+        HTTP/1.1 keeps it unless "Connection: close",
+        HTTP/1.0 closes it unless "Connection: keep-alive".
+        """
+        option = self.headers.get("Connection", '').lower()
+        if self.http.version == "HTTP/1.0":
+            return option == "keep-alive"
+        return option != "close"
+
+    def accepts(self, mime: str) -> bool:
+        """
+        Check whether client accepts given mime type
+        according to the Accept header, the most specific
+        matched media range decides with its q value.
+
+        Parameters:
+            mime: str - Mime type like "application/json"
+        Usage:
+            accepts(mime: str) -> bool
+        """
+        accept = self.headers.get("Accept", None)
+        if not accept:
+            return True
+
+        ranges = ("*/*", mime.split('/')[0] + "/*", mime)
+        matched, quality = -1, 0.0
+        for item in accept.split(','):
+            value, params = multipart.parse_options(item)
+            if not value in ranges:
+                continue
+            specific = ranges.index(value)
+            if specific < matched:
+                continue
+            try:
+                matched, quality = specific, float(params.get('q', 1))
+            except ValueError as _error:
+                continue
+
+        return quality > 0
+
     def _set_environ(self):
         """
         Get request enviroment informations.
@@ -145,7 +246,7 @@ class Request:
         self.environ["wsgi.multithread"] = False
         self.environ["wsgi.multiprocess"] = False  # we have no plan
         self.environ["wsgi.run_once"] = True      # to support these
-        self.environ["wsgi.url_scheme"] = "http"  # features.
+        self.environ["wsgi.url_scheme"] = self.scheme  # features.
 
         # cgi environment support
         self.environ.REQUEST_METHOD = self.method
@@ -159,9 +260,9 @@ class Request:
             self.headers.get("Content-Type", None)
         self.environ.SERVER_PROTOCOL = self.http.version
         self.environ.SERVER_NAME, self.environ.SERVER_PORT = \
-            self.headers.get("Host").strip("Host: ").split(':')
-        self.environ.SERVER_PORT = int(self.environ.SERVER_PORT)
+            self._split_host(self.headers.get("Host", ''))
         self.environ.SERVER_SOFTWARE = settings.SERVER_NAME
+        self.environ.REMOTE_ADDR = listeners.host(self.remote)
         self.host = self.environ.SERVER_NAME, self.environ.SERVER_PORT
 
         # HTTP encitoment support
@@ -170,36 +271,178 @@ class Request:
         self.environ.HTTP_VERSION = self.http.version
         self.environ.HTTP_USER_AGENT = self.headers.get("User-Agent", '')
         self.environ.HTTP_COOKIE = self.headers.get("Cookie", '')
+        if self.scheme == "https":
+            self.environ.HTTPS = "on"
 
-    def _makebody(self, bodydata: str):
+    def _split_host(self, host: str):
+        """
+        Split Host header into name and port, port
+        is the default one of scheme when not given:
+            e.g. "localhost:8080" -> "localhost", 8080
+            e.g. "[::1]" -> "[::1]", 443 (https)
+        """
+        name, sep, port = host.rpartition(':')
+        if sep and port.isdigit():
+            return name, int(port)
+        return host, 443 if self.scheme == "https" else 80
+
+    def _makebody(self, bodydata: bytes):
         """
         Get the request body according to the information in the
         request header, and then find the corresponding support
         function for analysis based on the content-type information.
+
+        Body not received yet will be fed later with self.feed,
+        streaming parsers get the data as soon as it arrives,
+        the others get the whole body after it is received.
         """
         # If request method should not carry a body
         if not self.method in consts.HAS_BODY_METHODS:
             return
 
         content_length = int(self.headers.get("Content-Length", len(bodydata)))
-        self.headers["Content-length"] = content_length
+        self.headers["Content-Length"] = content_length
         content_type = self.headers.get("Content-Type", "text/plain")
         content_type = content_type.split(';', 1)[0]
-        handler = self.__body_handler.get(content_type, lambda body: body)
 
-        # Call the handler to del with body
-        self.body = handler(bodydata[0: content_length])
+        # Handler reads body itself, there is no size limit
+        if self._is_deferred():
+            self.deferred = True
+            self._chunks.append(bodydata[0: content_length])
+            self.pending = content_length - len(self._chunks[0])
+            return
+
+        factory = self.__stream_handler.get(content_type, None)
+        if factory:
+            self._stream = factory(self)
+        elif content_length > settings.MAX_BODY_SIZE:
+            raise errors.PayloadTooLarge(content_length)
+
+        self.pending = content_length
+        self.feed(bodydata[0: content_length], force=True)
+
+    def _is_deferred(self) -> bool:
+        """Whether path is under one of deferred prefixes"""
+        for prefix in self.__deferred_prefix:
+            if self.path == prefix or self.path.startswith(prefix.rstrip('/') + '/'):
+                return True
+        return False
+
+    def iter_body(self, size: int = settings.RECV_CHUNK_SIZE):
+        """
+        Yield body of a deferred request in chunks,
+        the part not received yet is read with self.reader.
+
+        Usage:
+            for chunk in request.iter_body(): ...
+        """
+        while self._chunks:
+            chunk = self._chunks.pop(0)
+            if chunk:
+                yield chunk
+
+        while self.pending:
+            chunk = self.reader(min(self.pending, size))
+            if not chunk:
+                raise ConnectionError("Client closed before body received")
+            self.pending -= len(chunk)
+            yield chunk
+
+    def feed(self, data: bytes, force: bool = False):
+        """
+        Feed received body data to request,
+        the body is made when all data received.
+
+        Parameters:
+            data: bytes - Body chunk
+            force: bool - Make body even if no data
+        """
+        if not data and not force:
+            return
+
+        data = data[0: self.pending]
+        self.pending -= len(data)
+        if self._stream:
+            self._stream.feed(data)
+        elif data:
+            self._chunks.append(data)
+
+        if not self.pending:
+            self._finish()
+
+    def _finish(self):
+        """
+        All body data received - call the handler to deal with body
+        """
+        if self._stream:
+            self.body = self._stream.close()
+            self._stream = None
+            return
+
+        bodydata = b''.join(self._chunks)
+        self._chunks.clear()
+        content_type = self.headers.get("Content-Type", "text/plain")
+        mime, params = multipart.parse_options(content_type)
+        handler = self.__body_handler.get(mime, None)
+        raw = mime in self.__raw_body
+        if handler is None and mime in jsoncodec.CONTENT_TYPES:
+            # Decoded with codec of application, unless one registered
+            handler, raw = self._json.loads, True
+        elif handler is None:
+            handler = lambda body: body
+        if raw:
+            try:
+                self.body = handler(bodydata)
+            except ValueError as _error:
+                raise errors.InvalidRequest(_error)
+            return
+
+        charset = params.get("charset", "utf-8")
+        try:
+            bodydata = bodydata.decode(charset, "replace")
+        except LookupError as _error:
+            raise errors.InvalidRequest(charset)
+        self.body = handler(bodydata)
 
     @staticmethod
-    def register_body_handler(content_type: str, handler):
+    def register_body_handler(content_type: str, handler, raw: bool = False):
         """
         Add one hanlder function to body registry.
 
         Parameters:
             content_type: str - Specified content type deal with
             handler: Callable[[str], Any] - handler function
+            raw: bool - Pass body to handler as bytes without decoding
         """
         Request.__body_handler[content_type] = handler
+        if raw:
+            Request.__raw_body.add(content_type)
+        else:
+            Request.__raw_body.discard(content_type)
+
+    @staticmethod
+    def register_stream_handler(content_type: str, factory):
+        """
+        Add one parser factory to stream registry.
+        The parser should have feed(chunk: bytes)
+        and close() -> body methods.
+
+        Parameters:
+            content_type: str - Specified content type deal with
+            factory: Callable[[Request], Parser] - parser factory
+        """
+        Request.__stream_handler[content_type] = factory
+
+    @staticmethod
+    def register_deferred_prefix(prefix: str):
+        """
+        Leave bodies of requests under prefix unreceived,
+        so the handler could stream them with iter_body.
+
+        Parameters:
+            prefix: str - Path prefix like "/api"
+        """
+        Request.__deferred_prefix.add(prefix)
 
     def parse(self):
         """
@@ -209,37 +452,42 @@ class Request:
         The following is the request's environment information (header).
         After that will only left request' body.
         """
-        rawreq = self._rawdata.strip().split("\r\n")
+        rawdata = self._rawdata
+        if isinstance(rawdata, str):
+            rawdata = rawdata.encode()
+
+        # Only request line is decoded, header values are
+        # decoded when read, body is kept as bytes.
+        # Parts are sliced once out of rawdata by offsets
+        rawdata = rawdata.lstrip()
+        end = rawdata.find(b"\r\n\r\n")
+        if end == -1:
+            end = len(rawdata)
+        line = rawdata.find(b"\r\n", 0, end)
+        if line == -1:
+            line = end
+        basics, fields = rawdata[:line], rawdata[line + 2:end]
+        bodydata = rawdata[end + 4:]
 
         # Split and get the basic info in request
-        basics = rawreq.pop(0)
-        self._set_basics(basics)
+        self._set_basics(basics.decode("iso-8859-1"))
 
-        # Get headers - request body and header splited with '\r'
-        # Traverse request, stop when a single line '\r' is found
+        # Get headers - one field in each line
         try:
-            headers = list()
-            line = rawreq.pop(0).strip()
-            while line:
-                headers.append(tuple(line.split(": ")))
-                if not rawreq:
-                    break
-                line = rawreq.pop(0).strip()
-
-            self.headers.update(dict(headers))
+            self.headers = Headers.parse(fields)
         except ValueError as _error:
-            raise errors.InvalidRequest(rawreq)
+            raise errors.InvalidRequest(_error)
 
         # Add environ informations
         self._set_environ()
 
         # The left part is request body
-        self._makebody("\r\n".join(rawreq))
+        self._makebody(bodydata)
 
-        # Try add cookie info
-        cookie = self.headers.get("Cookie", '')
-        if cookie:
-            self.cookie = self.url_decode(cookie, "; ")
+        # Try add cookie info, repeated Cookie headers are joined
+        cookies = self.headers.getall("Cookie")
+        if cookies:
+            self.cookie = self.url_decode("; ".join(cookies), "; ")
 
     def _set_basics(self, line):
         """
@@ -273,3 +521,6 @@ class Request:
 Request.register_body_handler(
     "application/x-www-form-urlencoded",
     Request.url_decode)
+Request.register_stream_handler(
+    "multipart/form-data",
+    multipart.MultipartParser.from_request)
@@ -6,9 +6,21 @@ which is used to make an HTTP response packet
 based on the specified response code and data.
 """
 
+import os
+import struct
+
 from . import errors
 from . import consts
 from . import settings
+from .headers import Headers
+
+
+# Serialised response: code, content type length (NO_CONTENT_TYPE
+# when None), header count, body length, then content type, headers
+# as name length, value length, name, value, and body
+SERIALISED = struct.Struct("!HHHI")
+SERIALISED_HEADER = struct.Struct("!HH")
+NO_CONTENT_TYPE = 0xffff
 
 
 class Response:
@@ -20,19 +32,28 @@ class Response:
     """
 
     def __init__(self, code: int, data='', environ=None, headers=None,
-                 content_type=settings.DEFAULT_RESPONSE_CONTENT_TYPE):
+                 content_type=settings.DEFAULT_RESPONSE_CONTENT_TYPE, file=None,
+                 stream=None):
         """
         Initialize a Response object.
 
         Parameters:
             code: int - HTTP Response code
-            data: str - HTTP Response data
+            data: str | bytes - HTTP Response data
             environ: dict - WSGI Environ dict
-            headers: Optional[dict] - Extra header information
+            headers: Optional[dict | Headers] - Extra header information
             content_type: Optional[str] - Return type description
+            file: Optional[str] - Path of file sent as body,
+                  the server sends it with sendfile after headers
+            stream: Optional[Iterable[bytes]] - Body chunks sent as
+                    they are produced, with chunked encoding when
+                    Content-Length is not in headers
         """
         self.code = code
         self.data = data
+        self.file = file
+        self.stream = stream
+        self.size = 0
         self._extra_hedaers = headers
         self._content_type = content_type
 
@@ -47,6 +68,115 @@ class Response:
 
         self._exception_data()
 
+    @property
+    def sendfile(self) -> bool:
+        """
+        Whether server should send self.file after done()
+        """
+        return self.file is not None and self._environ_method != "HEAD"
+
+    @property
+    def streaming(self) -> bool:
+        """
+        Whether server should send chunks of self.stream after done()
+        """
+        return self.stream is not None and self._environ_method != "HEAD"
+
+    @property
+    def chunked(self) -> bool:
+        """
+        Whether streamed body is sent with chunked encoding
+        """
+        return self.streaming and not (
+            self._extra_hedaers and "Content-Length" in self._extra_hedaers)
+
+    def close(self):
+        """
+        Release stream not sent (like an upstream connection)
+        """
+        close = getattr(self.stream, "close", None)
+        if close:
+            close()
+
+    def copy(self):
+        """
+        Copy of response for another request, with body
+        serialised once. Return None when body is streamed.
+        """
+        if self.stream is not None:
+            return None
+
+        data = self.data
+        if not isinstance(data, bytes):
+            data = str(data).encode()
+        headers = self._extra_hedaers
+        if isinstance(headers, Headers):
+            headers = Headers(headers)
+        elif headers:
+            headers = dict(headers)
+        return Response(self.code, data, headers=headers,
+                        content_type=self._content_type, file=self.file)
+
+    def dumps(self):
+        """
+        Response serialised for cache shared by processes,
+        None when body is streamed or sent from file.
+        """
+        copied = self.copy()
+        if copied is None or copied.file is not None:
+            return None
+        headers = copied._extra_hedaers or ()
+        if not isinstance(headers, Headers):
+            headers = Headers(headers)
+
+        content_type = b''
+        if copied._content_type is not None:
+            content_type = str(copied._content_type).encode()
+        parts = [b'', content_type]
+        for name, value in headers.items():
+            name, value = str(name).encode(), str(value).encode()
+            parts.append(SERIALISED_HEADER.pack(len(name), len(value)) + name + value)
+        parts.append(copied.data)
+        parts[0] = SERIALISED.pack(
+            copied.code, NO_CONTENT_TYPE if copied._content_type is None
+            else len(content_type), len(parts) - 3, len(copied.data))
+        return b''.join(parts)
+
+    @classmethod
+    def loads(cls, data: bytes):
+        """
+        Response of what dumps serialised,
+        raise ValueError when data is malformed.
+        """
+        try:
+            code, size, count, length = SERIALISED.unpack_from(data, 0)
+            offset = SERIALISED.size
+            content_type = None
+            if size != NO_CONTENT_TYPE:
+                content_type = data[offset:offset + size].decode()
+                offset += size
+            headers = Headers()
+            for _ in range(count):
+                name, value = SERIALISED_HEADER.unpack_from(data, offset)
+                offset += SERIALISED_HEADER.size
+                headers.add(data[offset:offset + name].decode(),
+                            data[offset + name:offset + name + value].decode())
+                offset += name + value
+            if offset + length != len(data):
+                raise ValueError("Serialised response of wrong length")
+            return cls(code, data[offset:], headers=headers, content_type=content_type)
+        except (struct.error, UnicodeDecodeError, errors.InvalidHTTPResponseCode) as _error:
+            raise ValueError(_error)
+
+    def bind(self, request):
+        """
+        Bind response to the request it answers,
+        so the body of response to HEAD will be dropped.
+        Return response itself.
+        """
+        self._environ_method = request.method
+        return self
+
     def _make_baseline(self):
         """
         Make the first line of the HTTP response.
@@ -88,9 +218,48 @@ class Response:
         and there's no data provided,
         choose a data in config file
         """
-        if 400 <= self.code <= 599 and not self.data:
+        if 400 <= self.code <= 599 and not self.data and self.stream is None:
             self.data = settings.ERROR_RESPONSE_BODY.get(self.code, '')
 
+    def payload(self):
+        """
+        Make response headers and body bytes,
+        body is empty when answering HEAD.
+
+        Usage:
+            payload() -> Tuple[dict, bytes]
+        """
+        data = self.data
+        if not isinstance(data, bytes):
+            data = str(data).encode()
+
+        headers = {
+            "Server": settings.SERVER_NAME,
+            "Content-Type": self._content_type,
+            "Content-Length": len(data)}
+
+        # File body is not included, only its size
+        if self.file is not None:
+            self.size = os.path.getsize(self.file)
+            headers["Content-Length"] = self.size
+
+        # Repeated headers (like Set-Cookie) are kept in Headers
+        if isinstance(self._extra_hedaers, Headers):
+            headers = Headers(headers)
+        if self._extra_hedaers:
+            headers.update(self._extra_hedaers)
+
+        # Length of streamed body is unknown without header
+        if self.chunked:
+            del headers["Content-Length"]
+            headers["Transfer-Encoding"] = "chunked"
+
+        if self._environ_method == "HEAD":
+            headers.update({"Content-Length": 0})
+            data = bytes()
+
+        return headers, data
+
     def done(self):
         """
         Form a complete HTTP Response package:
@@ -105,19 +274,7 @@ class Response:
         if environ.method is HEAD - the {body} part
         will not be addin.
         """
+        headers, data = self.payload()
         baseline = self._make_baseline()
-        headers = {
-            "Server": settings.SERVER_NAME,
-            "Content-Type": self._content_type,
-            "Content-Length": len(self.data)}
-
-        if self._extra_hedaers:
-            headers.update(self._extra_hedaers)
-
-        if self._environ_method == "HEAD":
-            headers.update({"Content-Length": 0})
-
-        response = baseline + self.header_maker(headers)
-        if not self._environ_method == "HEAD":
-            response += "\r\n" + self.data
-        return response.encode()
+        response = (baseline + self.header_maker(headers) + "\r\n").encode()
+        return response + data
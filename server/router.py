@@ -4,6 +4,7 @@ It will record path with handler function as registry.
 Using for class Application.
 """
 
+from . import utils
 from . import errors
 
 
@@ -29,11 +30,17 @@ class Router:
                            ("/calendar", "POST"): <function>,
                            ...
                        }
+        self._options: Registry from tuple to route options,
+                       the key is same as self._url_map.
+                       e.g. self._options = {
+                           ("/calendar", "GET"): {"ratelimit": <RateLimiter>}
+                       }
         """
         self._path_methods = dict()
         self._url_map = dict()
+        self._options = dict()
 
-    def add_record(self, path, methods, function):
+    def add_record(self, path, methods, function, options=None):
         """
         Add one record to url_map
 
@@ -41,12 +48,28 @@ class Router:
             path: str - Request path
             methods: Iterable[str] - Methods bound with path
             function: Callable[[Request], str] - Handler
+            options: Optional[dict] - Extra options of route
         """
         for method in methods:
             if not path in self._path_methods.keys():
                 self._path_methods[path] = set()
             self._path_methods[path].add(method)
             self._url_map[(path, method)] = function
+            self._options[(path, method)] = utils.DynamicDict(options or {})
+
+    def __contains__(self, path):
+        """Whether path is registered"""
+        return path in self._path_methods
+
+    def options(self, path, method):
+        """
+        Get options of one record,
+        return an empty dict when record not exists.
+
+        Usage:
+            options(path: str, method: str) -> DynamicDict
+        """
+        return self._options.get((path, method), utils.DynamicDict())
 
     def match(self, path, method):
         """
@@ -0,0 +1,38 @@
+"""
+Selector backends
+
+The default selector of platform is level-triggered, on
+Linux an edge-triggered epoll selector could be used, so
+a socket is reported once when it becomes ready instead
+of in every loop until it is drained.
+"""
+
+import select
+import selectors
+
+
+if hasattr(select, "epoll"):
+
+    class EdgeTriggeredSelector(selectors.EpollSelector):
+        """
+        Epoll selector registering sockets with EPOLLET.
+
+        Handlers must drain sockets until EAGAIN (or give them
+        to workers which re-register them when done), since
+        data left in a socket is not reported again.
+        """
+        _EVENT_READ = select.EPOLLIN | select.EPOLLET
+        _EVENT_WRITE = select.EPOLLOUT | select.EPOLLET
+
+else:
+    EdgeTriggeredSelector = None
+
+
+def make_selector(edge_triggered: bool = False) -> selectors.BaseSelector:
+    """
+    Make selector for server loop, edge-triggered epoll
+    falls back to default selector where not available.
+    """
+    if edge_triggered and EdgeTriggeredSelector is not None:
+        return EdgeTriggeredSelector()
+    return selectors.DefaultSelector()
@@ -9,16 +9,36 @@ handle requestswhen new connection requests come.
 
 import os
 import sys
+import time
+import ssl
 import socket
+import threading
 import selectors
+import collections
 
+from concurrent.futures import Future
+
+from typing import List
+from typing import Union
 from typing import NoReturn
 from typing import Tuple
 from typing import Optional
 
+from . import http2
+from . import events
+from . import executor
+from . import websocket
+from . import buffers
+from . import listeners
 from . import errors
 from . import settings
 from .utils import thread
+from .channel import Channel
+from .capture import Capture
+from .deadline import Task
+from .deadline import timers
+from .selector import make_selector
+from .connection import Connection
 from .request import Request
 from .response import Response
 from .application import Application
@@ -40,35 +60,103 @@ class HTTPServer:
     READABLE = selectors.EVENT_READ
     WRITEABLE = selectors.EVENT_WRITE
 
-    def __init__(self, address: Tuple[str, int],
-                 maxsize: Optional[int] = settings.DEFAULT_WATTING_QSIZE):
+    # Latency smoothing factor
+    LATENCY_WEIGHT = 0.2
+
+    # Seconds for latency estimate to halve without new samples
+    LATENCY_HALF_LIFE = 1.0
+
+    def __init__(self, address: Union[Tuple[str, int], str, socket.socket],
+                 maxsize: Optional[int] = settings.DEFAULT_WATTING_QSIZE,
+                 max_inflight: Optional[int] = settings.MAX_INFLIGHT_REQUESTS,
+                 max_latency: Optional[float] = settings.SHED_QUEUE_LATENCY,
+                 pipeline: Optional[int] = settings.MAX_PIPELINE_DEPTH,
+                 ssl_context: Optional[ssl.SSLContext] = None,
+                 backlog: Optional[int] = settings.LISTEN_BACKLOG,
+                 accept_batch: Optional[int] = settings.ACCEPT_BATCH_SIZE,
+                 edge_triggered: Optional[bool] = settings.EDGE_TRIGGERED,
+                 capture: Optional[Capture] = None):
         """
         Instantiate a new server object,
         initialize a socket and bind the
         given address and port to listen for link requests;
 
         Parameters:
-            address: Tuple[addr: str, port: int] - address to be bound
+            address: Tuple[addr: str, port: int] | str | socket.socket -
+                     address to be bound, path of Unix domain socket,
+                     or listening socket inherited (see listeners.inherited)
             maxsize: int - maximum pending connection queue length
+            max_inflight: int - maximum requests processing at same time
+            max_latency: float - maximum average seconds a request
+                         waiting for a worker before being served
+            pipeline: int - maximum pipelined requests answered
+                      in one write to connection
+            ssl_context: ssl.SSLContext - serve HTTPS with the context,
+                         see tls.make_context
+            backlog: int - backlog of listening socket,
+                     maxsize is used when not given
+            accept_batch: int - maximum connections accepted
+                          in one loop iteration
+            edge_triggered: bool - use edge-triggered epoll on Linux
+            capture: Capture - record sampled requests for replay,
+                     see capture.Capture
         Usage Example:
             HTTPServer(("localhost", 80), 128)
+            HTTPServer("/run/flaks.sock")
         """
         # Initialize socket connection
-        self._maxsize = maxsize
-        self._listener = listener = socket.socket(self.IPV4, self.STREAM)
-        listener.bind(address)
-        listener.setsockopt(self.TCP_IP, self.NO_DELAY, True)
-        listener.setsockopt(self.SOCKET, self.REUSE_ADDR, True)
-        listener.setsockopt(self.SOCKET, self.KEEP_ALIVE, True)
-        listener.setblocking(False)
+        self._backlog = backlog or maxsize
+        self._accept_batch = accept_batch
+        if isinstance(address, socket.socket):
+            self._listener = address
+            self._socket_path = None
+        else:
+            self._listener = listeners.bind(address)
+            self._socket_path = listeners.path(self._listener)
+        listeners.configure(self._listener)
 
         # Bind selector to connection
-        self._poll = selectors.DefaultSelector()
+        self._poll = make_selector(edge_triggered)
+
+        # Callbacks scheduled to run in the loop by workers,
+        # and socket pair used to wake the loop up for them
+        self._callbacks = collections.deque()
+        self._waker, self._wakeup = socket.socketpair()
+        self._waker.setblocking(False)
+        self._wakeup.setblocking(False)
+
+        # Whether loop is woken up already, callbacks scheduled
+        # before it runs them need not write to socket pair again,
+        # flag is tested and changed under its lock only
+        self._woken = False
+        self._wake_lock = threading.Lock()
+
+        # Load shedding status - pre-serialised response
+        # sent without parsing any request when overloaded
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._latency = 0.0
+        self._sampled = time.monotonic()
+        self._max_inflight = max_inflight
+        self._max_latency = max_latency
+        retry = {"Retry-After": settings.SHED_RETRY_AFTER,
+                 "Connection": "close"}
+        self._shed_response = Response(503, headers=retry).done()
+
+        # Max responses buffered for pipelined requests
+        self._pipeline = pipeline
+
+        # Traffic capture
+        self._capture = capture
+
+        # TLS termination, with sockets in handshake and
+        # their accept time, oldest first
+        self._ssl_context = ssl_context
+        self._handshakes = dict()
 
-        # Get server enviroment infomations
-        host, port = listener.getsockname()[:2]
-        self._server_name = socket.getfqdn(host)
-        self._server_port = port
+        # Server name is looked up at first use,
+        # getfqdn could wait for a slow DNS query
+        self._server_name = None
 
         # Set appliction
         self._appplication: Application = None
@@ -83,63 +171,193 @@ class HTTPServer:
         """
         return self._running
 
+    @property
+    def address(self) -> str:
+        """
+        Return address server listens on, like
+        "0.0.0.0:80" or "unix:/run/flaks.sock".
+        """
+        return listeners.describe(self._listener.getsockname())
+
+    @property
+    def server_name(self) -> str:
+        """
+        Return fully qualified domain name of server.
+        """
+        if self._server_name is None:
+            host = listeners.host(self._listener.getsockname())
+            self._server_name = socket.getfqdn(host)
+        return self._server_name
+
     def log(self, client: Tuple[str, int],
             request: Request, response: Response) -> NoReturn:
         """
         Log request and response
 
         Parameters:
-            client: Tuple[str, int] - client informations
+            client: Tuple[str, int] | str - client address,
+                    str for Unix domain socket clients
             request: Request - request
             response: Response - response
         """
         print("{client} {url} - {method} > {code}".format(
-            client=client[0] + ':' + str(client[1]),
+            client=listeners.describe(client),
             url=request.url, method=request.method,
             code=response.code
         ))
 
-    def _handle(self, connection: socket.socket, client: Tuple[str, int],
-                max_request: Optional[int] = settings.MAX_REQUEST_SIZE) -> bytes:
+    def _handle(self, connection: Connection, client: Tuple[str, int],
+                max_request: Optional[int] = settings.MAX_REQUEST_SIZE) -> Union[Response, bytes]:
         """
         Takes a connection parameter so reads data.
         The parser is then used to parse the data 
         sent by the client, and the information obtained
         is passed to the application function for processing.
+        Request body is received in chunks and fed to request.
 
         Parameters:
-            connection: socket.socket - Active conenction 
+            connection: Connection - Active conenction 
             client: Tuple[str, int] - Client's address
-            max_request: int - Max request size for request
+            max_request: int - Max size of request head
+        Return the Response, or serialised error response,
+        return None when client closed the connection.
+        Connection switching to HTTP/2 gets connection.protocol
+        set to "h2", with the response to send before switching.
         """
         try:
-            rawdata = connection.recv(max_request).decode()
-            request = Request(rawdata)
+            rawdata = connection.read_head(max_request)
+            if rawdata is None:
+                return None
+
+            # HTTP/2 with prior knowledge, preface goes back to buffer
+            if rawdata == http2.PREFACE_HEAD:
+                connection.unread(rawdata)
+                connection.protocol = "h2"
+                return bytes()
+
+            request = Request(rawdata, self._appplication.json)
+            request.remote = client
+            request.scheme = connection.scheme
             request.parse()
+
+            # Sampled request is captured with its body
+            captured = None
+            if self._capture is not None and not request.deferred and \
+                    self._capture.sampled():
+                captured = [rawdata]
+                arrived = time.time()
+
+            request.reader = connection.read
+            while request.pending and not request.deferred:
+                chunk = connection.read(
+                    min(request.pending, settings.RECV_CHUNK_SIZE))
+                if not chunk:
+                    return None
+                if captured is not None:
+                    captured.append(chunk)
+                request.feed(chunk)
+        except errors.PayloadTooLarge as _error:
+            connection.closing = True
+            return Response(413, headers={"Connection": "close"}).done()
         except errors.Error as _error:
+            connection.closing = True
             return Response(501).done()
+        except OSError as _error:
+            return None
         except Exception as _error:
+            connection.closing = True
             return str().encode()
 
+        # Client asked to close connection after response
+        if not request.keep_alive:
+            connection.closing = True
+
+        # Switch to HTTP/2 before answering the request
+        if request.headers.get("Upgrade", '').lower() == "h2c" and \
+                "HTTP2-Settings" in request.headers and request.scheme == "http":
+            connection.protocol = "h2"
+            connection.upgraded = request
+            connection.closing = False
+            return http2.SWITCHING_PROTOCOLS
+
+        # Switch to WebSocket when path is an endpoint of it
+        if request.headers.get("Upgrade", '').lower() == "websocket" and \
+                self._appplication is not None:
+            endpoint = self._appplication.endpoint(request.path)
+            if endpoint is not None:
+                return self._upgrade_websocket(connection, request, endpoint)
+
+        response = self.respond(request)
+        if captured is not None:
+            self._capture.record(arrived, b''.join(captured), response)
+
+        # Event stream ends when connection closed
+        if isinstance(response, events.EventStream):
+            connection.closing = True
+
+        # Handler did not read whole deferred body
+        if request.pending:
+            connection.closing = True
+        return response
+
+    def _upgrade_websocket(self, connection: Connection, request: Request,
+                           endpoint: websocket.Endpoint) -> Union[Response, bytes]:
+        """
+        Answer WebSocket opening handshake, connection
+        gets protocol set to "websocket" when accepted.
+        """
+        response = endpoint.handshake(request)
+        if isinstance(response, Response):
+            connection.closing = True
+            return self._bind(request, response)
+
+        connection.protocol = "websocket"
+        connection.upgraded = request
+        connection.closing = False
+        return response
+
+    def respond(self, request: Request) -> Union[Response, Future]:
+        """
+        Get response of a parsed request from application,
+        bound to the request and logged. Return future of
+        the response when view runs in an executor.
+        """
         # When there is not application registerd
         if not self._appplication:
-            response = Response(404)
-            self.log(client, request, response)
-            return response.done()
+            return self._bind(request, Response(404))
 
         # Get response from application
         try:
             response = self._appplication.respond(request)
-            if isinstance(response, str):
-                response = Response(200, response)
-            if isinstance(response, tuple):
-                response = Response(*response)
         except errors.ApplicationError as _error:
             print(_error)
             response = Response(502)
 
-        self.log(client, request, response)
-        return response.done()
+        # Run by worker serving the request, resolved with Response
+        if isinstance(response, Task):
+            response.add_done_callback(
+                lambda done: self._bind(request, done.result()))
+            return response
+        if isinstance(response, Future):
+            bound = Future()
+            response.add_done_callback(
+                lambda done: bound.set_result(self._bind(request, done.result())))
+            return bound
+        return self._bind(request, response)
+
+    def _bind(self, request: Request, response) -> Response:
+        """
+        Make Response from what application returned,
+        bind it to request and log.
+        """
+        if isinstance(response, str):
+            response = Response(200, response)
+        if isinstance(response, tuple):
+            response = Response(*response)
+
+        response.bind(request)
+        self.log(request.remote, request, response)
+        return response
 
     def serve(self, application: Application) -> NoReturn:
         """
@@ -149,32 +367,482 @@ class HTTPServer:
         """
         self._appplication = application
 
+    @property
+    def application(self) -> Application:
+        """
+        Return application served.
+        """
+        return self._appplication
+
+    @property
+    def inflight(self) -> int:
+        """
+        Return number of requests processing now.
+        """
+        return self._inflight
+
+    def _schedule(self, callback, *args) -> NoReturn:
+        """
+        Run callback in the loop thread as soon as possible,
+        it is the only safe way for workers to touch the poll.
+        """
+        self._callbacks.append((callback, args))
+        with self._wake_lock:
+            if self._woken:
+                return
+            self._woken = True
+            try:
+                self._waker.send(b'\0')
+            except (BlockingIOError, OSError) as _error:
+                pass
+
+    def _sock_wakeup(self, fileobj: socket.socket, mask: int) -> NoReturn:
+        """
+        Drain the wakeup socket and run scheduled callbacks.
+        """
+        try:
+            while fileobj.recv(4096):
+                pass
+        except (BlockingIOError, OSError) as _error:
+            pass
+
+        # Cleared only after draining, a worker scheduling meanwhile
+        # saw the flag set and its callback is run below
+        with self._wake_lock:
+            self._woken = False
+
+        # Callbacks scheduled by these ones run in next iteration,
+        # so other events are not starved
+        callbacks = self._callbacks
+        for _ in range(len(callbacks)):
+            callback, args = callbacks.popleft()
+            callback(*args)
+
+    def _register(self, connection: Connection) -> NoReturn:
+        """
+        Watch connection for next request,
+        its buffer goes back to pool while idle.
+        """
+        if connection.fileno() == -1:
+            return
+        connection.release()
+        self._poll.register(connection, self.READABLE, self._sock_dispatch)
+
+    def _overloaded(self) -> bool:
+        """
+        Server is overloaded when too many requests in flight,
+        or requests waiting too long before workers pick them up.
+        """
+        if self._inflight >= self._max_inflight:
+            return True
+        return bool(self._inflight) and \
+            self._estimate(time.monotonic()) > self._max_latency
+
+    def _estimate(self, now: float) -> float:
+        """
+        Average queue latency decayed by time since last sample,
+        shed requests give no sample, so the estimate falls and
+        requests are admitted again to measure it.
+        """
+        elapsed = now - self._sampled
+        if elapsed <= 0:
+            return self._latency
+        return self._latency * 0.5 ** (elapsed / self.LATENCY_HALF_LIFE)
+
+    def _shed(self, connection: Connection) -> NoReturn:
+        """
+        Send pre-serialised HTTP-503 and close the connection.
+        """
+        try:
+            connection.socket.send(self._shed_response)
+        except OSError as _error:
+            pass
+        connection.close()
+
+    def _sock_dispatch(self, connection: Connection, mask: int) -> NoReturn:
+        """
+        Connection became readable - stop watching it while
+        a worker is serving it, or shed it when overloaded.
+        """
+        self._poll.unregister(connection)
+        if self._overloaded():
+            self._shed(connection)
+            return
+
+        with self._lock:
+            self._inflight += 1
+        self._sock_service(connection, time.monotonic())
+
+    def _write(self, connection: Connection,
+               responses: List[Union[Response, bytes]]) -> NoReturn:
+        """
+        Write responses to connection in as few sends as possible,
+        bodies of file responses are sent with sendfile.
+        """
+        chunks = list()
+        for response in responses:
+            if isinstance(response, bytes):
+                chunks.append(response)
+                continue
+
+            chunks.append(response.done())
+            if response.sendfile:
+                connection.sendall(b''.join(chunks))
+                chunks.clear()
+                connection.sendfile(response.file, response.size)
+            if response.stream is not None:
+                connection.sendall(b''.join(chunks))
+                chunks.clear()
+                self._write_stream(connection, response)
+
+        if chunks:
+            connection.sendall(b''.join(chunks))
+
+    def _write_stream(self, connection: Connection, response: Response) -> NoReturn:
+        """
+        Send chunks of streamed response as they are produced,
+        the stream is released even if client went away.
+        """
+        try:
+            if not response.streaming:
+                return
+            chunked = response.chunked
+            for chunk in response.stream:
+                if not chunk:
+                    continue
+                if chunked:
+                    chunk = b"%x\r\n%b\r\n" % (len(chunk), chunk)
+                connection.sendall(chunk)
+            if chunked:
+                connection.sendall(b"0\r\n\r\n")
+        finally:
+            response.close()
+
+    @thread
+    def _sock_service(self, connection: Connection, queued: float) -> NoReturn:
+        """
+        Serve requests from connection in worker thread,
+        then give the connection back to the loop.
+
+        Pipelined requests already in buffer are answered in
+        order, their responses are written in batches of at
+        most self._pipeline responses.
+
+        Parameters:
+            connection: Connection - Readable connection
+            queued: float - Monotonic time when request dispatched
+        """
+        now = time.monotonic()
+        latency = now - queued
+        with self._lock:
+            estimate = self._estimate(now)
+            self._latency = estimate + (latency - estimate) * self.LATENCY_WEIGHT
+            self._sampled = now
+
+        waiting = subscribed = None
+        try:
+            closed = upgrade = connection.protocol == "h2"
+            while not closed:
+                responses = list()
+                while True:
+                    response = self._handle(connection, connection.client)
+                    if response is None or connection.closing:
+                        closed = True
+                    if connection.protocol in ("h2", "websocket"):
+                        closed = upgrade = True
+                    if isinstance(response, Task):
+                        response = self._run_task(connection, closed, response, responses)
+                        if response is None:
+                            # Handed off, counted out when answered
+                            waiting = True
+                            return
+                        if isinstance(response, events.EventStream):
+                            connection.closing = closed = True
+                    if isinstance(response, Future):
+                        waiting = response
+                        break
+                    if isinstance(response, events.EventStream) and response.live:
+                        subscribed = response
+                    if response:
+                        responses.append(response)
+                    if closed or not connection.pipelined:
+                        break
+                    if len(responses) >= self._pipeline:
+                        break
+
+                if responses:
+                    self._write(connection, responses)
+                if waiting is not None:
+                    break
+                if not closed and not connection.pipelined:
+                    break
+
+            # View runs in executor, connection is served
+            # again when it is done without holding worker
+            if waiting is not None:
+                waiting.add_done_callback(
+                    lambda done: self._sock_complete(connection, closed, done))
+                return
+            if subscribed is not None:
+                self._schedule(self._sock_subscribe, connection, subscribed)
+                return
+            if upgrade and connection.protocol == "websocket":
+                self._schedule(self._sock_websocket, connection)
+                return
+            if upgrade:
+                self._sock_http2(connection)
+                return
+            if closed:
+                connection.close()
+                return
+            self._schedule(self._register, connection)
+        except (ConnectionError, OSError) as _error:
+            connection.close()
+        finally:
+            if waiting is None:
+                with self._lock:
+                    self._inflight -= 1
+
+    def _run_task(self, connection: Connection, closed: bool, task: Task,
+                  responses: List[Union[Response, bytes]]) -> Optional[Response]:
+        """
+        Run view of task in worker, after responses of earlier
+        pipelined requests written. Return its response, or None
+        when deadline passed first: the connection is then
+        answered by timer and must not be touched by worker.
+        """
+        if responses:
+            self._write(connection, responses)
+            responses.clear()
+        if task.run(lambda: self._sock_complete(connection, closed, task)):
+            return task.result()
+        return None
+
     @thread
-    def _sock_service(self, connection: socket.socket, mask: int) -> NoReturn:
+    def _sock_complete(self, connection: Connection,
+                       closed: bool, future: Future) -> NoReturn:
         """
-        Detect event type and make some actions on it.
+        Write response of view run in executor, then continue
+        with pipelined requests or give connection back to loop.
 
+        Parameters:
+            connection: Connection - Connection waiting for response
+            closed: bool - Connection should be closed after response
+            future: Future - Future of the response
         """
-        client = connection.getpeername()
-        response = self._handle(connection, client)
         try:
-            connection.sendall(response)
-        except ConnectionError as _error:
+            response = future.result()
+            self._write(connection, [response])
+            if isinstance(response, events.EventStream):
+                if response.live:
+                    self._schedule(self._sock_subscribe, connection, response)
+                else:
+                    connection.close()
+                return
+            if closed:
+                connection.close()
+                return
+            if connection.pipelined:
+                with self._lock:
+                    self._inflight += 1
+                self._sock_service(connection, time.monotonic())
+                return
+            self._schedule(self._register, connection)
+        except (ConnectionError, OSError) as _error:
             connection.close()
-            self._poll.unregister(connection)
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def _sock_http2(self, connection: Connection) -> NoReturn:
+        """
+        Serve HTTP/2 connection until it is closed, streams
+        are answered by their own workers. The connection
+        is not counted as in flight while idle.
+        """
+        with self._lock:
+            self._inflight -= 1
+        try:
+            http2.HTTP2Connection(self, connection).serve()
+        finally:
+            with self._lock:
+                self._inflight += 1
+
+    def _sock_websocket(self, connection: Connection) -> NoReturn:
+        """
+        Serve upgraded WebSocket connection in loop,
+        frames sent with the handshake are handled at once.
+        """
+        endpoint = self._appplication.endpoint(connection.upgraded.path)
+        ws = websocket.WebSocket(connection, endpoint, self._channel_notify)
+        ws.open()
+        self._sock_channel(ws, 0)
+
+    def _sock_subscribe(self, connection: Connection,
+                        stream: events.EventStream) -> NoReturn:
+        """
+        Serve event stream connection in loop as subscriber
+        of topic, after its response headers sent.
+        """
+        subscriber = events.Subscriber(connection, stream.topic, self._channel_notify)
+        stream.topic.attach(subscriber, stream.position)
+        self._sock_channel(subscriber, 0)
+
+    def _channel_notify(self, channel: Channel) -> NoReturn:
+        """
+        Handle channel in loop again, called from any thread
+        when data queued or reading could be resumed.
+        """
+        self._schedule(self._sock_channel, channel, 0)
+
+    def _sock_channel(self, channel: Channel, mask: int) -> NoReturn:
+        """
+        Read and write data of channel, then watch for
+        the events it waits for, release it when finished.
+        Idle channel is only watched, no worker holds it.
+        """
+        if channel.released:
+            return
+        channel.handle(mask)
+
+        wanted = 0 if channel.finished else channel.events
+        if wanted != channel.watching:
+            if not channel.watching:
+                self._poll.register(channel, wanted, self._sock_channel)
+            elif not wanted:
+                self._poll.unregister(channel)
+            else:
+                self._poll.modify(channel, wanted, self._sock_channel)
+            channel.watching = wanted
+
+        if channel.finished:
+            channel.release()
 
     def _sock_accpet(self, fileobj: socket.socket, mask: int) -> NoReturn:
         """
-        Accept a new connection request.
-        Set COnnection to non-blocking.
+        Accept new connection requests until backlog drained,
+        at most self._accept_batch of them in one iteration,
+        the rest are accepted after other events handled.
+        Wrap them as Connection with timeout.
         Register in select poll.
         """
-        connection, _address = fileobj.accept()
-        connection.setblocking(False)
-        events = self.READABLE
+        for _ in range(self._accept_batch):
+            try:
+                connection, address = fileobj.accept()
+            except (BlockingIOError, InterruptedError) as _error:
+                return
+            except OSError as _error:
+                # Out of file descriptors: stop watching listener,
+                # which would be reported ready in every iteration,
+                # or never again when edge-triggered, and accept
+                # again after a while when connections may be closed
+                try:
+                    self._poll.unregister(fileobj)
+                except KeyError as _error:
+                    # Failed already, accepting again is scheduled
+                    return
+                timers.call_at(time.monotonic() + settings.ACCEPT_RETRY_DELAY,
+                               lambda: self._schedule(self._resume_accept, fileobj))
+                return
+            self._sock_accept_one(connection, address)
+
+        # Backlog may not be drained - edge-triggered
+        # selector will not report the listener again
+        self._schedule(self._sock_accpet, fileobj, mask)
+
+    def _resume_accept(self, fileobj: socket.socket) -> NoReturn:
+        """
+        Watch listener again after accept failed,
+        and accept connections waiting in backlog.
+        """
+        if not self._running:
+            return
+        self._poll.register(fileobj, self.READABLE, self._sock_accpet)
+        self._sock_accpet(fileobj, self.READABLE)
+
+    def _sock_accept_one(self, connection: socket.socket,
+                         address: Tuple[str, int]) -> NoReturn:
+        """
+        Register one accepted connection, or start TLS handshake.
+        """
+        # Handshake in loop before serving HTTPS
+        if self._ssl_context:
+            connection.setblocking(False)
+            tls = self._ssl_context.wrap_socket(
+                connection, server_side=True, do_handshake_on_connect=False)
+            self._poll.register(tls, self.READABLE, self._sock_handshake)
+            self._handshakes[tls] = (address, time.monotonic())
+            return
+
+        connection = Connection(connection, address)
 
         # Register new connection to poll
-        self._poll.register(connection, events, self._sock_service)
+        self._register(connection)
+
+    def _sock_handshake(self, tls: ssl.SSLSocket, mask: int) -> NoReturn:
+        """
+        Continue non-blocking TLS handshake, wait for the
+        event OpenSSL asks for, serve connection when done.
+        """
+        try:
+            tls.do_handshake()
+        except ssl.SSLWantReadError as _error:
+            self._poll.modify(tls, self.READABLE, self._sock_handshake)
+            return
+        except ssl.SSLWantWriteError as _error:
+            self._poll.modify(tls, self.WRITEABLE, self._sock_handshake)
+            return
+        except (ssl.SSLError, OSError) as _error:
+            self._poll.unregister(tls)
+            self._handshakes.pop(tls, None)
+            tls.close()
+            return
+
+        self._poll.unregister(tls)
+        address, _accepted = self._handshakes.pop(tls, (None, None))
+        connection = Connection(tls, address)
+        self._register(connection)
+
+        # Request already decrypted during handshake
+        if tls.pending():
+            self._sock_dispatch(connection, self.READABLE)
+
+    def _expire_handshakes(self) -> Optional[float]:
+        """
+        Close TLS handshakes not done in CONNECTION_TIMEOUT
+        seconds since accepted, so clients which never finish
+        them hold no descriptor. Return seconds before the
+        oldest one left expires, None when there is none.
+        """
+        now = time.monotonic()
+        while self._handshakes:
+            tls = next(iter(self._handshakes))
+            remaining = self._handshakes[tls][1] + settings.CONNECTION_TIMEOUT - now
+            if remaining > 0:
+                return remaining
+            del self._handshakes[tls]
+            try:
+                self._poll.unregister(tls)
+            except (KeyError, ValueError) as _error:
+                pass
+            tls.close()
+        return None
+
+    def tls_stats(self) -> dict:
+        """
+        Return TLS session cache statistics,
+        "hits" are handshakes resumed from a session.
+        """
+        if not self._ssl_context:
+            return dict()
+        return self._ssl_context.session_stats()
+
+    def buffer_stats(self) -> dict:
+        """
+        Return receive buffer pool statistics, "hits" are
+        buffers reused, "misses" are buffers allocated.
+        """
+        return buffers.pool.stats()
 
     def start(self) -> NoReturn:
         """
@@ -182,16 +850,20 @@ class HTTPServer:
         The connection information is passed to the
         handle function to generate a response.
         """
-        # Start server
+        # Start server, process pool forked before any worker
+        executor.start()
         self._running = True
         listener = self._listener
-        listener.listen(self._maxsize)
+        listener.listen(self._backlog)
         self._poll.register(listener, self.READABLE, self._sock_accpet)
+        self._poll.register(self._wakeup, self.READABLE, self._sock_wakeup)
 
+        timeout = None
         while self._running:
-            events = self._poll.select()
+            events = self._poll.select(timeout)
             for handler, mask in events:
                 handler.data(handler.fileobj, mask)
+            timeout = self._expire_handshakes() if self._handshakes else None
 
     def stop(self) -> NoReturn:
         """
@@ -199,3 +871,11 @@ class HTTPServer:
         which will cause the main loop running on start stop
         """
         self._running = False
+        self._schedule(lambda: None)
+        if self._socket_path is not None:
+            try:
+                os.unlink(self._socket_path)
+            except OSError as _error:
+                pass
+        if self._capture is not None:
+            self._capture.close()
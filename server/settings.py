@@ -9,8 +9,36 @@ SERVER_NAME = "Simple-HTTP-Server(Frask-v0.0.1)"
 # Default response content-type
 DEFAULT_RESPONSE_CONTENT_TYPE = "text/html"
 
-# Max request size for request
-MAX_REQUEST_SIZE = 1024
+# JSON backends in order of preference, the first
+# installed one is used, "json" is always available
+JSON_BACKENDS = ("orjson", "ujson", "json")
+
+# Max size of request line with headers
+MAX_REQUEST_SIZE = 8192
+
+# Max size of request body buffered in memory
+MAX_BODY_SIZE = 1024 * 1024
+
+# Size of each read from connection
+RECV_CHUNK_SIZE = 64 * 1024
+
+# Sizes of pooled receive buffers of connections
+BUFFER_SIZES = (16 * 1024, 64 * 1024)
+
+# Free receive buffers kept of each size
+BUFFER_POOL_SIZE = 256
+
+# Seconds a worker waits for client data before giving up
+CONNECTION_TIMEOUT = 30
+
+# Uploaded file kept in memory until it grows beyond this size
+MULTIPART_SPOOL_SIZE = 1024 * 1024
+
+# Max size of one part in multipart/form-data body
+MULTIPART_PART_LIMIT = 512 * 1024 * 1024
+
+# Max size of the whole multipart/form-data body
+MULTIPART_TOTAL_LIMIT = 1024 * 1024 * 1024
 
 # CGI Execution Timeout(s)
 CGI_TIMEOUT = 5
@@ -18,9 +46,129 @@ CGI_TIMEOUT = 5
 # CGI Execution catalogue
 CGI_CATALOGUE = "./cgi-bin"
 
+# ALPN protocols offered over TLS
+TLS_ALPN_PROTOCOLS = ("h2", "http/1.1")
+
+# TLS 1.3 session tickets sent for resumption
+TLS_SESSION_TICKETS = 2
+
+# Static files larger than this are sent with sendfile
+SENDFILE_THRESHOLD = 64 * 1024
+
+# Max connections to each proxied upstream server
+PROXY_POOL_SIZE = 32
+
+# Seconds waiting for upstream connecting and answering
+PROXY_TIMEOUT = 10
+
+# Times retrying idempotent requests on other upstreams
+PROXY_RETRIES = 2
+
+# Consecutive failures before upstream marked as down
+PROXY_MAX_FAILS = 3
+
+# Seconds an upstream marked down is not selected
+PROXY_DOWN_INTERVAL = 10
+
+# Headers telling coalesced requests apart, besides method, path and query
+COALESCE_HEADERS = ("Accept", "Accept-Encoding", "Accept-Language",
+                    "Authorization", "Cookie")
+
+# Seconds a view could run before client answered with HTTP-504, no deadline when None
+VIEW_DEADLINE = 30
+
+# Fraction of requests captured when traffic capture enabled
+CAPTURE_SAMPLE_RATE = 1.0
+
+# Size of capture file when capturing stops
+CAPTURE_MAX_BYTES = 256 * 1024 * 1024
+
+# Max size of one request captured, head and body
+CAPTURE_MAX_REQUEST = 1024 * 1024
+
+# Template directory, relative to working directory
+TEMPLATE_CATALOGUE = "./templates"
+
+# Seconds between checks of template files changed
+TEMPLATE_RELOAD_INTERVAL = 1
+
+# Rendered template fragments cached
+TEMPLATE_FRAGMENT_CACHE_SIZE = 1024
+
+# Min size of chunks of streamed template
+TEMPLATE_CHUNK_SIZE = 16 * 1024
+
+# Cache entries of shared memory store
+SHARED_SLOTS = 4096
+
+# Bytes of one shared cache entry, key and value included
+SHARED_SLOT_SIZE = 8 * 1024
+
+# Counters of shared memory store
+SHARED_COUNTERS = 1024
+
+# Locks shared by writers of shared memory store
+SHARED_STRIPES = 64
+
+# Threads of shared pool running views with blocking IO
+EXECUTOR_THREADS = 32
+
+# Processes of shared pool running CPU-bound views, CPU count when None
+EXECUTOR_PROCESSES = None
+
+# Fraction of requests profiled when profiler enabled
+PROFILE_SAMPLE_RATE = 0.01
+
+# Header carrying token to profile a request on demand
+PROFILE_HEADER = "X-Profile"
+
+# Admin path serving profiling reports
+PROFILE_ADMIN_PATH = "/_profile"
+
+# Functions listed for each route in profiling reports
+PROFILE_REPORT_TOP = 20
+
 # Max connection watting queue size
 DEFAULT_WATTING_QSIZE = 128
 
+# Backlog of listening socket, 0 or None to use DEFAULT_WATTING_QSIZE
+LISTEN_BACKLOG = 1024
+
+# Max connections accepted in one loop iteration
+ACCEPT_BATCH_SIZE = 64
+
+# Seconds before accepting again when accept failed (out of descriptors)
+ACCEPT_RETRY_DELAY = 0.1
+
+# Permission of Unix domain socket file server listens on, umask when None
+UNIX_SOCKET_MODE = None
+
+# Use edge-triggered epoll for server loop where available
+EDGE_TRIGGERED = False
+
+# Max requests processing at the same time,
+# new requests will be shed with HTTP-503 beyond it
+MAX_INFLIGHT_REQUESTS = 256
+
+# Max average delay(s) between request arrived and
+# worker started, new requests will be shed beyond it
+SHED_QUEUE_LATENCY = 0.5
+
+# Seconds suggested to client retry after being shed
+SHED_RETRY_AFTER = 1
+
+# Max pipelined responses buffered before writing to client
+MAX_PIPELINE_DEPTH = 16
+
+# Max client buckets kept by one rate limiter
+RATE_LIMIT_MAX_CLIENTS = 65536
+
+# Seconds before an idle client bucket evicted
+RATE_LIMIT_IDLE_TIMEOUT = 60
+
+# Seconds between static manifest rescans
+MANIFEST_RESCAN_INTERVAL = 5
+
 # Default access file when access a catalog
 DEFAULT_ACCESS_FILE = "index.html"
 
@@ -42,11 +190,42 @@ ERROR_RESPONSE_BODY = {
     403: "<html><body><h1>403 Forbidden</h1></body></html>",
     404: "<html><body><h1>404 Not Found</h1></body></html>",
     405: "<html><body><h1>405 Method Not Allowed</h1></body></html>",
+    406: "<html><body><h1>406 Not Acceptable</h1></body></html>",
     408: "<html><body><h1>408 Request Timeout</h1></body></html>",
+    413: "<html><body><h1>413 Payload Too Large</h1></body></html>",
+    429: "<html><body><h1>429 Too Many Requests</h1></body></html>",
     501: "<html><body><h1>501 Not Implemented</h1></body></html>",
     502: "<html><body><h1>502 Internal Server Error</h1></body></html>",
-    503: "<html><body><h1>503 Service Unavailable</h1></body></html>"
+    503: "<html><body><h1>503 Service Unavailable</h1></body></html>",
+    504: "<html><body><h1>504 Gateway Timeout</h1></body></html>"
 }
 
 # When code not specified return this as response body
 DEFAULT_RESPONSE = ""
+
+# Max size of one WebSocket message received
+WEBSOCKET_MAX_MESSAGE = 1024 * 1024
+
+# Bytes queued for a WebSocket client before reading from it pauses
+WEBSOCKET_HIGH_WATER_MARK = 1024 * 1024
+
+# Bytes queued for a WebSocket client before it is dropped as too slow
+WEBSOCKET_MAX_QUEUE = 16 * 1024 * 1024
+
+# Messages of each event stream topic kept for Last-Event-ID replay
+SSE_HISTORY = 1024
+
+# Bytes queued for an event stream subscriber before it is dropped
+SSE_MAX_QUEUE = 1024 * 1024
+
+# Milliseconds event stream client waits before reconnecting
+SSE_RETRY = 3000
+
+# Max HTTP/2 streams of one connection answered at same time
+H2_MAX_CONCURRENT_STREAMS = 100
+
+# HTTP/2 flow control window of each stream for request body
+H2_WINDOW_SIZE = 1024 * 1024
+
+# HTTP/2 flow control window of each connection for request body
+H2_CONNECTION_WINDOW_SIZE = 16 * 1024 * 1024
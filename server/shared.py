@@ -0,0 +1,392 @@
+"""
+Shared memory store
+
+Processes of one host serving the same application (several
+run.py started on a port with SO_REUSEPORT, or behind one proxy)
+attach a store by name, and share a response and key-value cache
+and counters of request metrics through it, without any service.
+
+The store is a file mapped into every process, in /dev/shm where
+it exists so it never reaches disk, laid out as:
+    header: magic, geometry
+    counters: hash, value, name of each, found by linear probing
+    slots: fixed-size cache entries, WAYS slots a set
+
+Reading a slot takes no lock, it is guarded by a version number
+odd while the slot is written (seqlock), and retried when the
+version changed under it. Writers lock the stripe of the slot,
+a thread lock of process and a byte-range lock of the file for
+other processes. When a set is full, the least recently used
+slot is evicted, as recorded by readers without locking.
+"""
+
+import os
+import mmap
+import stat
+import time
+import fcntl
+import struct
+import hashlib
+import tempfile
+import threading
+
+from typing import Dict
+from typing import Union
+from typing import Optional
+
+from . import errors
+from . import settings
+
+
+MAGIC = b"FLAKSHM\x01"
+HEADER = struct.Struct("<8sIIII")
+HEADER_SIZE = 64
+
+# Counter: hash, value, length of name, name
+COUNTER = struct.Struct("<QqB")
+COUNTER_SIZE = 64
+COUNTER_NAME = COUNTER_SIZE - COUNTER.size
+
+# Slot: version, value length, hash, expires, last used, key length
+SLOT = struct.Struct("<IIQddH6x")
+
+# Slots of one set, searched for a key
+WAYS = 8
+
+# Times a read is retried while slot being written, a miss after
+READ_RETRIES = 8
+
+# Byte of file locked while adding counters, stripes follow it
+INSERT_LOCK = 0
+
+
+def digest(key: bytes) -> int:
+    """Hash of key or counter name, never 0 which marks empty"""
+    value = int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+    return value or 1
+
+
+def _encode(key: Union[str, bytes]) -> bytes:
+    return key if isinstance(key, bytes) else key.encode()
+
+
+class SharedStore:
+    """
+    Cache and counters shared by processes of one host.
+
+    Every process opens the store with the same name and
+    geometry, the first one creates it. Values are bytes,
+    a value larger than a slot is not cached.
+
+    hits - cache reads found in this process
+    misses - cache reads not found in this process
+    """
+
+    def __init__(self, name: str, slots: Optional[int] = settings.SHARED_SLOTS,
+                 slot_size: Optional[int] = settings.SHARED_SLOT_SIZE,
+                 counters: Optional[int] = settings.SHARED_COUNTERS,
+                 stripes: Optional[int] = settings.SHARED_STRIPES):
+        """
+        Create store of name, or attach to it.
+
+        Parameters:
+            name: str - Name of store, or path of its file
+            slots: int - Cache entries, rounded up to sets of WAYS
+            slot_size: int - Bytes of an entry, key and value included
+            counters: int - Counters which could be created
+            stripes: int - Locks writers of slots and counters share
+        Usage Example:
+            store = SharedStore("flaks")
+            store.set("/report", data, ttl=10)
+            store.incr("requests")
+        """
+        if os.sep in name:
+            self.path = name
+        else:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            self.path = os.path.join(directory, "flaks-" + name)
+
+        self._sets = max(1, -(-slots // WAYS))
+        self.slots = self._sets * WAYS
+        self.slot_size = slot_size
+        self.capacity = slot_size - SLOT.size
+        self.counters_size = counters
+        self.stripes = stripes
+        if self.capacity <= 0 or counters <= 0 or stripes <= 0:
+            raise errors.SharedStoreError("Invalid geometry of shared store")
+
+        self._counters_offset = HEADER_SIZE
+        self._slots_offset = HEADER_SIZE + counters * COUNTER_SIZE
+        self.size = self._slots_offset + self.slots * slot_size
+
+        self._fd = self._open(self.path)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._insert = threading.Lock()
+        self._indexes: Dict[str, int] = dict()
+        self.hits = 0
+        self.misses = 0
+        try:
+            self._attach()
+        except BaseException as _error:
+            os.close(self._fd)
+            raise
+
+    @staticmethod
+    def _open(path: str) -> int:
+        """
+        Open file of store, created readable by this user only.
+        A file of another user, or others could write, is refused:
+        responses read from it are trusted by every process.
+        """
+        try:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_NOFOLLOW, 0o600)
+        except OSError as _error:
+            raise errors.SharedStoreError("Cannot open shared store: " + str(_error))
+        info = os.fstat(fd)
+        if not stat.S_ISREG(info.st_mode) or info.st_uid != os.geteuid() or \
+                info.st_mode & 0o077:
+            os.close(fd)
+            raise errors.SharedStoreError(
+                "Shared store not owned by this user, or open to others: " + path)
+        return fd
+
+    def _attach(self):
+        """Write header when store is new, check it otherwise, then map it"""
+        header = HEADER.pack(MAGIC, self.slots, self.slot_size,
+                             self.counters_size, self.stripes)
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, INSERT_LOCK)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, self.size)
+                os.pwrite(self._fd, header, 0)
+            elif os.pread(self._fd, HEADER.size, 0) != header or \
+                    os.fstat(self._fd).st_size != self.size:
+                raise errors.SharedStoreError(
+                    "Shared store of another layout: " + self.path)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, INSERT_LOCK)
+        self._map = mmap.mmap(self._fd, self.size)
+
+    def _lock(self, stripe: int):
+        self._locks[stripe].acquire()
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, INSERT_LOCK + 1 + stripe)
+
+    def _unlock(self, stripe: int):
+        fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, INSERT_LOCK + 1 + stripe)
+        self._locks[stripe].release()
+
+    # Counters
+
+    def _counter(self, name: str, create: bool) -> Optional[int]:
+        """
+        Offset of counter of name, created when create is set.
+        None when it does not exist, or table is full.
+        """
+        offset = self._indexes.get(name, None)
+        if offset is not None:
+            return offset
+
+        # Long names are kept cut, told apart by hash of whole name
+        encoded = name.encode()
+        hashed = digest(encoded)
+        encoded = encoded[:COUNTER_NAME]
+        if create:
+            self._insert.acquire()
+            fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, INSERT_LOCK)
+        try:
+            start = hashed % self.counters_size
+            for probe in range(self.counters_size):
+                offset = self._counters_offset + \
+                    (start + probe) % self.counters_size * COUNTER_SIZE
+                current, _value, length = COUNTER.unpack_from(self._map, offset)
+                if current == hashed and \
+                        self._map[offset + COUNTER.size:offset + COUNTER.size + length] == encoded:
+                    break
+                if current:
+                    continue
+                if not create:
+                    return None
+                # Name written before hash, which makes entry visible
+                self._map[offset + COUNTER.size:offset + COUNTER.size + len(encoded)] = encoded
+                COUNTER.pack_into(self._map, offset, 0, 0, len(encoded))
+                struct.pack_into("<Q", self._map, offset, hashed)
+                break
+            else:
+                print("Shared counters full, dropping " + name)
+                return None
+        finally:
+            if create:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, INSERT_LOCK)
+                self._insert.release()
+
+        self._indexes[name] = offset
+        return offset
+
+    def incr(self, name: str, amount: Optional[int] = 1) -> Optional[int]:
+        """
+        Add amount to counter of name, created at first use.
+        Return value after it, None when counters are full.
+        """
+        offset = self._counter(name, True)
+        if offset is None:
+            return None
+        stripe = offset // COUNTER_SIZE % self.stripes
+        self._lock(stripe)
+        try:
+            value = struct.unpack_from("<q", self._map, offset + 8)[0] + amount
+            struct.pack_into("<q", self._map, offset + 8, value)
+        finally:
+            self._unlock(stripe)
+        return value
+
+    def counter(self, name: str) -> int:
+        """Value of counter of name, 0 when never counted"""
+        offset = self._counter(name, False)
+        if offset is None:
+            return 0
+        return struct.unpack_from("<q", self._map, offset + 8)[0]
+
+    def counters(self) -> Dict[str, int]:
+        """Values of all counters by name"""
+        values = dict()
+        for index in range(self.counters_size):
+            offset = self._counters_offset + index * COUNTER_SIZE
+            hashed, value, length = COUNTER.unpack_from(self._map, offset)
+            if hashed:
+                name = self._map[offset + COUNTER.size:offset + COUNTER.size + length]
+                values[name.decode(errors="replace")] = value
+        return values
+
+    # Cache
+
+    def _set(self, hashed: int) -> int:
+        """Offset of first slot of set of hash"""
+        return self._slots_offset + hashed % self._sets * WAYS * self.slot_size
+
+    def _read(self, offset: int, hashed: int, key: bytes) -> Optional[bytes]:
+        """
+        Value of key in slot at offset, None when slot holds
+        another key, has expired, or kept being written.
+        """
+        for _ in range(READ_RETRIES):
+            version, length, current, expires, _used, size = \
+                SLOT.unpack_from(self._map, offset)
+            if current != hashed:
+                return None
+            if version & 1:
+                continue
+            start = offset + SLOT.size
+            found = self._map[start:start + size]
+            value = self._map[start + size:start + size + length]
+            if struct.unpack_from("<I", self._map, offset)[0] != version:
+                continue
+            if found != key or (expires and expires < time.time()):
+                return None
+            # Recorded without lock, eviction only needs it roughly
+            struct.pack_into("<d", self._map, offset + 24, time.time())
+            return value
+        return None
+
+    def get(self, key: Union[str, bytes]) -> Optional[bytes]:
+        """
+        Value cached of key, None when not cached.
+
+        Usage:
+            data = store.get("GET /report")
+        """
+        key = _encode(key)
+        hashed = digest(key)
+        offset = self._set(hashed)
+        for way in range(WAYS):
+            value = self._read(offset + way * self.slot_size, hashed, key)
+            if value is not None:
+                self.hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key: Union[str, bytes], value: bytes,
+            ttl: Optional[float] = None) -> bool:
+        """
+        Cache value of key for ttl seconds, until evicted when
+        ttl is None. Return whether value fits in a slot.
+        """
+        key = _encode(key)
+        if len(key) + len(value) > self.capacity:
+            return False
+        hashed = digest(key)
+        first = self._set(hashed)
+        stripe = hashed % self._sets % self.stripes
+        expires = time.time() + ttl if ttl else 0.0
+
+        self._lock(stripe)
+        try:
+            offset = self._victim(first, hashed, key)
+            version = struct.unpack_from("<I", self._map, offset)[0]
+            struct.pack_into("<I", self._map, offset, (version + 1) & 0xffffffff)
+            start = offset + SLOT.size
+            self._map[start:start + len(key) + len(value)] = key + value
+            SLOT.pack_into(self._map, offset, (version + 1) & 0xffffffff, len(value),
+                           hashed, expires, time.time(), len(key))
+            struct.pack_into("<I", self._map, offset, (version + 2) & 0xffffffff)
+        finally:
+            self._unlock(stripe)
+        return True
+
+    def _victim(self, first: int, hashed: int, key: bytes) -> int:
+        """
+        Offset of slot in set to write key in, with stripe locked:
+        the slot of key, an empty or expired one, or the least
+        recently used one.
+        """
+        now = time.time()
+        victim, oldest = first, None
+        for way in range(WAYS):
+            offset = first + way * self.slot_size
+            _version, _length, current, expires, used, size = \
+                SLOT.unpack_from(self._map, offset)
+            start = offset + SLOT.size
+            if current == hashed and self._map[start:start + size] == key:
+                return offset
+            if not current or (expires and expires < now):
+                used = -1.0
+            if oldest is None or used < oldest:
+                victim, oldest = offset, used
+        return victim
+
+    def delete(self, key: Union[str, bytes]) -> bool:
+        """Drop value of key, return whether it was cached"""
+        key = _encode(key)
+        hashed = digest(key)
+        first = self._set(hashed)
+        stripe = hashed % self._sets % self.stripes
+
+        self._lock(stripe)
+        try:
+            offset = self._victim(first, hashed, key)
+            _version, _length, current, _expires, _used, size = \
+                SLOT.unpack_from(self._map, offset)
+            start = offset + SLOT.size
+            if current != hashed or self._map[start:start + size] != key:
+                return False
+            version = struct.unpack_from("<I", self._map, offset)[0]
+            struct.pack_into("<I", self._map, offset, (version + 1) & 0xffffffff)
+            struct.pack_into("<Q", self._map, offset + 8, 0)
+            struct.pack_into("<I", self._map, offset, (version + 2) & 0xffffffff)
+        finally:
+            self._unlock(stripe)
+        return True
+
+    def close(self):
+        """Unmap store, it is kept for other processes"""
+        if self._fd is not None:
+            self._map.close()
+            os.close(self._fd)
+            self._fd = None
+
+    def unlink(self):
+        """Remove file of store, processes attached keep their mapping"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError as _error:
+            pass
@@ -0,0 +1,454 @@
+"""
+Templates
+
+Templates in the working directory are compiled once into Python
+functions: text between tags becomes constants, expressions are
+compiled with the template, and values are HTML-escaped unless
+marked safe. Pages are rendered as bytes, or streamed as byte
+chunks produced by a generator.
+Compiled templates are reloaded when their file changes.
+Templates run their expressions as Python code, they must
+be trusted like views.
+
+Syntax:
+    {{ expression }}            escaped value, "{{ value|safe }}" as it is
+    {% if expression %}         with {% elif expression %}, {% else %}, {% endif %}
+    {% for target in iterable %} ... {% endfor %}
+    {% set name = expression %}
+    {% include "name.html" %}   rendered with the same context
+    {% cache key ttl %}         fragment cached for ttl seconds by key (shared
+    ... {% endcache %}          by templates), e.g. {% cache "sidebar-" + user 60 %}
+    {# comment #}
+"""
+
+import os
+import re
+import ast
+import html
+import time
+import builtins
+import threading
+import collections
+
+from typing import Dict
+from typing import List
+from typing import Tuple
+from typing import Callable
+from typing import Iterator
+from typing import Optional
+
+from . import errors
+from . import settings
+
+
+# Tags of template, with what is between them
+TOKENS = re.compile(r"(\{\{.*?\}\}|\{%.*?%\}|\{#.*?#\})", re.DOTALL)
+
+# Names used by generated functions
+RESERVED = ("_write", "_context", "_escape", "_raw", "_cache", "_include", "_builtins")
+
+# Characters escaped for HTML
+SPECIAL = ('&', '<', '>', '"', "'")
+
+
+class Markup(str):
+    """String which is HTML already, not escaped"""
+    pass
+
+
+def safe(value) -> Markup:
+    """Mark value as HTML, not escaped when rendered"""
+    return Markup(value)
+
+
+def escape(value) -> str:
+    """
+    Escape value for HTML, None is rendered as nothing.
+    Strings without special characters and numbers are
+    returned without replacing.
+    """
+    kind = type(value)
+    if kind is str:
+        for char in SPECIAL:
+            if char in value:
+                return html.escape(value)
+        return value
+    if kind is int or kind is float:
+        return str(value)
+    if kind is Markup:
+        return value
+    if value is None:
+        return str()
+    if isinstance(value, bytes):
+        value = value.decode()
+    return html.escape(str(value))
+
+
+def raw(value) -> str:
+    """Value as it is, None is rendered as nothing"""
+    if value is None:
+        return str()
+    if isinstance(value, bytes):
+        return value.decode()
+    return str(value)
+
+
+class FragmentCache:
+    """
+    Rendered fragments by key, expired after their TTL,
+    least recently used are dropped beyond maxsize.
+    """
+
+    def __init__(self, maxsize: Optional[int] = settings.TEMPLATE_FRAGMENT_CACHE_SIZE):
+        self._maxsize = maxsize
+        self._fragments: Dict = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[bytes]:
+        """Get fragment of key, None when not cached or expired"""
+        with self._lock:
+            fragment = self._fragments.get(key, None)
+            if fragment is None or fragment[0] <= time.monotonic():
+                self.misses += 1
+                return None
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return fragment[1]
+
+    def set(self, key, value: bytes, ttl: float):
+        """Cache fragment for ttl seconds"""
+        with self._lock:
+            self._fragments[key] = (time.monotonic() + ttl, value)
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self._maxsize:
+                self._fragments.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop fragment of key, or all of them when None"""
+        with self._lock:
+            if key is None:
+                self._fragments.clear()
+            else:
+                self._fragments.pop(key, None)
+
+
+class _Compiler:
+    """
+    Generate source of render function from template: written
+    pieces are passed to _write, or yielded when generator is set.
+    """
+
+    def __init__(self, source: str, name: str, autoescape: bool,
+                 generator: bool = False):
+        self._source = source
+        self._name = name
+        self._autoescape = autoescape
+        self._generator = generator
+        self._lines: List[str] = list()
+        self._indent = 1
+        self._names = set()
+        self._line = 1
+
+        # Blocks open, and buffers of cache blocks output goes to
+        self._blocks: List[str] = list()
+        self._buffers: List[str] = list()
+        self._ttls: List[str] = list()
+        self._counter = 0
+
+    def _error(self, message: str) -> errors.TemplateError:
+        return errors.TemplateError("{name}:{line}: {message}".format(
+            name=self._name, line=self._line, message=message))
+
+    def _write(self, line: str):
+        self._lines.append("    " * self._indent + line)
+
+    def _emit(self, value: str):
+        """Output str value to current buffer, or write it"""
+        if self._buffers:
+            self._write(self._buffers[-1] + ".append(" + value + ')')
+        elif self._generator:
+            self._write("yield " + value)
+        else:
+            self._write("_write(" + value + ')')
+
+    def _expression(self, text: str, mode: str = "eval") -> str:
+        """Check expression, collect names it loads"""
+        text = text.strip()
+        try:
+            tree = ast.parse(text, mode=mode)
+        except SyntaxError as _error:
+            raise self._error("invalid expression " + repr(text))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Name):
+                if node.id.startswith('_'):
+                    raise self._error("names starting with _ are reserved")
+                self._names.add(node.id)
+        return text
+
+    def _open(self, block: str):
+        self._blocks.append(block)
+        self._indent += 1
+
+    def _close(self, block: str, keyword: str):
+        if not self._blocks or self._blocks[-1] != block:
+            raise self._error("unexpected " + keyword)
+        self._blocks.pop()
+        self._indent -= 1
+
+    def _tag(self, tag: str):
+        """Compile {% tag %}"""
+        keyword, _, rest = tag.strip().partition(' ')
+        rest = rest.strip()
+
+        if keyword == "if":
+            self._write("if " + self._expression(rest) + ':')
+            self._open("if")
+        elif keyword == "elif":
+            self._close("if", keyword)
+            self._write("elif " + self._expression(rest) + ':')
+            self._open("if")
+        elif keyword == "else":
+            self._close("if", keyword)
+            self._write("else:")
+            self._open("if")
+        elif keyword == "endif":
+            self._close("if", keyword)
+        elif keyword == "for":
+            self._expression("for " + rest + ": pass", "exec")
+            self._write("for " + rest + ':')
+            self._open("for")
+        elif keyword == "endfor":
+            self._close("for", keyword)
+        elif keyword == "set":
+            self._write(self._expression(rest, "exec"))
+        elif keyword == "include":
+            self._include(self._expression(rest))
+        elif keyword == "cache":
+            self._cache(rest)
+        elif keyword == "endcache":
+            self._endcache()
+        else:
+            raise self._error("unknown tag " + repr(keyword))
+
+    def _include(self, name: str):
+        """Output template included, rendered with same context"""
+        if self._buffers:
+            self._write("_include(%s, _context, %s.append)" % (name, self._buffers[-1]))
+        elif self._generator:
+            self._write("yield from _include(%s, _context)" % name)
+        else:
+            self._write("_include(%s, _context, _write)" % name)
+
+    def _cache(self, arguments: str):
+        """Start fragment cache block: {% cache key ttl %}"""
+        key, _, ttl = arguments.rpartition(' ')
+        if not key:
+            raise self._error("cache needs key and ttl")
+        number = self._counter = self._counter + 1
+        fragment, buffer = "_fragment%d" % number, "_buffer%d" % number
+        self._write("_key%d = %s" % (number, self._expression(key)))
+        self._write(fragment + " = _cache.get(_key%d)" % number)
+        self._write("if %s is None:" % fragment)
+        self._indent += 1
+        self._write(buffer + " = []")
+        self._blocks.append("cache")
+        self._buffers.append(buffer)
+        self._ttls.append(self._expression(ttl))
+
+    def _endcache(self):
+        """Store fragment rendered, output it"""
+        if not self._blocks or self._blocks[-1] != "cache":
+            raise self._error("unexpected endcache")
+        self._blocks.pop()
+        buffer = self._buffers.pop()
+        number = int(buffer[len("_buffer"):])
+        fragment = "_fragment%d" % number
+        self._write(fragment + " = ''.join(" + buffer + ')')
+        self._write("_cache.set(_key%d, %s, %s)" % (
+            number, fragment, self._ttls.pop()))
+        self._indent -= 1
+        self._emit(fragment)
+
+    def compile(self, function: str) -> str:
+        """Return source of function rendering template"""
+        text = list()
+        for token in TOKENS.split(self._source):
+            if token.startswith("{{") and token.endswith("}}"):
+                self._flush(text)
+                expression = token[2:-2].strip()
+                escape = "_escape" if self._autoescape else "_raw"
+                if expression.endswith("|safe"):
+                    expression, escape = expression[:-len("|safe")], "_raw"
+                self._emit(escape + '(' + self._expression(expression) + ')')
+            elif token.startswith("{%") and token.endswith("%}"):
+                self._flush(text)
+                self._tag(token[2:-2])
+            elif not (token.startswith("{#") and token.endswith("#}")):
+                text.append(token)
+            self._line += token.count('\n')
+        self._flush(text)
+        if self._blocks:
+            raise self._error("block not closed: " + self._blocks[-1])
+
+        # Names are looked up in context, then builtins
+        head = ["def " + function + "(" + ", ".join(RESERVED) + "):"]
+        if self._generator:
+            head.extend(("    if False:", "        yield ''"))
+        for name in sorted(self._names):
+            head.append("    {name} = _context.get({name!r}, _builtins.get({name!r}))".format(
+                name=name))
+        return '\n'.join(head + self._lines + ["    pass"]) + '\n'
+
+    def _flush(self, text: List[str]):
+        """Output text before tag as constant"""
+        if text:
+            data = ''.join(text)
+            if data:
+                self._emit(repr(data))
+            text.clear()
+
+
+class Template:
+    """
+    Compiled template, with one function writing pieces
+    rendered into a list, and one generator yielding them
+    for streaming.
+
+    Usage:
+        template.render({"name": "Flaks"}) -> bytes
+        template.stream({"name": "Flaks"}) -> Iterator[bytes]
+    """
+
+    def __init__(self, source: str, name: str = "<template>",
+                 autoescape: bool = True,
+                 cache: Optional[FragmentCache] = None,
+                 include: Optional[Callable[[str], "Template"]] = None):
+        """
+        Compile template.
+
+        Parameters:
+            source: str - Template text
+            name: str - Name in errors
+            autoescape: bool - Escape values for HTML
+            cache: FragmentCache - Cache of fragments
+            include: Callable[[str], Template] - Get template
+                     included by name
+        """
+        self.name = name
+        self.source = _Compiler(source, name, autoescape).compile("_render") + \
+            _Compiler(source, name, autoescape, True).compile("_generate")
+        namespace = dict()
+        exec(compile(self.source, name, "exec"), namespace)
+        self._render = namespace["_render"]
+        self._generate = namespace["_generate"]
+        self._cache = cache or FragmentCache()
+        self._include = include
+
+    def _included(self, name: str, context: dict,
+                  write: Optional[Callable[[str], None]] = None):
+        """Write pieces of template included, or generate them"""
+        if self._include is None:
+            raise errors.TemplateError(self.name + ": cannot include " + name)
+        template = self._include(name)
+        if write is None:
+            return template.generate(context)
+        template._render(write, context, escape, raw, template._cache,
+                         template._included, builtins.__dict__)
+
+    def generate(self, context: Optional[dict] = None) -> Iterator[str]:
+        """Yield pieces rendered, as many as values and texts"""
+        return self._generate(None, context or dict(), escape, raw,
+                              self._cache, self._included, builtins.__dict__)
+
+    def render(self, context: Optional[dict] = None) -> bytes:
+        """Render template as bytes"""
+        pieces = list()
+        self._render(pieces.append, context or dict(), escape, raw,
+                     self._cache, self._included, builtins.__dict__)
+        return ''.join(pieces).encode()
+
+    def stream(self, context: Optional[dict] = None,
+               size: Optional[int] = settings.TEMPLATE_CHUNK_SIZE) -> Iterator[bytes]:
+        """Render template as byte chunks of at least size characters"""
+        pieces, buffered = list(), 0
+        for piece in self.generate(context):
+            pieces.append(piece)
+            buffered += len(piece)
+            if buffered >= size:
+                yield ''.join(pieces).encode()
+                pieces.clear()
+                buffered = 0
+        if pieces:
+            yield ''.join(pieces).encode()
+
+
+class Templates:
+    """
+    Templates of directory, compiled at first use and
+    recompiled when modification time of file changes
+    (checked at most once every interval seconds).
+
+    Usage:
+        templates.get("index.html").render({"user": "guiqiqi"})
+    """
+
+    def __init__(self, directory: Optional[str] = settings.TEMPLATE_CATALOGUE,
+                 autoescape: Optional[bool] = True,
+                 interval: Optional[float] = settings.TEMPLATE_RELOAD_INTERVAL,
+                 cache: Optional[FragmentCache] = None):
+        """
+        Initialize templates of directory.
+
+        Parameters:
+            directory: str - Directory of templates
+            autoescape: bool - Escape values for HTML
+            interval: float - Seconds between checks of file changed
+            cache: FragmentCache - Cache of fragments shared by templates
+        """
+        self._directory = os.path.abspath(directory)
+        self._autoescape = autoescape
+        self._interval = interval
+        self.cache = cache or FragmentCache()
+        self._compiled: Dict[str, Tuple[Template, float, float]] = dict()
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        """Path of template, which must be inside directory"""
+        path = os.path.abspath(os.path.join(self._directory, name))
+        if not path.startswith(self._directory + os.sep):
+            raise errors.TemplateNotFound(name)
+        return path
+
+    def get(self, name: str) -> Template:
+        """Get compiled template of name"""
+        now = time.monotonic()
+        compiled = self._compiled.get(name, None)
+        if compiled is not None and now - compiled[2] < self._interval:
+            return compiled[0]
+
+        path = self._path(name)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError as _error:
+            raise errors.TemplateNotFound(name)
+        if compiled is not None and compiled[1] == mtime:
+            self._compiled[name] = (compiled[0], mtime, now)
+            return compiled[0]
+
+        with self._lock:
+            with open(path, "r", encoding="utf-8") as handler:
+                source = handler.read()
+            template = Template(source, name, self._autoescape,
+                                self.cache, self.get)
+            self._compiled[name] = (template, mtime, now)
+            return template
+
+    def render(self, name: str, context: Optional[dict] = None) -> bytes:
+        """Render template of name as bytes"""
+        return self.get(name).render(context)
+
+    def stream(self, name: str, context: Optional[dict] = None) -> Iterator[bytes]:
+        """Render template of name as chunks"""
+        return self.get(name).stream(context)
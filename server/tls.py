@@ -0,0 +1,46 @@
+"""
+TLS support
+
+Build server side SSL contexts for HTTPServer, the
+handshakes are done without blocking in the selector loop.
+"""
+
+import ssl
+
+from typing import Iterable
+from typing import Optional
+
+from . import settings
+
+
+def make_context(certfile: str, keyfile: Optional[str] = None,
+                 alpn: Optional[Iterable[str]] = settings.TLS_ALPN_PROTOCOLS,
+                 tickets: Optional[int] = settings.TLS_SESSION_TICKETS) -> ssl.SSLContext:
+    """
+    Make a server side SSL context.
+
+    Session resumption is supported by OpenSSL's server session
+    cache (TLS 1.2) and session tickets (TLS 1.3), so returning
+    clients skip a full handshake. Kernel TLS is enabled when
+    available, so sendfile could avoid copying in user space.
+
+    Parameters:
+        certfile: str - Certificate chain file in PEM format
+        keyfile: str - Private key file, could be in certfile
+        alpn: Iterable[str] - ALPN protocols in order of preference
+        tickets: int - Number of TLS 1.3 session tickets sent
+    Usage Example:
+        make_context("cert.pem", "key.pem")
+    """
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.minimum_version = ssl.TLSVersion.TLSv1_2
+    context.load_cert_chain(certfile, keyfile)
+
+    if alpn:
+        context.set_alpn_protocols(list(alpn))
+    if hasattr(context, "num_tickets"):
+        context.num_tickets = tickets
+
+    # Let kernel do the encryption for sendfile where supported
+    context.options |= getattr(ssl, "OP_ENABLE_KTLS", 0)
+    return context
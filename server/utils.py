@@ -31,6 +31,64 @@ class DynamicDict(dict):
         super(DynamicDict, self).__setitem__(key, value)
 
 
+class MultiDict:
+    """
+    Dict-like class keeping every value of repeated keys.
+    Index returns the first value, use getall for all values.
+    """
+
+    def __init__(self, pairs=()):
+        self._data = dict()
+        for key, value in pairs:
+            self.add(key, value)
+
+    def add(self, key, value):
+        """Append value to key"""
+        self._data.setdefault(key, list()).append(value)
+
+    def getall(self, key) -> list:
+        """Return all values of key"""
+        return list(self._data.get(key, ()))
+
+    def get(self, key, default=None):
+        """Return first value of key"""
+        values = self._data.get(key, None)
+        return values[0] if values else default
+
+    def __getitem__(self, key):
+        return self._data[key][0]
+
+    def __setitem__(self, key, value):
+        self._data[key] = [value]
+
+    def __contains__(self, key) -> bool:
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __repr__(self) -> str:
+        return "MultiDict(" + repr(list(self.items(multi=True))) + ')'
+
+    def keys(self):
+        return self._data.keys()
+
+    def items(self, multi=False):
+        """Return (key, value) pairs, every value when multi is set"""
+        for key, values in self._data.items():
+            if not multi:
+                yield key, values[0]
+                continue
+            for value in values:
+                yield key, value
+
+    def values(self):
+        return [values[0] for values in self._data.values()]
+
+
 def thread(function):
     """Use new thread to execute"""
 
@@ -0,0 +1,433 @@
+"""
+WebSocket support (RFC 6455)
+
+HTTP/1.1 requests to WebSocket endpoints are upgraded,
+then the connection is a channel served by the server loop,
+which reads and writes frames without holding a worker.
+Messages are handled in the loop, or in the shared thread
+pool in order of arrival.
+"""
+
+import base64
+import hashlib
+import binascii
+import collections
+
+from typing import Union
+from typing import Callable
+from typing import Iterable
+from typing import Optional
+
+from . import errors
+from . import settings
+from . import executor
+from .channel import Channel
+from .response import Response
+from .connection import Connection
+
+
+# Key appended to Sec-WebSocket-Key by server
+GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Opcodes
+CONTINUATION, TEXT, BINARY = 0x0, 0x1, 0x2
+CLOSE, PING, PONG = 0x8, 0x9, 0xA
+
+# Close codes
+NORMAL_CLOSURE = 1000
+GOING_AWAY = 1001
+PROTOCOL_ERROR = 1002
+NO_STATUS = 1005
+ABNORMAL_CLOSURE = 1006
+INVALID_DATA = 1007
+POLICY_VIOLATION = 1008
+MESSAGE_TOO_BIG = 1009
+INTERNAL_ERROR = 1011
+
+
+def accept_key(key: str) -> bytes:
+    """
+    Make Sec-WebSocket-Accept value answering Sec-WebSocket-Key
+    """
+    digest = hashlib.sha1(key.encode() + GUID).digest()
+    return base64.b64encode(digest)
+
+
+def mask(data: bytes, key: bytes) -> bytes:
+    """
+    XOR data with 4 bytes masking key, done on the
+    whole payload as one big integer instead of per byte.
+    """
+    size = len(data)
+    if not size:
+        return data
+    repeated = (key * (size // 4 + 1))[:size]
+    masked = int.from_bytes(data, "little") ^ int.from_bytes(repeated, "little")
+    return masked.to_bytes(size, "little")
+
+
+def frame(opcode: int, payload: bytes = b'', fin: bool = True) -> bytes:
+    """
+    Make unmasked frame sent by server
+    """
+    first = opcode | 0x80 if fin else opcode
+    size = len(payload)
+    if size < 126:
+        return bytes((first, size)) + payload
+    if size < 0x10000:
+        return bytes((first, 126)) + size.to_bytes(2, "big") + payload
+    return bytes((first, 127)) + size.to_bytes(8, "big") + payload
+
+
+def close_payload(code: int, reason: str = '') -> bytes:
+    """
+    Make payload of close frame
+    """
+    if code == NO_STATUS:
+        return b''
+    return code.to_bytes(2, "big") + reason.encode()[:123]
+
+
+def valid_code(code: int) -> bool:
+    """Whether close code could be sent by peer"""
+    return 1000 <= code <= 1003 or 1007 <= code <= 1014 or 3000 <= code <= 4999
+
+
+class Endpoint:
+    """
+    WebSocket endpoint registered by application.
+
+    Usage:
+        Endpoint(lambda socket, message: socket.send(message))
+    """
+
+    def __init__(self, handler: Callable,
+                 opened: Optional[Callable] = None,
+                 closed: Optional[Callable] = None,
+                 protocols: Optional[Iterable[str]] = (),
+                 execution: Optional[str] = executor.INLINE,
+                 max_size: Optional[int] = settings.WEBSOCKET_MAX_MESSAGE):
+        """
+        Initialize an endpoint.
+
+        Parameters:
+            handler: Callable[[WebSocket, str | bytes], None] - Called
+                     with every message received
+            opened: Callable[[WebSocket], None] - Called when connected
+            closed: Callable[[WebSocket], None] - Called when closed
+            protocols: Iterable[str] - Subprotocols supported,
+                       the first one offered by client is selected
+            execution: str - "inline" runs callbacks in server loop,
+                       so they must not block, "thread" runs them in
+                       shared thread pool, in order for each client
+            max_size: int - Max size of message received
+        """
+        if not execution in (executor.INLINE, executor.THREAD):
+            raise errors.InvalidExecution(execution)
+        self.handler = handler
+        self.opened = opened
+        self.closed = closed
+        self.protocols = tuple(protocols)
+        self.execution = execution
+        self.max_size = max_size
+
+    def select(self, request) -> Optional[str]:
+        """
+        Select subprotocol offered by client
+        """
+        for offered in request.headers.getall("Sec-WebSocket-Protocol"):
+            for protocol in offered.split(','):
+                if protocol.strip() in self.protocols:
+                    return protocol.strip()
+        return None
+
+    def handshake(self, request) -> Union[bytes, Response]:
+        """
+        Answer opening handshake of request,
+        return HTTP-101 response bytes when accepted,
+        or Response refusing the request.
+        """
+        headers = request.headers
+        if request.method != "GET" or \
+                not "upgrade" in headers.get("Connection", '').lower():
+            return Response(400)
+        if headers.get("Sec-WebSocket-Version", None) != "13":
+            return Response(426, headers={"Sec-WebSocket-Version": "13"})
+
+        key = headers.get("Sec-WebSocket-Key", '')
+        try:
+            if len(base64.b64decode(key, validate=True)) != 16:
+                return Response(400)
+        except binascii.Error as _error:
+            return Response(400)
+
+        lines = [b"HTTP/1.1 101 Switching Protocols",
+                 b"Upgrade: websocket", b"Connection: Upgrade",
+                 b"Sec-WebSocket-Accept: " + accept_key(key)]
+        protocol = self.select(request)
+        if protocol:
+            lines.append(b"Sec-WebSocket-Protocol: " + protocol.encode())
+        return b"\r\n".join(lines) + b"\r\n\r\n"
+
+
+class WebSocket(Channel):
+    """
+    WebSocket connection served by server loop.
+
+    send, ping and close could be called from any thread,
+    the other methods are called by server loop only.
+
+    request - the upgraded request
+    protocol - subprotocol selected
+    code - close code, None while open
+    reason - close reason
+    """
+
+    __slots__ = ("request", "protocol", "code", "reason", "_endpoint",
+                 "_fragments", "_fragment_size", "_opcode",
+                 "_inbox", "_pending", "_busy")
+
+    def __init__(self, connection: Connection, endpoint: Endpoint,
+                 notify: Callable[["WebSocket"], None]):
+        """
+        Initialize a WebSocket of upgraded connection.
+
+        Parameters:
+            connection: Connection - Connection switched to WebSocket
+            endpoint: Endpoint - Endpoint of request path
+            notify: Callable[[WebSocket], None] - Ask server loop to
+                    handle the WebSocket again, from any thread
+        """
+        super().__init__(connection, notify,
+                         settings.WEBSOCKET_HIGH_WATER_MARK,
+                         settings.WEBSOCKET_MAX_QUEUE)
+        self.request = connection.upgraded
+        self.protocol = endpoint.select(self.request)
+        self.code = None
+        self.reason = ''
+        self._endpoint = endpoint
+
+        # Fragments of message being received
+        self._fragments = list()
+        self._fragment_size = 0
+        self._opcode = None
+
+        # Callbacks waiting for thread pool, and bytes of messages
+        self._inbox = collections.deque()
+        self._pending = 0
+        self._busy = False
+
+    @property
+    def closed(self) -> bool:
+        """Whether closing handshake started"""
+        return self._closing or self._done or self._aborted
+
+    @property
+    def paused(self) -> bool:
+        """Whether reading stopped until queues drained"""
+        return self._queued >= self._high_water or self._pending >= self._high_water
+
+    def send(self, message: Union[str, bytes]) -> bool:
+        """
+        Queue text (str) or binary (bytes) message.
+        Return False when queue is above high water mark,
+        so producer should slow down, or message dropped
+        as connection is closing.
+        """
+        if isinstance(message, str):
+            return self._send(frame(TEXT, message.encode()))
+        return self._send(frame(BINARY, bytes(message)))
+
+    def ping(self, data: bytes = b'') -> bool:
+        """Queue ping frame, client answers with pong"""
+        return self._send(frame(PING, data[:125]))
+
+    def close(self, code: int = NORMAL_CLOSURE, reason: str = ''):
+        """Start closing handshake"""
+        with self._lock:
+            if self.closed:
+                return
+            self._closing = True
+            self.code, self.reason = code, reason
+        self._send(frame(CLOSE, close_payload(code, reason)), True)
+
+    def _overflowed(self):
+        """Client not reading is dropped as policy violation"""
+        self.code = POLICY_VIOLATION
+
+    def open(self):
+        """Call opened callback of endpoint"""
+        self._dispatch(self._endpoint.opened, 0)
+
+    def release(self):
+        """
+        Close socket of finished connection, and call
+        closed callback of endpoint. Called by server loop.
+        """
+        super().release()
+        if self.code is None:
+            self.code = ABNORMAL_CLOSURE
+        self._dispatch(self._endpoint.closed, 0)
+
+    def _fail(self, code: int, reason: str = ''):
+        """Send close frame then drop connection, without waiting peer"""
+        self.close(code, reason)
+        self._done = True
+        self._fragments.clear()
+        self._buffer.clear()
+
+    def _received(self):
+        """
+        Handle complete frames in buffer
+        """
+        buffer = self._buffer
+        while len(buffer) >= 2 and not self._done and not self.paused:
+            first, second = buffer[0], buffer[1]
+            size, offset = second & 0x7F, 2
+            if size == 126:
+                if len(buffer) < 4:
+                    return
+                size, offset = int.from_bytes(buffer[2:4], "big"), 4
+            elif size == 127:
+                if len(buffer) < 10:
+                    return
+                size, offset = int.from_bytes(buffer[2:10], "big"), 10
+
+            fin, opcode = first & 0x80, first & 0x0F
+            try:
+                if first & 0x70:
+                    raise errors.WebSocketError("reserved bits set")
+                if not second & 0x80:
+                    raise errors.WebSocketError("frame from client not masked")
+
+                # Refused from header, before waiting for payload
+                # which would be buffered without limit
+                if opcode >= CLOSE and (not fin or size > 125):
+                    raise errors.WebSocketError("invalid control frame")
+                if size > self._endpoint.max_size or (opcode < CLOSE and \
+                        self._fragment_size + size > self._endpoint.max_size):
+                    raise errors.WebSocketError("message too big", MESSAGE_TOO_BIG)
+
+                end = offset + 4 + size
+                if len(buffer) < end:
+                    return
+                key = bytes(buffer[offset:offset + 4])
+                payload = mask(bytes(buffer[offset + 4:end]), key)
+                del buffer[:end]
+
+                self._frame(fin, opcode, payload)
+            except errors.WebSocketError as _error:
+                self._fail(_error.code)
+                return
+
+    def _frame(self, fin: int, opcode: int, payload: bytes):
+        """
+        Handle one frame, control frames could be
+        sent between fragments of message.
+        """
+        if opcode >= CLOSE:
+            if opcode == PING:
+                self._send(frame(PONG, payload), True)
+            elif opcode == CLOSE:
+                self._close_frame(payload)
+            elif opcode != PONG:
+                raise errors.WebSocketError("unknown opcode")
+            return
+
+        if opcode == CONTINUATION:
+            if self._opcode is None:
+                raise errors.WebSocketError("nothing to continue")
+        elif opcode in (TEXT, BINARY):
+            if self._opcode is not None:
+                raise errors.WebSocketError("message not finished")
+            self._opcode = opcode
+        else:
+            raise errors.WebSocketError("unknown opcode")
+
+        self._fragments.append(payload)
+        self._fragment_size += len(payload)
+        if not fin:
+            return
+
+        message = b''.join(self._fragments)
+        opcode = self._opcode
+        self._fragments.clear()
+        self._fragment_size = 0
+        self._opcode = None
+
+        # Messages arriving after close sent are dropped
+        if self._closing:
+            return
+        if opcode == TEXT:
+            try:
+                message = message.decode()
+            except UnicodeDecodeError as _error:
+                raise errors.WebSocketError("invalid text", INVALID_DATA)
+        self._dispatch(self._endpoint.handler, len(message), message)
+
+    def _close_frame(self, payload: bytes):
+        """
+        Close frame received, answer it when we did not start closing
+        """
+        code, reason = NO_STATUS, ''
+        if payload:
+            if len(payload) < 2:
+                raise errors.WebSocketError("invalid close frame")
+            code = int.from_bytes(payload[:2], "big")
+            if not valid_code(code):
+                raise errors.WebSocketError("invalid close code")
+            try:
+                reason = payload[2:].decode()
+            except UnicodeDecodeError as _error:
+                raise errors.WebSocketError("invalid close reason", INVALID_DATA)
+
+        initiated = self._closing
+        self.close(code if code != NO_STATUS else NORMAL_CLOSURE, reason)
+        self._done = True
+        if not initiated:
+            self.code, self.reason = code, reason
+
+    def _dispatch(self, callback: Optional[Callable], size: int, *args):
+        """
+        Call callback of endpoint with self and args, in
+        server loop or in order of arrival in thread pool.
+        """
+        if callback is None:
+            return
+        if self._endpoint.execution == executor.INLINE:
+            self._call(callback, args)
+            return
+
+        with self._lock:
+            self._inbox.append((callback, size, args))
+            self._pending += size
+            if self._busy:
+                return
+            self._busy = True
+        executor.pool(executor.THREAD).submit(self._work)
+
+    def _work(self):
+        """
+        Call callbacks in inbox one by one in thread pool,
+        wake up server loop when reading could be resumed.
+        """
+        while True:
+            with self._lock:
+                if not self._inbox:
+                    self._busy = False
+                    break
+                callback, size, args = self._inbox.popleft()
+                paused = self.paused
+                self._pending -= size
+                resume = paused and not self.paused
+            self._call(callback, args)
+            if resume and not self._released:
+                self._notify(self)
+
+    def _call(self, callback: Callable, args: tuple):
+        """Call callback, close connection when it raised"""
+        try:
+            callback(self, *args)
+        except Exception as _error:
+            print(_error)
+            self.close(INTERNAL_ERROR)
@@ -0,0 +1,66 @@
+"""
+Helpers of tests: server running in a thread,
+responses read from a raw socket.
+"""
+
+import socket
+import threading
+import contextlib
+
+from typing import List
+from typing import Tuple
+
+from server import HTTPServer
+
+
+@contextlib.contextmanager
+def running(application, **options):
+    """
+    Serve application on a free port of localhost in a thread,
+    yield the server, stopped when leaving.
+
+    Usage:
+        with running(application) as server:
+            connect(server)
+    """
+    server = HTTPServer(("127.0.0.1", 0), **options)
+    server.serve(application)
+    server._listener.listen()
+    loop = threading.Thread(target=server.start)
+    loop.daemon = True
+    loop.start()
+    try:
+        yield server
+    finally:
+        server.stop()
+        loop.join(5)
+        server._listener.close()
+
+
+def connect(server: HTTPServer, timeout: float = 5) -> socket.socket:
+    """Connect to server running"""
+    return socket.create_connection(server._listener.getsockname(), timeout=timeout)
+
+
+def responses(client: socket.socket, number: int) -> List[Tuple[int, dict, bytes]]:
+    """
+    Read number responses with Content-Length from client,
+    as (code, headers, body) with lowercase header names.
+    """
+    stream = client.makefile("rb")
+    read = list()
+    for _ in range(number):
+        line = stream.readline()
+        if not line:
+            break
+        code = int(line.split()[1])
+        headers = dict()
+        while True:
+            line = stream.readline().rstrip(b"\r\n")
+            if not line:
+                break
+            name, _, value = line.decode().partition(':')
+            headers[name.strip().lower()] = value.strip()
+        read.append((code, headers, stream.read(int(headers.get("content-length", 0)))))
+    stream.close()
+    return read
@@ -0,0 +1,88 @@
+"""
+Tests of application: responses made from what views return,
+JSON codec of each application.
+"""
+
+import unittest
+
+from server import errors
+from server import jsoncodec
+from server import Request
+from server import Response
+from server import Application
+
+
+def request(body: bytes) -> bytes:
+    """Raw request with JSON body"""
+    return ("POST /items HTTP/1.1\r\nHost: localhost\r\n"
+            "Content-Type: application/json\r\nContent-Length: {length}\r\n\r\n").format(
+                length=len(body)).encode() + body
+
+
+class MakeResponseTest(unittest.TestCase):
+
+    def setUp(self):
+        self.application = Application(__name__)
+        self.request = Request(b"GET /items HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        self.request.parse()
+
+    def make(self, content) -> Response:
+        return self.application.make_response(self.request, content)
+
+    def test_content(self):
+        response = self.make("hello")
+        self.assertEqual((response.code, response.data), (200, "hello"))
+
+    def test_code_content(self):
+        response = self.make((404, "missing"))
+        self.assertEqual((response.code, response.data), (404, "missing"))
+
+    def test_code_content_headers(self):
+        response = self.make((201, {"id": 1}, {"Location": "/items/1"}))
+        self.assertEqual(response.code, 201)
+        raw = response.done()
+        self.assertIn(b"Location: /items/1\r\n", raw)
+        self.assertIn(b"application/json", raw)
+
+    def test_content_code_headers(self):
+        """Order used by other frameworks"""
+        response = self.make(("created", 201, {"Location": "/items/2"}))
+        self.assertEqual((response.code, response.data), (201, "created"))
+        self.assertIn(b"Location: /items/2\r\n", response.done())
+
+    def test_invalid_tuple(self):
+        for content in ((200,), (200, "a", {}, "b"), ("a", "b")):
+            with self.assertRaises(errors.InvalidViewResult):
+                self.make(content)
+
+
+class CodecTest(unittest.TestCase):
+
+    def test_codec_of_application(self):
+        """Codec given to one application is not used by others"""
+        loads = jsoncodec.default.loads
+        codec = jsoncodec.JSONCodec(
+            "tagged", jsoncodec.default.dumps, lambda data: ("tagged", loads(data)))
+        tagged = Application(__name__, json=codec)
+        plain = Application(__name__)
+
+        parsed = Request(request(b'{"a": 1}'), tagged.json)
+        parsed.parse()
+        self.assertEqual(parsed.body, ("tagged", {"a": 1}))
+
+        parsed = Request(request(b'{"a": 1}'), plain.json)
+        parsed.parse()
+        self.assertEqual(parsed.body, {"a": 1})
+
+        parsed = Request(request(b'{"a": 1}'))
+        parsed.parse()
+        self.assertEqual(parsed.body, {"a": 1})
+
+    def test_invalid_json(self):
+        parsed = Request(request(b'{"a": '))
+        with self.assertRaises(errors.InvalidRequest):
+            parsed.parse()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+Tests of pooled receive buffers, and connections
+reading requests into them with recv_into.
+"""
+
+import socket
+import threading
+import unittest
+
+from server import errors
+from server import buffers
+from server.buffers import BufferPool
+from server.connection import Connection
+
+
+class BufferPoolTest(unittest.TestCase):
+
+    def test_size_classes(self):
+        pool = BufferPool((1024, 4096), keep=2)
+        self.assertEqual(pool.size(1), 1024)
+        self.assertEqual(pool.size(1024), 1024)
+        self.assertEqual(pool.size(1025), 4096)
+        self.assertEqual(pool.size(5000), 5000)
+        self.assertEqual(len(pool.acquire(2000)), 4096)
+
+    def test_reused(self):
+        pool = BufferPool((1024,), keep=1)
+        first = pool.acquire(10)
+        pool.release(first)
+        self.assertIs(pool.acquire(10), first)
+        self.assertEqual((pool.hits, pool.misses), (1, 1))
+
+    def test_kept_bounded(self):
+        pool = BufferPool((1024,), keep=2)
+        taken = [pool.acquire(10) for _ in range(4)]
+        for buffer in taken:
+            pool.release(buffer)
+        self.assertEqual(pool.free, 2)
+        # Larger than any class, never pooled
+        pool.release(bytearray(8192))
+        self.assertEqual(pool.stats(), {"hits": 0, "misses": 4, "free": 2})
+
+
+class ConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+        self.connection = Connection(self.server, ("127.0.0.1", 0), timeout=2)
+
+    def tearDown(self):
+        self.connection.close()
+        self.client.close()
+
+    def test_head_and_body(self):
+        self.client.sendall(b"GET / HTTP/1.1\r\nHost: a\r\n\r\nbody" + b"GET /2")
+        self.assertEqual(self.connection.read_head(), b"GET / HTTP/1.1\r\nHost: a\r\n\r\n")
+        self.assertEqual(self.connection.read(4), b"body")
+        self.assertFalse(self.connection.pipelined)
+        self.client.sendall(b" HTTP/1.1\r\n\r\n")
+        self.assertEqual(self.connection.read_head(), b"GET /2 HTTP/1.1\r\n\r\n")
+
+    def test_pipelined(self):
+        self.client.sendall(b"GET /1 HTTP/1.1\r\n\r\nGET /2 HTTP/1.1\r\n\r\n")
+        self.connection.read_head()
+        self.assertTrue(self.connection.pipelined)
+        self.assertEqual(self.connection.read_head(), b"GET /2 HTTP/1.1\r\n\r\n")
+
+    def test_head_split(self):
+        """Head end split across receives is found"""
+        sender = threading.Thread(target=lambda: [
+            self.client.sendall(part) for part in (b"GET / HTTP/1.1\r\n", b"\r", b"\n")])
+        sender.start()
+        self.assertEqual(self.connection.read_head(), b"GET / HTTP/1.1\r\n\r\n")
+        sender.join()
+
+    def test_large_body(self):
+        """Body larger than size classes read through"""
+        body = bytes(range(256)) * 1024
+        sender = threading.Thread(target=self.client.sendall, args=(b"POST / HTTP/1.1\r\n\r\n" + body,))
+        sender.start()
+        self.connection.read_head()
+        self.assertEqual(self.connection.read_exactly(len(body)), body)
+        sender.join()
+
+    def test_read_exactly_closed(self):
+        self.client.sendall(b"abc")
+        self.client.shutdown(socket.SHUT_WR)
+        self.assertEqual(self.connection.read_exactly(10), b"abc")
+        self.assertEqual(self.connection.read(1), b'')
+
+    def test_unread(self):
+        self.client.sendall(b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n")
+        head = self.connection.read_head()
+        self.connection.unread(head)
+        self.assertEqual(self.connection.read_exactly(24), b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n")
+
+    def test_head_too_large(self):
+        self.client.sendall(b"GET /" + b'x' * 2048)
+        with self.assertRaises(errors.PayloadTooLarge):
+            self.connection.read_head(limit=1024)
+
+    def test_released_when_idle(self):
+        """Buffer goes back to pool only once everything was read"""
+        self.client.sendall(b"GET / HTTP/1.1\r\n\r\nGET")
+        self.connection.read_head()
+        free = buffers.pool.free
+        self.connection.release()
+        self.assertEqual(self.connection.buffered, 3)
+        self.assertEqual(self.connection.read(3), b"GET")
+        self.connection.release()
+        self.assertEqual(self.connection.buffered, 0)
+        self.assertEqual(buffers.pool.free, free + 1)
+
+    def test_detach(self):
+        self.client.sendall(b"GET / HTTP/1.1\r\n\r\nframe")
+        self.connection.read_head()
+        self.assertEqual(self.connection.detach(), bytearray(b"frame"))
+        self.assertEqual(self.connection.buffered, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+"""
+Tests of view deadlines: cancellation tokens, timers,
+and clients answered when views run out of time.
+"""
+
+import time
+import threading
+import unittest
+
+from concurrent.futures import Future
+
+from server import errors
+from server import Application
+from server import executor
+from server.deadline import Task
+from server.deadline import Timers
+from server.deadline import Deadline
+from server.deadline import bound
+
+from tests.support import connect
+from tests.support import running
+from tests.support import responses
+
+
+class DeadlineTest(unittest.TestCase):
+
+    def test_expires(self):
+        deadline = Deadline(0.05)
+        self.assertFalse(deadline.expired)
+        deadline.check()
+        self.assertTrue(deadline.wait(1))
+        self.assertTrue(deadline.expired)
+        self.assertEqual(deadline.remaining, 0)
+        with self.assertRaises(errors.DeadlineExceeded):
+            deadline.check()
+
+    def test_cancel(self):
+        """Cancelling wakes up waiting view and calls callbacks once"""
+        deadline, called = Deadline(10), list()
+        deadline.on_cancel(lambda: called.append(1))
+        threading.Timer(0.05, deadline.cancel).start()
+        start = time.monotonic()
+        self.assertTrue(deadline.wait())
+        self.assertLess(time.monotonic() - start, 5)
+        deadline.cancel()
+        deadline.on_cancel(lambda: called.append(2))
+        self.assertEqual(called, [1, 2])
+        self.assertTrue(deadline.cancelled)
+
+
+class TimersTest(unittest.TestCase):
+
+    def test_order(self):
+        timers, called, done = Timers(), list(), threading.Event()
+        now = time.monotonic()
+        timers.call_at(now + 0.06, lambda: (called.append(3), done.set()))
+        timers.call_at(now + 0.02, lambda: called.append(1))
+        cancelled = timers.call_at(now + 0.03, lambda: called.append("cancelled"))
+        timers.call_at(now + 0.04, lambda: called.append(2))
+        timers.cancel(cancelled)
+        self.assertTrue(done.wait(5))
+        self.assertEqual(called, [1, 2, 3])
+        self.assertEqual(len(timers), 0)
+
+
+class TaskTest(unittest.TestCase):
+
+    def test_in_time(self):
+        task = Task(lambda: "done", Deadline(1), lambda: "expired")
+        self.assertTrue(task.run())
+        self.assertEqual(task.result(), "done")
+
+    def test_expired(self):
+        """Client answered by timer, late result dropped"""
+        expired = threading.Event()
+        task = Task(lambda: time.sleep(0.2) or "late", Deadline(0.05), lambda: "expired")
+        self.assertFalse(task.run(expired.set))
+        self.assertTrue(expired.is_set())
+        self.assertEqual(task.result(), "expired")
+
+    def test_bound(self):
+        """Work not started is cancelled when deadline passes"""
+        future, work = Future(), Future()
+        bound(future, Deadline(0.05), lambda started: started, work)
+        self.assertFalse(future.result(5))
+        self.assertTrue(work.cancelled())
+
+
+class RouteTest(unittest.TestCase):
+
+    def setUp(self):
+        application = Application(__name__, deadline=None)
+        self.stopped = threading.Event()
+
+        def slow(request):
+            # View stops once server gave up the request
+            stop = time.monotonic() + 5
+            while not request.deadline.cancelled and time.monotonic() < stop:
+                request.deadline.wait(0.01)
+            if request.deadline.cancelled:
+                self.stopped.set()
+            return "late"
+
+        application.route("/slow", deadline=0.1)(slow)
+        application.route("/slow-thread", deadline=0.1, execution=executor.THREAD)(slow)
+        application.route("/fast", deadline=1)(lambda request: "fast")
+        self.application = application
+
+    def get(self, server, *paths):
+        client = connect(server)
+        client.sendall(b''.join("GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(
+            path).encode() for path in paths))
+        read = responses(client, len(paths))
+        client.close()
+        return [(code, body) for code, _, body in read]
+
+    def test_expired(self):
+        with running(self.application) as server:
+            start = time.monotonic()
+            self.assertEqual(self.get(server, "/slow")[0][0], 504)
+            self.assertLess(time.monotonic() - start, 2)
+            self.assertTrue(self.stopped.wait(2))
+            self.assertEqual(self.application.timeouts, {"GET /slow": 1})
+
+    def test_expired_in_executor(self):
+        with running(self.application) as server:
+            self.assertEqual(self.get(server, "/slow-thread")[0][0], 504)
+            self.assertTrue(self.stopped.wait(2))
+
+    def test_pipelined_after_expired(self):
+        """Requests pipelined after an expired one are still answered"""
+        with running(self.application) as server:
+            read = self.get(server, "/slow", "/fast")
+            self.assertEqual([code for code, _ in read], [504, 200])
+            self.assertEqual(read[1][1], b"fast")
+
+
+if __name__ == "__main__":
+    unittest.main()
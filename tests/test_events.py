@@ -0,0 +1,121 @@
+"""
+Tests of Server-Sent Events: encoding, replay with
+Last-Event-ID, and messages fanned out to subscribers.
+"""
+
+import time
+import socket
+import unittest
+
+from server import Request
+from server import Application
+from server.events import Topic
+from server.events import encode
+from server.events import Broadcaster
+
+from tests.support import connect
+from tests.support import running
+
+
+def request(last: str = None) -> Request:
+    headers = "Last-Event-ID: {}\r\n".format(last) if last is not None else ''
+    parsed = Request("GET /live HTTP/1.1\r\nHost: localhost\r\n{}\r\n".format(headers))
+    parsed.parse()
+    return parsed
+
+
+def receive(client: socket.socket, expected: bytes, timeout: float = 5) -> bytes:
+    """Receive from event stream until expected bytes arrived"""
+    data, deadline = b'', time.monotonic() + timeout
+    while not data.endswith(expected) and time.monotonic() < deadline:
+        chunk = client.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+class EncodeTest(unittest.TestCase):
+
+    def test_encode(self):
+        self.assertEqual(encode("hi", "greet", 3), b"id: 3\nevent: greet\ndata: hi\n\n")
+        self.assertEqual(encode(b"a\nb"), b"data: a\ndata: b\n\n")
+        self.assertEqual(encode(""), b"data: \n\n")
+        self.assertEqual(encode("x", retry=10), b"retry: 10\ndata: x\n\n")
+
+
+class ReplayTest(unittest.TestCase):
+
+    def test_replay(self):
+        topic = Topic("events", history=3)
+        for index in range(1, 6):
+            self.assertEqual(topic.publish(str(index)), index)
+        # Messages after 3 are kept
+        self.assertEqual(topic.replay(3), (encode("4", None, 4) + encode("5", None, 5), 5))
+        # Older ones dropped from history, recent ones replayed
+        self.assertEqual(topic.replay(0)[0], b''.join(
+            encode(str(index), None, index) for index in (3, 4, 5)))
+        self.assertEqual(topic.replay(5), (b'', 5))
+
+    def test_unknown_last(self):
+        """Identifier never published is not replayed from"""
+        topic = Topic("events")
+        topic.publish("1")
+        self.assertEqual(topic.replay(None), (b'', 1))
+        self.assertEqual(topic.replay(7), (b'', 1))
+        self.assertEqual(topic.replay(-1), (b'', 1))
+
+    def test_stream(self):
+        broadcaster = Broadcaster()
+        broadcaster.publish("live", "1")
+        broadcaster.publish("live", "2")
+        stream = broadcaster.stream(request("1"), "live")
+        self.assertEqual(stream.position, 2)
+        self.assertTrue(stream.data.endswith(encode("2", None, 2)))
+        self.assertEqual(broadcaster.stream(request("nan"), "live").position, 2)
+
+
+class SubscribeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.application = Application(__name__, deadline=None)
+        self.application.route("/live")(
+            lambda request: self.application.subscribe(request, "events"))
+
+    def subscribe(self, server, last: int = None) -> socket.socket:
+        client = connect(server)
+        headers = "Last-Event-ID: {}\r\n".format(last) if last is not None else ''
+        client.sendall("GET /live HTTP/1.1\r\nHost: localhost\r\n{}\r\n".format(
+            headers).encode())
+        return client
+
+    def test_fan_out(self):
+        with running(self.application) as server:
+            clients = [self.subscribe(server) for _ in range(3)]
+            for client in clients:
+                head = receive(client, b"retry: 3000\n\n")
+                self.assertTrue(head.startswith(b"HTTP/1.1 200"))
+                self.assertIn(b"text/event-stream", head)
+
+            self.application.publish("events", {"n": 1}, event="created")
+            self.application.publish("events", "plain")
+            expected = encode('{"n":1}', "created", 1) + encode("plain", None, 2)
+            for client in clients:
+                self.assertEqual(receive(client, expected), expected)
+                client.close()
+
+    def test_reconnect(self):
+        """Client reconnecting gets messages it missed, then new ones"""
+        with running(self.application) as server:
+            for index in range(1, 4):
+                self.application.publish("events", str(index))
+            client = self.subscribe(server, 1)
+            missed = encode("2", None, 2) + encode("3", None, 3)
+            self.assertTrue(receive(client, missed).endswith(b"retry: 3000\n\n" + missed))
+            self.application.publish("events", "4")
+            self.assertEqual(receive(client, encode("4", None, 4)), encode("4", None, 4))
+            client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,40 @@
+"""
+Tests of process pool: workers forked with views registered.
+"""
+
+import unittest
+
+from server import errors
+from server import executor
+
+
+def square(value):
+    return value * value
+
+
+class ProcessPoolTest(unittest.TestCase):
+
+    def tearDown(self):
+        executor.shutdown()
+        executor._views.clear()
+
+    def test_started_before_views_run(self):
+        key = executor.register(square)
+        executor.start()
+        self.assertIn(executor.PROCESS, executor._pools)
+        self.assertEqual(executor.submit(executor.PROCESS, key, 7).result(5), 49)
+
+    def test_register_after_start(self):
+        """View unknown to forked workers is refused"""
+        executor.register(square)
+        executor.start()
+        with self.assertRaises(errors.InvalidExecution):
+            executor.register(len)
+
+    def test_start_without_views(self):
+        executor.start()
+        self.assertNotIn(executor.PROCESS, executor._pools)
+
+
+if __name__ == "__main__":
+    unittest.main()
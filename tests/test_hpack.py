@@ -0,0 +1,85 @@
+"""
+Tests of HPACK (RFC 7541) header compression.
+"""
+
+import unittest
+
+from server import errors
+from server import hpack
+
+
+class HPACKTest(unittest.TestCase):
+
+    def roundtrip(self, encoder, decoder, headers):
+        block = encoder.encode(headers)
+        expected = [(name, str(value).encode().decode("iso-8859-1"))
+                    for name, value in headers]
+        self.assertEqual(decoder.decode(block), expected)
+        return block
+
+    def test_rfc_requests(self):
+        """Requests of RFC 7541 C.4, Huffman coded, sharing a table"""
+        decoder = hpack.Decoder()
+        blocks = ("828684418cf1e3c2e5f23a6ba0ab90f4ff",
+                  "828684be5886a8eb10649cbf",
+                  "828785bf408825a849e95ba97d7f8925a849e95bb8e8b4bf")
+        self.assertEqual(decoder.decode(bytes.fromhex(blocks[0])), [
+            (":method", "GET"), (":scheme", "http"), (":path", "/"),
+            (":authority", "www.example.com")])
+        self.assertEqual(decoder.decode(bytes.fromhex(blocks[1]))[-1],
+                         ("cache-control", "no-cache"))
+        self.assertEqual(decoder.decode(bytes.fromhex(blocks[2]))[-1],
+                         ("custom-key", "custom-value"))
+
+    def test_roundtrip(self):
+        encoder, decoder = hpack.Encoder(), hpack.Decoder()
+        headers = [(":status", "200"), ("content-type", "text/html"),
+                   ("content-length", 1234), ("set-cookie", "a=b; Path=/"),
+                   ("x-custom", "value"), ("x-empty", "")]
+        first = self.roundtrip(encoder, decoder, headers)
+        # Indexed from dynamic table the second time
+        second = self.roundtrip(encoder, decoder, headers)
+        self.assertLess(len(second), len(first))
+
+    def test_roundtrip_without_huffman(self):
+        encoder, decoder = hpack.Encoder(huffman=False), hpack.Decoder()
+        self.roundtrip(encoder, decoder, [("x-long", "v" * 300)])
+
+    def test_utf8_value(self):
+        """Value outside latin-1 is sent as UTF-8 octets"""
+        encoder, decoder = hpack.Encoder(), hpack.Decoder()
+        headers = [("content-disposition", "attachment; filename=\"résumé-日本.txt\"")]
+        self.roundtrip(encoder, decoder, headers)
+        self.roundtrip(encoder, decoder, headers)
+        name, value = decoder.decode(encoder.encode(headers))[0]
+        self.assertEqual(value.encode("iso-8859-1").decode(), headers[0][1])
+
+    def test_eviction(self):
+        """Tables of both sides evict alike, sized in octets"""
+        encoder, decoder = hpack.Encoder(), hpack.Decoder()
+        for number in range(200):
+            self.roundtrip(encoder, decoder, [
+                ("x-index", str(number)), ("x-text", "日本語" * (number % 7))])
+
+    def test_resize(self):
+        encoder, decoder = hpack.Encoder(), hpack.Decoder()
+        self.roundtrip(encoder, decoder, [("x-a", "1"), ("x-b", "2")])
+        encoder.resize(64)
+        self.roundtrip(encoder, decoder, [("x-a", "1"), ("x-c", "3")])
+        encoder.resize(0)
+        self.roundtrip(encoder, decoder, [("x-a", "1")])
+
+    def test_integer(self):
+        for value in (0, 30, 31, 127, 128, 1337, 1 << 20):
+            encoded = hpack.encode_integer(value, 5)
+            self.assertEqual(hpack.decode_integer(encoded, 0, 5), (value, len(encoded)))
+
+    def test_invalid(self):
+        decoder = hpack.Decoder()
+        for block in (b'\x80', b'\xff\xff\xff\xff\x0f', b'\x40\x05ab'):
+            with self.assertRaises(errors.CompressionError):
+                decoder.decode(block)
+
+
+if __name__ == "__main__":
+    unittest.main()
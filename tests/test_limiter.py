@@ -0,0 +1,105 @@
+"""
+Tests of rate limiting and load shedding.
+"""
+
+import time
+import unittest
+
+from server import Request
+from server import HTTPServer
+from server import Application
+from server.limiter import TokenBucket
+from server.limiter import RateLimiter
+
+
+def request(remote: str = "10.0.0.1", headers: str = '') -> Request:
+    parsed = Request("GET /limited HTTP/1.1\r\nHost: localhost\r\n{}\r\n".format(headers))
+    parsed.remote = (remote, 40000)
+    parsed.parse()
+    return parsed
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def test_refill(self):
+        bucket = TokenBucket(rate=2, capacity=3, now=0)
+        self.assertEqual([bucket.consume(0) for _ in range(3)], [0, 0, 0])
+        self.assertAlmostEqual(bucket.consume(0), 0.5)
+        self.assertEqual(bucket.consume(0.5), 0)
+        # Never refilled above capacity
+        bucket.consume(100)
+        self.assertAlmostEqual(bucket.tokens, 2)
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def test_burst(self):
+        limiter = RateLimiter(1, burst=2)
+        self.assertEqual(limiter.acquire(request()), 0)
+        self.assertEqual(limiter.acquire(request()), 0)
+        wait = limiter.acquire(request())
+        self.assertGreater(wait, 0.9)
+        self.assertLessEqual(wait, 1)
+
+    def test_clients_apart(self):
+        limiter = RateLimiter(1)
+        self.assertEqual(limiter.acquire(request("10.0.0.1")), 0)
+        self.assertEqual(limiter.acquire(request("10.0.0.2")), 0)
+        self.assertGreater(limiter.acquire(request("10.0.0.1")), 0)
+
+    def test_header_key(self):
+        limiter = RateLimiter(1, key="X-API-Key")
+        self.assertEqual(limiter.acquire(request(headers="X-API-Key: a\r\n")), 0)
+        self.assertEqual(limiter.acquire(request(headers="X-API-Key: b\r\n")), 0)
+        self.assertGreater(limiter.acquire(request(headers="X-API-Key: a\r\n")), 0)
+
+    def test_bounded(self):
+        limiter = RateLimiter(1, maxsize=4)
+        for index in range(10):
+            limiter.acquire(request("10.0.0.{}".format(index)))
+        self.assertEqual(len(limiter._buckets), 4)
+
+    def test_route(self):
+        """Client over limit of route gets 429 with Retry-After"""
+        application = Application(__name__, deadline=None)
+        application.route("/limited", ratelimit=RateLimiter(1))(lambda request: "ok")
+        self.assertEqual(application.respond(request()).code, 200)
+        response = application.respond(request())
+        self.assertEqual(response.code, 429)
+        self.assertIn(b"Retry-After: 1\r\n", response.done())
+
+
+class SheddingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), max_inflight=4, max_latency=0.5)
+
+    def tearDown(self):
+        self.server._listener.close()
+        self.server._waker.close()
+        self.server._wakeup.close()
+
+    def test_inflight(self):
+        self.server._inflight = 4
+        self.assertTrue(self.server._overloaded())
+        self.server._inflight = 3
+        self.assertFalse(self.server._overloaded())
+
+    def test_latency_decays(self):
+        """Latency estimate falls while requests are shed"""
+        server = self.server
+        server._inflight = 1
+        server._latency, server._sampled = 2.0, time.monotonic()
+        self.assertTrue(server._overloaded())
+        now = server._sampled + 2 * server.LATENCY_HALF_LIFE
+        self.assertAlmostEqual(server._estimate(now), 0.5)
+        server._sampled -= 3 * server.LATENCY_HALF_LIFE
+        self.assertFalse(server._overloaded())
+
+    def test_idle(self):
+        self.server._latency = 10.0
+        self.assertFalse(self.server._overloaded())
+
+
+if __name__ == "__main__":
+    unittest.main()
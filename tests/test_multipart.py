@@ -0,0 +1,105 @@
+"""
+Tests of streaming multipart/form-data parser.
+"""
+
+import unittest
+
+from server import errors
+from server import Request
+from server.multipart import parse_options
+from server.multipart import MultipartParser
+
+
+BOUNDARY = "----FlaksBoundary7MA4YWxkTrZu0gW"
+
+
+def body(parts) -> bytes:
+    """Encode parts of (name, filename, content)"""
+    data = b''
+    for name, filename, content in parts:
+        disposition = 'form-data; name="{}"'.format(name)
+        if filename is not None:
+            disposition += '; filename="{}"'.format(filename)
+        data += "--{}\r\nContent-Disposition: {}\r\n".format(BOUNDARY, disposition).encode()
+        if filename is not None:
+            data += b"Content-Type: application/octet-stream\r\n"
+        data += b"\r\n" + content + b"\r\n"
+    return data + "--{}--\r\n".format(BOUNDARY).encode()
+
+
+PARTS = [("title", None, "café".encode()),
+         ("tag", None, b"a"), ("tag", None, b"b"),
+         ("upload", "data.bin", bytes(range(256)) * 40 + b"\r\n--" + b"not boundary")]
+
+
+class MultipartTest(unittest.TestCase):
+
+    def parse(self, data: bytes, size: int, **options) -> MultipartParser:
+        parser = MultipartParser(BOUNDARY.encode(), **options)
+        for index in range(0, len(data), size):
+            parser.feed(data[index:index + size])
+        parser.close()
+        return parser
+
+    def check(self, parser: MultipartParser):
+        self.assertEqual(parser.fields.get("title"), "café")
+        self.assertEqual(parser.fields.getall("tag"), ["a", "b"])
+        upload = parser.files.get("upload")
+        self.assertEqual(upload.filename, "data.bin")
+        self.assertEqual(upload.content_type, "application/octet-stream")
+        self.assertEqual(upload.read(), PARTS[-1][2])
+        self.assertEqual(upload.size, len(PARTS[-1][2]))
+
+    def test_chunks(self):
+        """Delimiters split across chunks of any size"""
+        data = body(PARTS)
+        for size in (1, 2, 7, 64, 1000, len(data)):
+            self.check(self.parse(data, size))
+
+    def test_spooled_to_disk(self):
+        parser = self.parse(body(PARTS), 512, spool_size=1024)
+        self.check(parser)
+        self.assertTrue(parser.files.get("upload").file._rolled)
+
+    def test_request(self):
+        """Body of request is fed to parser while received"""
+        data = body(PARTS)
+        head = ("POST /upload HTTP/1.1\r\nHost: localhost\r\n"
+                "Content-Type: multipart/form-data; boundary={}\r\n"
+                "Content-Length: {}\r\n\r\n").format(BOUNDARY, len(data)).encode()
+        request = Request(head + data[:100])
+        request.parse()
+        request.feed(data[100:])
+        self.assertEqual(request.pending, 0)
+        self.assertEqual(request.body.get("title"), "café")
+        self.assertEqual(request.files.get("upload").read(), PARTS[-1][2])
+
+    def test_incomplete(self):
+        data = body(PARTS)
+        parser = MultipartParser(BOUNDARY.encode())
+        parser.feed(data[:-10])
+        with self.assertRaises(errors.InvalidMultipart):
+            parser.close()
+
+    def test_limits(self):
+        with self.assertRaises(errors.PayloadTooLarge):
+            self.parse(body(PARTS), 100, part_limit=1000)
+        with self.assertRaises(errors.PayloadTooLarge):
+            self.parse(body(PARTS), 100, total_limit=5000)
+
+    def test_malformed(self):
+        for data in (b"--" + BOUNDARY.encode() + b"xx",
+                     body([("", None, b"x")]).replace(b'name=""', b'id="a"'),
+                     body([("a", None, b"x")]).replace(b"Content-Disposition:", b"Broken")):
+            with self.assertRaises(errors.InvalidMultipart):
+                self.parse(data, 1000)
+        with self.assertRaises(errors.InvalidMultipart):
+            MultipartParser(b'')
+
+    def test_options(self):
+        self.assertEqual(parse_options('form-data; name="file"; filename="a \\"b\\".txt"'),
+                         ("form-data", {"name": "file", "filename": 'a "b".txt'}))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+Tests of HTTP/1.1 pipelining: requests sent without waiting
+for responses are answered in order.
+"""
+
+import time
+import unittest
+
+from server import Application
+
+from tests.support import connect
+from tests.support import running
+from tests.support import responses
+
+
+def application() -> Application:
+    application = Application(__name__, deadline=None)
+    application.route("/echo")(lambda request: "echo " + request.query)
+    application.route("/body", methods=["POST"])(lambda request: "body " + request.body)
+
+    def slow(request):
+        time.sleep(0.2)
+        return "slow"
+
+    application.route("/slow")(slow)
+    return application
+
+
+def get(path: str, headers: str = '') -> bytes:
+    return "GET {} HTTP/1.1\r\nHost: localhost\r\n{}\r\n".format(path, headers).encode()
+
+
+class PipelineTest(unittest.TestCase):
+
+    def test_in_order(self):
+        with running(application()) as server:
+            client = connect(server)
+            client.sendall(get("/echo?1") + get("/echo?2") + get("/echo?3"))
+            bodies = [body for _, _, body in responses(client, 3)]
+            self.assertEqual(bodies, [b"echo 1", b"echo 2", b"echo 3"])
+            client.close()
+
+    def test_with_body(self):
+        with running(application()) as server:
+            client = connect(server)
+            client.sendall(get("/echo?1") +
+                           b"POST /body HTTP/1.1\r\nHost: localhost\r\n"
+                           b"Content-Type: text/plain\r\nContent-Length: 5\r\n\r\nhello" +
+                           get("/echo?2"))
+            bodies = [body for _, _, body in responses(client, 3)]
+            self.assertEqual(bodies, [b"echo 1", b"body hello", b"echo 2"])
+            client.close()
+
+    def test_deeper_than_batch(self):
+        """Responses written in batches of pipeline depth"""
+        with running(application(), pipeline=2) as server:
+            client = connect(server)
+            client.sendall(b''.join(get("/echo?" + str(index)) for index in range(7)))
+            bodies = [body for _, _, body in responses(client, 7)]
+            self.assertEqual(bodies, [("echo " + str(index)).encode() for index in range(7)])
+            client.close()
+
+    def test_slow_first(self):
+        with running(application()) as server:
+            client = connect(server)
+            client.sendall(get("/slow") + get("/echo?fast"))
+            bodies = [body for _, _, body in responses(client, 2)]
+            self.assertEqual(bodies, [b"slow", b"echo fast"])
+            client.close()
+
+    def test_split_request(self):
+        """Request arriving in pieces after a complete one"""
+        with running(application()) as server:
+            client = connect(server)
+            second = get("/echo?2")
+            client.sendall(get("/echo?1") + second[:10])
+            time.sleep(0.05)
+            client.sendall(second[10:])
+            bodies = [body for _, _, body in responses(client, 2)]
+            self.assertEqual(bodies, [b"echo 1", b"echo 2"])
+            client.close()
+
+    def test_close(self):
+        """Requests after one asking to close are not answered"""
+        with running(application()) as server:
+            client = connect(server)
+            client.sendall(get("/echo?1", "Connection: close\r\n") + get("/echo?2"))
+            read = responses(client, 2)
+            self.assertEqual([body for _, _, body in read], [b"echo 1"])
+            client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
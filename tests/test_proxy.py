@@ -0,0 +1,123 @@
+"""
+Tests of reverse proxy: pooled upstream connections closed
+by upstream while idle, requests which could be sent again.
+"""
+
+import io
+import time
+import socket
+import unittest
+import threading
+
+from server import Request
+from server.proxy import ReverseProxy
+
+
+class Upstream:
+    """
+    Upstream answering one request on each connection, then
+    closing it without telling, like a server whose keep-alive
+    timeout passed while the connection was idle in pool.
+    """
+
+    def __init__(self):
+        self.listener = socket.socket()
+        self.listener.bind(("127.0.0.1", 0))
+        self.listener.listen(16)
+        self.address = "127.0.0.1:{}".format(self.listener.getsockname()[1])
+        self.connections = 0
+        self.bodies = list()
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self.listener.accept()
+            except OSError as _error:
+                return
+            self.connections += 1
+            with connection:
+                data = b''
+                while b"\r\n\r\n" not in data:
+                    chunk = connection.recv(4096)
+                    if not chunk:
+                        break
+                    data += chunk
+                head, _, body = data.partition(b"\r\n\r\n")
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        while len(body) < int(line.split(b':')[1]):
+                            body += connection.recv(4096)
+                self.bodies.append(body)
+                connection.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+
+    def close(self):
+        self.listener.close()
+
+
+def request(method: str, body: bytes = None, headers: str = '') -> Request:
+    """Proxied request, its body is read by proxy"""
+    head = "{method} /up/items HTTP/1.1\r\nHost: localhost\r\n{headers}".format(
+        method=method, headers=headers)
+    if body is not None:
+        head += "Content-Length: {}\r\n".format(len(body))
+    parsed = Request((head + "\r\n").encode())
+    parsed.remote = ("127.0.0.1", 40000)
+    parsed.parse()
+    parsed.reader = io.BytesIO(body or b'').read
+    return parsed
+
+
+class ProxyTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        Request.register_deferred_prefix("/up")
+
+    def setUp(self):
+        self.upstream = Upstream()
+        self.proxy = ReverseProxy("/up", [self.upstream.address], strip=True, retries=0)
+
+    def tearDown(self):
+        self.upstream.close()
+
+    def forward(self, parsed: Request):
+        response = self.proxy(parsed)
+        body = b''.join(response.stream or ())
+        response.close()
+        # Upstream closes connection kept in pool meanwhile
+        time.sleep(0.05)
+        return response.code, body
+
+    def test_stale_connection_resent(self):
+        """Requests on connections closed while idle are sent again"""
+        for method, body in (("GET", None), ("GET", None), ("DELETE", b''),
+                             ("POST", b''), ("GET", None)):
+            self.assertEqual(self.forward(request(method, body)), (200, b"ok"))
+        # Stale connections are not failures of upstream
+        self.assertEqual(self.proxy.upstreams[0].fails, 0)
+        self.assertEqual(self.upstream.connections, 5)
+
+    def test_body_not_resent(self):
+        """Body streamed on a stale connection is not sent again"""
+        self.assertEqual(self.forward(request("GET")), (200, b"ok"))
+        code, _ = self.forward(request("PUT", b"hello"))
+        self.assertEqual(code, 502)
+        self.assertEqual(self.upstream.bodies, [b''])
+
+    def test_body_sent(self):
+        self.assertEqual(self.forward(request("PUT", b"hello")), (200, b"ok"))
+        self.assertEqual(self.upstream.bodies, [b"hello"])
+
+    def test_has_body(self):
+        self.assertFalse(self.proxy._has_body(request("GET")))
+        self.assertFalse(self.proxy._has_body(request("DELETE", b'')))
+        self.assertTrue(self.proxy._has_body(request("PUT", b"hello")))
+        chunked = request("PUT", headers="Transfer-Encoding: chunked\r\n")
+        self.assertTrue(self.proxy._has_body(chunked))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+"""
+Tests of response serialised for the shared cache.
+"""
+
+import unittest
+
+from server import Response
+from server.headers import Headers
+
+
+class SerialiseTest(unittest.TestCase):
+
+    def roundtrip(self, response: Response) -> Response:
+        loaded = Response.loads(response.dumps())
+        self.assertEqual(loaded.done(), response.copy().done())
+        return loaded
+
+    def test_roundtrip(self):
+        loaded = self.roundtrip(Response(200, b"hello", headers={"X-Id": 7}))
+        self.assertEqual((loaded.code, loaded.data), (200, b"hello"))
+
+    def test_text(self):
+        loaded = self.roundtrip(Response(404, "pas trouvé ✓", content_type="text/plain"))
+        self.assertEqual(loaded.data, "pas trouvé ✓".encode())
+
+    def test_empty(self):
+        self.roundtrip(Response(204, b''))
+
+    def test_repeated_headers(self):
+        headers = Headers([("Set-Cookie", "a=1"), ("Set-Cookie", "b=2"),
+                           ("Cache-Control", "max-age=60")])
+        loaded = self.roundtrip(Response(200, b"{}", headers=headers,
+                                         content_type="application/json"))
+        self.assertEqual(loaded._extra_hedaers.getall("Set-Cookie"), ["a=1", "b=2"])
+
+    def test_without_content_type(self):
+        loaded = self.roundtrip(Response(200, b"raw", content_type=None))
+        self.assertIsNone(loaded._content_type)
+
+    def test_binary_body(self):
+        body = bytes(range(256)) * 64
+        self.assertEqual(self.roundtrip(Response(200, body)).data, body)
+
+    def test_not_serialised(self):
+        """Streamed bodies and files are never cached"""
+        self.assertIsNone(Response(200, stream=iter([b'a'])).dumps())
+        self.assertIsNone(Response(200, file=__file__).dumps())
+
+    def test_malformed(self):
+        data = Response(200, b"hello", headers={"X-Id": "7"}).dumps()
+        for broken in (b'', data[:5], data[:-1], data + b'x',
+                       b'\x00\x01' + data[2:]):
+            with self.assertRaises(ValueError):
+                Response.loads(broken)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+"""
+Tests of server loop: callbacks scheduled by workers,
+accepting connections.
+"""
+
+import errno
+import select
+import socket
+import unittest
+import threading
+
+from server import HTTPServer
+from server import Application
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0))
+
+    def tearDown(self):
+        self.server._listener.close()
+        self.server._waker.close()
+        self.server._wakeup.close()
+
+    def _pending(self) -> bool:
+        """Whether a wakeup byte waits to be drained"""
+        readable, _, _ = select.select([self.server._wakeup], [], [], 0)
+        return bool(readable)
+
+    def test_schedule_while_draining(self):
+        """A worker scheduling while loop drains is not lost"""
+        server, ran = self.server, list()
+        wakeup = server._wakeup
+
+        class Draining:
+            """Wakeup socket, a worker schedules on first recv"""
+            scheduled = False
+
+            def recv(self, size):
+                if not self.scheduled:
+                    self.scheduled = True
+                    server._schedule(ran.append, "during")
+                return wakeup.recv(size)
+
+        server._schedule(ran.append, "before")
+        server._sock_wakeup(Draining(), 0)
+        self.assertEqual(ran, ["before", "during"])
+
+        # Loop is asleep again: it must be woken by next callback
+        self.assertTrue(not server._woken or self._pending())
+        server._schedule(ran.append, "after")
+        self.assertTrue(self._pending())
+
+    def test_schedule_from_workers(self):
+        """Every callback of many workers is run by the loop"""
+        server, workers, each = self.server, 8, 2000
+        done = threading.Semaphore(0)
+
+        loop = threading.Thread(target=server.start)
+        loop.daemon = True
+        loop.start()
+
+        def work():
+            for _ in range(each):
+                server._schedule(done.release)
+
+        threads = [threading.Thread(target=work) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for _ in range(workers * each):
+            self.assertTrue(done.acquire(timeout=5), "callback lost")
+
+        server.stop()
+        loop.join(5)
+        self.assertFalse(loop.is_alive())
+
+
+class Exhausted(socket.socket):
+    """Listener failing to accept as if out of descriptors"""
+    failures = 0
+
+    def accept(self):
+        if self.failures:
+            self.failures -= 1
+            raise OSError(errno.EMFILE, "Too many open files")
+        return super().accept()
+
+
+class AcceptTest(unittest.TestCase):
+
+    def serve(self, edge_triggered: bool):
+        listener = Exhausted(socket.AF_INET, socket.SOCK_STREAM)
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        listener.failures = 3
+        server = HTTPServer(listener, edge_triggered=edge_triggered)
+        application = Application(__name__)
+        application.route("/")(lambda request: "hello")
+        server.serve(application)
+
+        loop = threading.Thread(target=server.start)
+        loop.daemon = True
+        loop.start()
+        try:
+            client = socket.create_connection(listener.getsockname(), timeout=5)
+            client.sendall(b"GET / HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            self.assertTrue(client.recv(1024).startswith(b"HTTP/1.1 200"))
+            client.close()
+            self.assertEqual(listener.failures, 0)
+        finally:
+            server.stop()
+            loop.join(5)
+            listener.close()
+
+    def test_accept_failed_edge_triggered(self):
+        """Connections in backlog accepted once descriptors are back"""
+        self.serve(True)
+
+    def test_accept_failed_level_triggered(self):
+        self.serve(False)
+
+
+if __name__ == "__main__":
+    unittest.main()
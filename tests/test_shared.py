@@ -0,0 +1,123 @@
+"""
+Tests of shared store: cache and counters of processes.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import multiprocessing
+
+from server import errors
+from server.shared import WAYS
+from server.shared import SharedStore
+
+
+def count(path: str, number: int):
+    """Count in a child process, with a store of its own"""
+    store = SharedStore(path, slots=64, counters=16)
+    for _ in range(number):
+        store.incr("requests")
+    store.set("child", str(os.getpid()).encode())
+    store.close()
+
+
+class SharedStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "store")
+        self.store = SharedStore(self.path, slots=64, counters=16)
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def test_cache(self):
+        store = self.store
+        self.assertTrue(store.set("key", b"value"))
+        self.assertEqual(store.get("key"), b"value")
+        self.assertTrue(store.set("key", b"other"))
+        self.assertEqual(store.get(b"key"), b"other")
+        self.assertIsNone(store.get("missing"))
+        self.assertTrue(store.delete("key"))
+        self.assertFalse(store.delete("key"))
+        self.assertIsNone(store.get("key"))
+        self.assertEqual((store.hits, store.misses), (2, 2))
+
+    def test_expires(self):
+        self.store.set("short", b"1", ttl=0.05)
+        self.assertEqual(self.store.get("short"), b"1")
+        time.sleep(0.1)
+        self.assertIsNone(self.store.get("short"))
+
+    def test_too_large(self):
+        self.assertFalse(self.store.set("big", b'x' * self.store.capacity))
+
+    def test_eviction(self):
+        """Least recently used entry of a full set is evicted"""
+        store = SharedStore(os.path.join(self.directory, "one"), slots=WAYS, counters=1)
+        for index in range(WAYS):
+            store.set(str(index), b'v')
+            time.sleep(0.001)
+        store.get("0")
+        store.set("new", b'v')
+        self.assertIsNone(store.get("1"))
+        self.assertEqual(store.get("0"), b'v')
+        self.assertEqual(store.get("new"), b'v')
+        store.close()
+
+    def test_counters(self):
+        store = self.store
+        self.assertEqual(store.counter("requests"), 0)
+        self.assertEqual(store.incr("requests"), 1)
+        self.assertEqual(store.incr("requests", 4), 5)
+        store.incr("status.200")
+        self.assertEqual(store.counters(), {"requests": 5, "status.200": 1})
+
+    def test_counters_full(self):
+        for index in range(16):
+            self.assertIsNotNone(self.store.incr(str(index)))
+        self.assertIsNone(self.store.incr("one more"))
+
+    def test_processes(self):
+        """Processes attached by name share values and counters"""
+        processes = [multiprocessing.Process(target=count, args=(self.path, 500))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+        self.assertEqual(self.store.counter("requests"), 2000)
+        self.assertIn(int(self.store.get("child")),
+                      [process.pid for process in processes])
+
+    def test_other_layout(self):
+        with self.assertRaises(errors.SharedStoreError):
+            SharedStore(self.path, slots=128, counters=16)
+
+    def test_open_to_others(self):
+        """File others could write is refused"""
+        os.chmod(self.path, 0o666)
+        with self.assertRaises(errors.SharedStoreError):
+            SharedStore(self.path, slots=64, counters=16)
+
+    @unittest.skipUnless(os.geteuid() == 0, "changing owner needs root")
+    def test_other_owner(self):
+        os.chown(self.path, 65534, 65534)
+        with self.assertRaises(errors.SharedStoreError):
+            SharedStore(self.path, slots=64, counters=16)
+
+    def test_symlink(self):
+        link = os.path.join(self.directory, "link")
+        os.symlink(self.path, link)
+        with self.assertRaises(errors.SharedStoreError):
+            SharedStore(link, slots=64, counters=16)
+
+    def test_created_private(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""
+Tests of TLS termination: handshakes in server loop,
+resumed sessions, and handshakes never finished.
+"""
+
+import os
+import ssl
+import time
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from unittest import mock
+
+from server import tls
+from server import settings
+from server import Application
+
+from tests.support import connect
+from tests.support import running
+from tests.support import responses
+
+
+GET = b"GET /hello HTTP/1.1\r\nHost: localhost\r\n\r\n"
+
+
+@unittest.skipIf(shutil.which("openssl") is None, "openssl not installed")
+class TLSTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.cert = os.path.join(cls.directory, "cert.pem")
+        cls.key = os.path.join(cls.directory, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes",
+                        "-keyout", cls.key, "-out", cls.cert, "-days", "1",
+                        "-subj", "/CN=localhost"], check=True, capture_output=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def setUp(self):
+        self.application = Application(__name__, deadline=None)
+        self.application.route("/hello")(lambda request: "hello " + request.scheme)
+        self.client = ssl.create_default_context()
+        self.client.check_hostname = False
+        self.client.verify_mode = ssl.CERT_NONE
+        self.client.maximum_version = ssl.TLSVersion.TLSv1_2
+
+    def context(self) -> ssl.SSLContext:
+        return tls.make_context(self.cert, self.key)
+
+    def test_https(self):
+        with running(self.application, ssl_context=self.context()) as server:
+            session = None
+            for _ in range(2):
+                client = self.client.wrap_socket(connect(server), session=session)
+                client.sendall(GET)
+                self.assertEqual(responses(client, 1)[0][2], b"hello https")
+                session = client.session
+                reused = client.session_reused
+                client.close()
+            # Second connection resumed session of the first one
+            self.assertTrue(reused)
+            self.assertGreaterEqual(server.tls_stats()["hits"], 1)
+
+    def test_handshake_timeout(self):
+        """Clients never finishing handshake are closed"""
+        with mock.patch.object(settings, "CONNECTION_TIMEOUT", 0.3):
+            with running(self.application, ssl_context=self.context()) as server:
+                idle = [connect(server) for _ in range(3)]
+                time.sleep(0.1)
+                self.assertEqual(len(server._handshakes), 3)
+                time.sleep(0.5)
+                for client in idle:
+                    self.assertEqual(client.recv(1), b'')
+                    client.close()
+                self.assertEqual(len(server._handshakes), 0)
+
+                # Still serving clients finishing handshake
+                client = self.client.wrap_socket(connect(server))
+                client.sendall(GET)
+                self.assertEqual(responses(client, 1)[0][2], b"hello https")
+                client.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
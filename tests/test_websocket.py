@@ -0,0 +1,95 @@
+"""
+Tests of WebSocket framing: limits checked from frame header.
+"""
+
+import os
+import socket
+import unittest
+
+from server import Request
+from server import websocket
+from server.connection import Connection
+
+
+def client_frame(opcode: int, payload: bytes = b'', fin: bool = True,
+                 size: int = None) -> bytes:
+    """
+    Masked frame sent by client, size announced in header
+    could differ from payload given, to send header only.
+    """
+    size = len(payload) if size is None else size
+    first = opcode | 0x80 if fin else opcode
+    if size < 126:
+        head = bytes((first, 0x80 | size))
+    elif size < 0x10000:
+        head = bytes((first, 0x80 | 126)) + size.to_bytes(2, "big")
+    else:
+        head = bytes((first, 0x80 | 127)) + size.to_bytes(8, "big")
+    key = os.urandom(4)
+    return head + key + websocket.mask(payload, key)
+
+
+class FramingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server, self.client = socket.socketpair()
+        connection = Connection(self.server, ("127.0.0.1", 0))
+        connection.upgraded = Request(b"GET /ws HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        connection.upgraded.parse()
+        self.messages = list()
+        endpoint = websocket.Endpoint(
+            lambda socket, message: self.messages.append(message), max_size=1024)
+        self.socket = websocket.WebSocket(connection, endpoint, lambda channel: None)
+
+    def tearDown(self):
+        self.server.close()
+        self.client.close()
+
+    def receive(self, data: bytes):
+        self.socket._buffer += data
+        self.socket._received()
+
+    def assertClosed(self, code: int):
+        self.assertTrue(self.socket._done)
+        self.assertEqual(self.socket.code, code)
+        self.assertEqual(len(self.socket._buffer), 0)
+        sent = self.socket._queue[-1]
+        self.assertEqual(sent[0], 0x80 | websocket.CLOSE)
+        self.assertEqual(int.from_bytes(sent[2:4], "big"), code)
+
+    def test_message(self):
+        self.receive(client_frame(websocket.TEXT, "héllo".encode()))
+        self.receive(client_frame(websocket.BINARY, b'ab', fin=False) +
+                     client_frame(websocket.PING, b'p') +
+                     client_frame(websocket.CONTINUATION, b'cd'))
+        self.assertEqual(self.messages, ["héllo", b'abcd'])
+        self.assertEqual(self.socket._queue[0], websocket.frame(websocket.PONG, b'p'))
+        self.assertFalse(self.socket._done)
+
+    def test_control_frame_large_length(self):
+        """Ping announcing 64-bit length refused before its payload"""
+        self.receive(client_frame(websocket.PING, size=1 << 40))
+        self.assertClosed(websocket.PROTOCOL_ERROR)
+
+    def test_control_frame_over_125(self):
+        self.receive(client_frame(websocket.PONG, size=126))
+        self.assertClosed(websocket.PROTOCOL_ERROR)
+
+    def test_control_frame_fragmented(self):
+        self.receive(client_frame(websocket.CLOSE, b'\x03\xe8', fin=False))
+        self.assertClosed(websocket.PROTOCOL_ERROR)
+
+    def test_data_frame_too_big(self):
+        """Frame over max size refused from header alone"""
+        self.receive(client_frame(websocket.BINARY, size=1 << 40))
+        self.assertClosed(websocket.MESSAGE_TOO_BIG)
+
+    def test_fragments_too_big(self):
+        self.receive(client_frame(websocket.BINARY, b'x' * 1000, fin=False))
+        self.receive(client_frame(websocket.CONTINUATION, size=100))
+        self.assertClosed(websocket.MESSAGE_TOO_BIG)
+        self.assertEqual(self.messages, [])
+
+
+if __name__ == "__main__":
+    unittest.main()